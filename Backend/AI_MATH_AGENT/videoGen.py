@@ -1,5 +1,6 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
+import ast
 import logging
 import os
 import subprocess
@@ -47,6 +48,22 @@ def save_code_safely(code_content: str, filename: str) -> bool:
         logger.error(f"Error saving file: {str(e)}")
         return False
 
+def precheck_scene(code: str, file_name: str, scene_name: str):
+    """
+    Compile the generated code and look for the scene class before paying for a Manim run.
+    Returns a failed ``CompletedProcess`` describing the problem, or ``None`` if the code may render.
+    """
+    try:
+        tree = ast.parse(code, file_name)
+    except SyntaxError as e:
+        error = f"SyntaxError: {e.msg} (line {e.lineno}): {(e.text or '').strip()}"
+    else:
+        if any(isinstance(node, ast.ClassDef) and node.name == scene_name for node in tree.body):
+            return None
+        error = f"NameError: no class named {scene_name} is defined; the scene must be called {scene_name}"
+    logger.error(f"Pre-render check failed: {error}")
+    return subprocess.CompletedProcess(["precheck", file_name], 1, stdout="", stderr=error)
+
 # --- The CodeGenerationAgent as provided ---
 class CodeGenerationAgent:
     """Agent responsible for generating Manim Python code."""
@@ -101,20 +118,23 @@ def visualize(req: VisualizationRequest):
         
         # Initialize the code correction agent.
         code_agent = CodeGenerationAgent(openrouter_client, qwen_model)
-        if not save_code_safely(generated_code, file_name):
-            logger.error("Failed to save generated code.")
-            raise HTTPException(status_code=500, detail="Failed to save generated code.")
         # Loop until the Manim command runs successfully or the max number of retries is reached.
         while attempt < max_retries:
             attempt += 1
             logger.info(f"Attempt {attempt}: Saving code to file.")
+            if not save_code_safely(generated_code, file_name):
+                logger.error("Failed to save generated code.")
+                raise HTTPException(status_code=500, detail="Failed to save generated code.")
             
             # Define the scene name (the generated code must define a Scene class with this name).
             scene_name = "VisualizationVideo"
             manim_command = ["manim", "-pql", file_name, scene_name]
-            logger.info(f"Running Manim command: {' '.join(manim_command)}")
             
-            result = subprocess.run(manim_command, capture_output=True, text=True)
+            # Code that does not even compile goes back to the agent without starting Manim.
+            result = precheck_scene(generated_code, file_name, scene_name)
+            if result is None:
+                logger.info(f"Running Manim command: {' '.join(manim_command)}")
+                result = subprocess.run(manim_command, capture_output=True, text=True)
             if result.returncode == 0:
                 logger.info("Manim rendering completed successfully.")
                 break  # Exit loop if rendering is successful.
@@ -0,0 +1,83 @@
+"""
+Per-request overhead of the chat endpoints (/general-agent, /code-agent, /canvas-agent).
+
+"legacy setup" replays what every request used to do before reaching the
+network: build a new GeminiLLM (load_dotenv + genai.configure), build a new
+genai.GenerativeModel inside _call, and for the canvas agent a new Groq
+client. "shared setup" is the current path, a SketchMentor bound to the
+process-wide GeminiLLM and ImageDescriber from the registry. "full call"
+adds one SketchMentor._call through the LLM gateway against an in-process
+HTTP transport that answers immediately, so it measures gateway overhead
+without network latency.
+
+Usage:
+    python -m Benchmarks.bench_chat_overhead --calls 2000
+"""
+import argparse
+import os
+import time
+
+
+def bench(label, fn, calls):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<16} {elapsed / calls * 1e6:10.1f} us/call")
+
+
+def install_stub_transport():
+    from Config.LLMs.gateway import llm_gateway
+    from Config.LLMs.stub import StubTransport
+
+    llm_gateway.use_stub(StubTransport([], "ok", {"default": 0.0}))
+    return llm_gateway
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("GEMINI_API_KEY", "bench-key")
+    os.environ.setdefault("GROQ_API_KEY", "bench-key")
+
+    import google.generativeai as genai
+    from dotenv import load_dotenv
+    from groq import Groq
+    from GeneralAgent.GeneralAgent import SketchMentor
+    from Config.registry import get_image_describer
+
+    def legacy_setup():
+        load_dotenv()
+        genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+        genai.GenerativeModel("gemini-2.0-flash-thinking-exp-01-21")
+
+    def legacy_canvas_setup():
+        legacy_setup()
+        load_dotenv()
+        Groq(api_key=os.environ["GROQ_API_KEY"])
+
+    def shared_setup():
+        SketchMentor(specialized_instruction="You are Sketch Mentor. ")
+
+    def shared_canvas_setup():
+        shared_setup()
+        get_image_describer()
+
+    gateway = install_stub_transport()
+
+    def full_call():
+        SketchMentor(specialized_instruction="You are Sketch Mentor. ")._call("What is 2 + 2?")
+
+    bench("legacy setup", legacy_setup, args.calls)
+    bench("shared setup", shared_setup, args.calls)
+    bench("legacy canvas", legacy_canvas_setup, args.calls)
+    bench("shared canvas", shared_canvas_setup, args.calls)
+    bench("full call", full_call, args.calls)
+    gateway.close()
+
+
+if __name__ == "__main__":
+    main()
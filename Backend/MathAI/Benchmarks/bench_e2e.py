@@ -0,0 +1,246 @@
+"""
+Offline end-to-end benchmark of the pipelines and API routes.
+
+Every LLM call goes through the real LLM gateway but is answered by the
+offline StubTransport (Config/LLMs/stub.py) from recorded responses after a
+delay drawn from ``--latency``, so the numbers capture orchestration
+overhead and concurrency behaviour without network access or API keys. The
+stage cache, the semantic cache and request coalescing are kept out of the
+way (caches off, every request uses a distinct problem) so each request does
+the full amount of work.
+
+Targets:
+    video     VideoModel.AgenticPipeline.run (no Manim render)
+    visual    VisualModel.AgenticPipeline.run
+    solver    Services.solveModel.solve_math_problem (MathProblemSolver + p5.js segments)
+    routes    POST /math/{solve-math-problem,generate-visual,general-agent,code-agent}
+              through the ASGI app, sent together as one mixed workload
+              (throughput is per route over the shared wall time)
+
+For each target and concurrency level it reports p50/p95/p99 latency,
+throughput, errors and, for the pipelines, a per-stage latency breakdown.
+
+Usage:
+    python -m Benchmarks.bench_e2e --targets video,visual --concurrency 1,8 --requests 16
+    python -m Benchmarks.bench_e2e --targets routes --latency fixed:0.2 --json results.json
+    python -m Benchmarks.bench_e2e --targets video --latency lognormal:0.3,1.0 --hedge '*'
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+PROBLEM = "Visualize the parabola y = x^2 + 3x + 2 and its roots"
+ROUTES = ["solve-math-problem", "generate-visual", "general-agent", "code-agent"]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summary(values) -> dict:
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "mean": statistics.fmean(values) if values else 0.0,
+    }
+
+
+class StageTimer:
+    """Turns ``on_stage`` (start) or ``on_result`` (end) callbacks into per-stage durations."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.mark = self.start
+        self.current = None
+        self.durations = {}
+
+    def on_stage(self, stage, progress=None):
+        now = time.perf_counter()
+        if self.current is not None:
+            self.durations[self.current] = self.durations.get(self.current, 0.0) + now - self.mark
+        self.current, self.mark = stage, now
+
+    def on_result(self, stage, output=None):
+        now = time.perf_counter()
+        self.durations[stage] = self.durations.get(stage, 0.0) + now - self.mark
+        self.mark = now
+
+    def finish(self, last_stage=None):
+        if self.current is not None:
+            self.on_stage(None)
+        elif last_stage is not None:
+            self.on_result(last_stage)
+        return time.perf_counter() - self.start
+
+
+def run_threaded(requests: int, concurrency: int, job):
+    """Run ``job(i)`` ``requests`` times on ``concurrency`` threads; returns (results, wall seconds)."""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench") as executor:
+        results = list(executor.map(job, range(requests)))
+    return results, time.perf_counter() - started
+
+
+def pipeline_job(pipeline):
+    def job(i):
+        timer = StageTimer()
+        try:
+            result = pipeline.run(f"{PROBLEM} (request {i})", on_stage=timer.on_stage)
+            error = None if result.get("status") in ("success", "fallback") else result.get("message", "failed")
+        except Exception as e:
+            error = str(e)
+        return timer.finish(), timer.durations, error
+    return job
+
+
+def solver_job(i):
+    from Services.solveModel import solve_math_problem
+
+    timer = StageTimer()
+    try:
+        solve_math_problem(f"{PROBLEM} (request {i})", on_result=timer.on_result)
+        error = None
+    except Exception as e:
+        error = str(e)
+    return timer.finish("assemble"), timer.durations, error
+
+
+def bench_routes(requests: int, concurrency: int):
+    import httpx
+    from main import app
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            async def one(route, i):
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.post(f"/math/{route}", json={"problem": f"{PROBLEM} (request {i})"})
+                    error = None if response.status_code == 200 else f"HTTP {response.status_code}"
+                    return route, time.perf_counter() - start, error
+
+            started = time.perf_counter()
+            results = await asyncio.gather(*(one(route, i) for route in ROUTES for i in range(requests)))
+            return results, time.perf_counter() - started
+
+    results, wall = asyncio.run(main())
+    by_route = defaultdict(list)
+    for route, latency, error in results:
+        by_route[route].append((latency, {}, error))
+    return {f"route {route}": (rows, wall) for route, rows in by_route.items()}
+
+
+def report(out, name: str, concurrency: int, rows, wall: float) -> dict:
+    latencies = [latency for latency, _, error in rows if error is None]
+    errors = [error for _, _, error in rows if error is not None]
+    stages = defaultdict(list)
+    for _, durations, error in rows:
+        if error is None:
+            for stage, duration in durations.items():
+                stages[stage].append(duration)
+    result = {
+        "target": name,
+        "concurrency": concurrency,
+        "requests": len(rows),
+        "errors": len(errors),
+        "throughput": len(latencies) / wall if wall else 0.0,
+        "latency": summary(latencies),
+        "stages": {stage: summary(values) for stage, values in stages.items()},
+    }
+    lat = result["latency"]
+    print(
+        f"{name:<28} c={concurrency:<3} n={len(rows):<4} err={len(errors):<3} "
+        f"p50={lat['p50']:6.2f}s p95={lat['p95']:6.2f}s p99={lat['p99']:6.2f}s "
+        f"throughput={result['throughput']:6.2f}/s",
+        file=out,
+    )
+    for stage, s in result["stages"].items():
+        print(f"    {stage:<24} p50={s['p50']:6.3f}s p95={s['p95']:6.3f}s", file=out)
+    if errors:
+        print(f"    first error: {errors[0][:200]}", file=out)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", default="video,visual,solver,routes")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=16, help="requests per target (per route) and level")
+    parser.add_argument("--latency", default=None,
+                        help="stub latency distribution, e.g. fixed:0.2, lognormal:0.8,0.5 (default: per model, from the recordings)")
+    parser.add_argument("--error-rate", type=float, default=None, help="share of stub calls that answer 503")
+    parser.add_argument("--responses", default=None, help="recordings file (default: Config/LLMs/stub_responses.json)")
+    parser.add_argument("--hedge", default=None,
+                        help="hedge these stages' LLM calls (LLM_HEDGE_STAGES syntax, e.g. '*' or 'CodeGeneration:0.2')")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    args = parser.parse_args()
+
+    # Must be set before the gateway and caches are imported
+    os.environ["LLM_STUB"] = args.responses or "1"
+    os.environ["LLM_STUB_SEED"] = str(args.seed)
+    if args.latency is not None:
+        os.environ["LLM_STUB_LATENCY"] = args.latency
+    if args.error_rate is not None:
+        os.environ["LLM_STUB_ERROR_RATE"] = str(args.error_rate)
+    if args.hedge is not None:
+        os.environ["LLM_HEDGE_STAGES"] = args.hedge
+    os.environ["STAGE_CACHE_MODE"] = "off"
+    os.environ["SEMANTIC_CACHE_MODE"] = "off"
+    logging.disable(logging.WARNING)
+    # The pipelines print their progress; keep the report readable
+    out, sys.stdout = sys.stdout, open(os.devnull, "w")
+
+    from Config.LLMs.gateway import llm_gateway
+    from Config.registry import get_video_pipeline, get_visual_pipeline
+
+    targets = args.targets.split(",")
+    levels = [int(level) for level in args.concurrency.split(",")]
+    results = []
+    for concurrency in levels:
+        for target in targets:
+            if target == "video":
+                rows, wall = run_threaded(args.requests, concurrency, pipeline_job(get_video_pipeline()))
+                results.append(report(out, "video pipeline", concurrency, rows, wall))
+            elif target == "visual":
+                rows, wall = run_threaded(args.requests, concurrency, pipeline_job(get_visual_pipeline()))
+                results.append(report(out, "visual pipeline", concurrency, rows, wall))
+            elif target == "solver":
+                rows, wall = run_threaded(args.requests, concurrency, solver_job)
+                results.append(report(out, "solver", concurrency, rows, wall))
+            elif target == "routes":
+                for name, (rows, wall) in bench_routes(args.requests, concurrency).items():
+                    results.append(report(out, name, concurrency, rows, wall))
+            else:
+                parser.error(f"unknown target '{target}'")
+
+    print(f"stub LLM calls: {llm_gateway.transport.calls}", file=out)
+    for name, provider in llm_gateway.stats()["providers"].items():
+        print(f"    {name:<12} requests={provider['requests']} retries={provider['retries']} errors={provider['errors']}", file=out)
+    for stage, h in llm_gateway.stats()["hedging"]["stages"].items():
+        print(
+            f"    hedge {stage:<18} calls={h['calls']} hedged={h['hedged']} wins={h['hedge_wins']} "
+            f"deadline={h['deadline']}s p99 primary={h['primary_p99']}s effective={h['effective_p99']}s",
+            file=out,
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    llm_gateway.close()
+
+
+if __name__ == "__main__":
+    main()
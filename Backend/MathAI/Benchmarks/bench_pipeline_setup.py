@@ -0,0 +1,59 @@
+"""
+Benchmark per-request pipeline setup cost.
+
+Compares constructing a fresh ``AgenticPipeline()`` for every request (the old
+behaviour) with fetching the shared instance from ``Config.registry``, and
+checks that repeated requests do not pile up logging handlers or open log
+files. No LLM calls are made; only construction is timed. Provider HTTP
+clients are pooled by ``llm_gateway`` and no longer built per pipeline.
+
+Usage:
+    python -m Benchmarks.bench_pipeline_setup --requests 1000
+"""
+import argparse
+import logging
+import os
+import time
+
+
+def count_log_files():
+    """Number of open file descriptors pointing at agentic_flow.log (Linux only)."""
+    fd_dir = "/proc/self/fd"
+    if not os.path.isdir(fd_dir):
+        return None
+    count = 0
+    for fd in os.listdir(fd_dir):
+        try:
+            if os.readlink(os.path.join(fd_dir, fd)).endswith("agentic_flow.log"):
+                count += 1
+        except OSError:
+            pass
+    return count
+
+
+def bench(label, make_pipeline, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        make_pipeline()
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<18} {elapsed / requests * 1000:8.3f} ms/request  "
+        f"root handlers={len(logging.getLogger().handlers)}  open log files={count_log_files()}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args()
+
+    from VideoModel.pipeline import AgenticPipeline
+    from Config.registry import get_video_pipeline
+
+    logging.disable(logging.INFO)
+    bench("fresh pipeline", AgenticPipeline, args.requests)
+    bench("shared registry", get_video_pipeline, args.requests)
+
+
+if __name__ == "__main__":
+    main()
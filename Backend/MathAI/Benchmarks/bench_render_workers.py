@@ -0,0 +1,111 @@
+"""
+Benchmark cold vs warm Manim renders.
+
+Renders the same small scene with a fresh ``manim`` CLI process per video
+(the old behaviour) and on the warm ``RenderWorkerPool`` workers, which keep
+manim imported between jobs, and reports p50/p95 latency for both. The first
+warm render also waits for the workers to import manim; it is reported
+separately and left out of the percentiles.
+
+Requires manim (and its system dependencies); output goes to a temporary
+media directory.
+
+Usage:
+    python -m Benchmarks.bench_render_workers --renders 10 --workers 2
+"""
+import argparse
+import importlib.util
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SCENE = '''
+from manim import *
+
+class BenchScene(Scene):
+    def construct(self):
+        circle = Circle(color=BLUE)
+        square = Square(color=GREEN)
+        self.play(Create(circle))
+        self.play(Transform(circle, square))
+        self.wait(0.5)
+'''
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def report(label, timings):
+    print(
+        f"{label:<8} p50 {percentile(timings, 50):6.2f}s  p95 {percentile(timings, 95):6.2f}s  "
+        f"mean {sum(timings) / len(timings):6.2f}s  ({len(timings)} renders)"
+    )
+
+
+def write_scene(directory, index):
+    path = os.path.join(directory, f"bench_scene_{index}.py")
+    with open(path, "w") as f:
+        f.write(SCENE)
+    return path
+
+
+def bench_cold(directory, renders):
+    timings = []
+    for i in range(renders):
+        path = write_scene(directory, f"cold_{i}")
+        start = time.perf_counter()
+        subprocess.run(
+            ["manim", "-ql", "--media_dir", os.path.join(directory, "media"), path, "BenchScene"],
+            check=True, capture_output=True,
+        )
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_warm(directory, renders, workers):
+    from Workers.render_workers import RenderWorkerPool
+
+    pool = RenderWorkerPool(size=workers, max_jobs=renders + 1, timeout=300, cpu_seconds=240, memory_mb=4096)
+    pool.start()
+    media_dir = os.path.join(directory, "media")
+    try:
+        start = time.perf_counter()
+        pool.render(SCENE, write_scene(directory, "warmup"), "BenchScene", media_dir=media_dir)
+        first = time.perf_counter() - start
+        timings = []
+        for i in range(renders):
+            path = write_scene(directory, f"warm_{i}")
+            start = time.perf_counter()
+            pool.render(SCENE, path, "BenchScene", media_dir=media_dir)
+            timings.append(time.perf_counter() - start)
+    finally:
+        pool.shutdown()
+    return first, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--renders", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    if importlib.util.find_spec("manim") is None:
+        sys.exit("manim is not installed; install it to run this benchmark.")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cold = bench_cold(directory, args.renders)
+        first, warm = bench_warm(directory, args.renders, args.workers)
+
+    print(f"First warm render (includes worker start-up): {first:.2f}s")
+    report("cold", cold)
+    report("warm", warm)
+    print(f"p50 speed-up: {percentile(cold, 50) / percentile(warm, 50):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
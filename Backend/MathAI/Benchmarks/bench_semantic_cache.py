@@ -0,0 +1,82 @@
+"""
+Check the semantic cache's matching and time its lookups.
+
+Stores one answer per prompt in a fresh ``SemanticCache`` that uses the
+configured embedder and thresholds, then looks up:
+
+- rewordings that should be served the stored answer, and
+- prompts that ask for a different kind of answer (a hint vs a full
+  solution) or about a different canvas, which must not be.
+
+Exits with status 1 if any prompt of the second kind gets a cached answer.
+
+Usage:
+    python -m Benchmarks.bench_semantic_cache --lookups 2000
+"""
+import argparse
+import sys
+import time
+
+TRAIN = "A train travels 120 km in 2 hours, what is its average speed?"
+CANVAS = "A right triangle with legs 3 and 4 and the hypotenuse labelled c."
+
+# (namespace, stored prompt, looked-up prompt, context)
+SHOULD_HIT = [
+    ("general", "What is the derivative of x^2 + 3x?", "whats the derivative of x^2 + 3x", ""),
+    ("general", f"Give me just a hint: {TRAIN}", f"Just a hint please: {TRAIN}", ""),
+    ("canvas", "hint please", "hint please!", CANVAS),
+]
+MUST_MISS = [
+    ("general", f"Give me just a hint: {TRAIN}", f"Give me the full worked solution: {TRAIN}", ""),
+    ("general", "Explain why 0.999... equals 1", "Prove that 0.999... equals 1", ""),
+    ("code", "Give me a hint for reversing a linked list in Python",
+     "Give me the complete code for reversing a linked list in Python", ""),
+    ("canvas", "hint please", "full solution please", CANVAS),
+    ("canvas", "hint please", "what did I do wrong", CANVAS),
+    ("canvas", "hint please", "hint please", "A circle of radius 5 centred at the origin."),
+]
+
+
+def check(cache_factory):
+    failures = 0
+    for expected, cases in (("hit", SHOULD_HIT), ("miss", MUST_MISS)):
+        for namespace, stored, asked, context in cases:
+            cache = cache_factory()
+            stored_context = CANVAS if namespace == "canvas" else ""
+            cache.store(namespace, stored, "STORED", context=stored_context)
+            got = "hit" if cache.lookup(namespace, asked, context=context) is not None else "miss"
+            # A missed rewording only costs an LLM call; a wrong hit serves the wrong answer
+            mark = "ok" if got == expected else ("FAIL" if expected == "miss" else "miss")
+            failures += mark == "FAIL"
+            print(f"{mark:<4} {namespace:<8} expected {expected:<4} got {got:<4}  {stored[:40]!r} -> {asked[:40]!r}")
+    return failures
+
+
+def bench_lookups(cache, lookups):
+    for i in range(2048):
+        cache.store("general", f"What is {i} times {i + 7}?", f"answer {i}")
+    start = time.perf_counter()
+    for i in range(lookups):
+        cache.lookup("general", f"what is {i % 4096} times {i % 4096 + 7}")
+    elapsed = time.perf_counter() - start
+    print(f"lookup over 2048 entries: {elapsed / lookups * 1000:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    from Cache.semantic_cache import SemanticCache, semantic_cache
+
+    def fresh():
+        return SemanticCache(semantic_cache.embedder, semantic_cache.thresholds, capacity=2048)
+
+    failures = check(fresh)
+    bench_lookups(fresh(), args.lookups)
+    if failures:
+        sys.exit(f"{failures} prompt(s) asking for a different answer were served a cached one")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+End-to-end latency of /math/solve-math-problem against a local stub LLM.
+
+Every LLM gateway call and the visual pipeline are replaced by in-process
+stubs that answer after ``--llm-latency`` seconds, so the measured time is
+pure orchestration: the solver chain, segment fan-out and code assembly.
+With the old fixed 10 s waits around every chat call this took 100+ seconds
+before any visualization work; now it should be close to (number of
+sequential LLM calls x stub latency).
+
+Usage:
+    python -m Benchmarks.bench_solve_latency --llm-latency 0.2 --runs 3
+"""
+import argparse
+import statistics
+import time
+
+
+class StubPipeline:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def run(self, prompt, **kwargs):
+        time.sleep(self.latency)
+        return {"status": "success", "code": f"// p5.js for {prompt}"}
+
+
+def install_stubs(latency):
+    from Config.registry import registry
+    from Config.LLMs.gateway import llm_gateway
+
+    def complete_sync(prompt, model, params=None, api_key=None, history=None, system=None, on_token=None,
+                      hedge=None, fallbacks=None):
+        time.sleep(latency)
+        if prompt.startswith("Explain"):
+            text = "Step 1: factor.\n```[visualization plot y=x2]```\nStep 2: solve."
+        elif model.endswith("gemini-1.5-pro"):
+            text = f"stub answer for: {prompt[:40]}"
+        else:
+            text = "function setup() {}"
+        if on_token is not None:
+            on_token(text)
+        return text
+
+    registry.register("visual_pipeline", lambda: StubPipeline(latency))
+    llm_gateway.complete_sync = complete_sync
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per stub LLM call")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    install_stubs(args.llm_latency)
+    from Controller.controller import SkethMentorController
+
+    controller = SkethMentorController()
+    timings = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        controller.solve_math_problem("Solve the equation x^2 + 3x + 2 = 0")
+        timings.append(time.perf_counter() - start)
+
+    print(
+        f"solve-math-problem: runs={args.runs} llm_latency={args.llm_latency}s "
+        f"p50={statistics.median(timings):.2f}s max={max(timings):.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
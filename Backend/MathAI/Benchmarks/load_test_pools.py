@@ -0,0 +1,83 @@
+"""
+Load test for the worker pools.
+
+Starts several /math/generate-video requests against a running server and,
+while they are in flight, repeatedly probes /math/general-agent. With the
+pipeline work offloaded to separate pools, the probe latency should stay
+close to its idle baseline instead of growing with the number of videos.
+
+Usage:
+    uvicorn main:app --port 8001
+    python Benchmarks/load_test_pools.py --base-url http://localhost:8001 --videos 4
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+
+def post(url: str, problem: str, timeout: float):
+    """POST a problem and return (status_code, elapsed_seconds)."""
+    body = json.dumps({"problem": problem}).encode("utf-8")
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - start
+
+
+def probe(base_url: str, count: int, timeout: float):
+    latencies, statuses = [], []
+    for _ in range(count):
+        status, elapsed = post(f"{base_url}/math/general-agent", "solve 10 / 20", timeout)
+        statuses.append(status)
+        latencies.append(elapsed)
+    return latencies, statuses
+
+
+def summarize(label: str, latencies, statuses):
+    ordered = sorted(latencies)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    print(
+        f"{label:<22} n={len(ordered):<3} p50={statistics.median(ordered):.2f}s "
+        f"p95={p95:.2f}s max={ordered[-1]:.2f}s statuses={sorted(set(statuses))}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--videos", type=int, default=4, help="concurrent video jobs to start")
+    parser.add_argument("--probes", type=int, default=10, help="general-agent requests per phase")
+    parser.add_argument("--timeout", type=float, default=900)
+    args = parser.parse_args()
+
+    summarize("idle general-agent", *probe(args.base_url, args.probes, args.timeout))
+
+    video_results = []
+
+    def video_job(i):
+        video_results.append(post(f"{args.base_url}/math/generate-video", f"visualize y = x^{i + 2}", args.timeout))
+
+    threads = [threading.Thread(target=video_job, args=(i,)) for i in range(args.videos)]
+    for t in threads:
+        t.start()
+    time.sleep(1)
+
+    summarize("loaded general-agent", *probe(args.base_url, args.probes, args.timeout))
+
+    for t in threads:
+        t.join()
+    statuses = [status for status, _ in video_results]
+    print(f"video jobs: {len(video_results)} finished, statuses={statuses} (503 = render pool saturated)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from Telemetry.metrics import render_artifact_hit_ratio, render_artifact_lookups
+
+logger = logging.getLogger("artifact-store")
+
+
+class ArtifactStore:
+    """
+    Content-addressed files that Manim reuses when it finds them in a render's
+    working directory, shared by all renders.
+
+    Manim names some of its intermediate files after a hash of what they
+    contain (compiled formulas, animation segments) and skips producing a
+    file that already exists. Pointing every render at one directory would
+    let two renders producing the same new file overwrite each other's
+    half-written output, so each render gets its own directory instead:
+    ``checkout`` fills it with hard links to the stored files (cheap, same
+    file system), and ``checkin`` publishes the files the render produced
+    with an atomic rename and removes the directory. Only names matching
+    ``pattern`` are content-addressed and shared. The store is bounded by
+    ``max_bytes``; least recently used files are evicted first.
+    """
+
+    def __init__(self, name: str, directory: str, max_bytes: int, pattern: str):
+        self.name = name
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.pattern = re.compile(pattern)
+        self._jobs = os.path.join(directory, ".jobs")
+        self._lock = threading.Lock()
+        self._counts = {"renders": 0, "hits": 0, "misses": 0, "compiled": 0}
+
+    def checkout(self):
+        """Create a private working directory seeded with the stored files; returns ``(directory, seeded names)``."""
+        job_dir = os.path.join(self._jobs, uuid.uuid4().hex)
+        os.makedirs(job_dir)
+        seeded = set()
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            names = []
+        for name in names:
+            if not self.pattern.fullmatch(name):
+                continue
+            try:
+                os.link(os.path.join(self.directory, name), os.path.join(job_dir, name))
+                seeded.add(name)
+            except OSError:
+                pass
+        return job_dir, seeded
+
+    def checkin(self, job_dir: str, seeded: set, used=None, complete=None) -> dict:
+        """
+        Publish the files produced in ``job_dir``, drop the directory and record
+        the render's lookups. ``used`` lists the file names the render asked
+        for; without it only the files produced are counted. If ``complete`` is
+        given, only the files in it are known to be fully written and published.
+        """
+        compiled = 0
+        try:
+            names = os.listdir(job_dir)
+        except OSError:
+            names = []
+        for name in names:
+            if not self.pattern.fullmatch(name) or name in seeded or (complete is not None and name not in complete):
+                continue
+            tmp_path = os.path.join(self.directory, f"{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            try:
+                os.link(os.path.join(job_dir, name), tmp_path)
+                os.replace(tmp_path, os.path.join(self.directory, name))
+                compiled += 1
+            except OSError as e:
+                logger.warning(f"Could not publish {self.name} file {name}: {str(e)}")
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+        result = {"compiled": compiled}
+        if used is not None:
+            used = set(used)
+            hits = used & seeded
+            for name in hits:
+                try:
+                    os.utime(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+            result.update(hits=len(hits), misses=len(used) - len(hits))
+            render_artifact_lookups.inc(len(hits), cache=self.name, result="hit")
+            render_artifact_lookups.inc(result["misses"], cache=self.name, result="miss")
+            if used:
+                render_artifact_hit_ratio.observe(len(hits) / len(used), cache=self.name)
+        with self._lock:
+            self._counts["renders"] += 1
+            self._counts["compiled"] += compiled
+            self._counts["hits"] += result.get("hits", 0)
+            self._counts["misses"] += result.get("misses", 0)
+        if compiled:
+            self.evict()
+        return result
+
+    def evict(self):
+        """Remove least recently used files until the store fits in ``max_bytes``, and abandoned job directories."""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if os.path.isfile(path):
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+        # Left behind by renders that crashed between checkout and checkin
+        try:
+            jobs = os.listdir(self._jobs)
+        except OSError:
+            return
+        for name in jobs:
+            path = os.path.join(self._jobs, name)
+            try:
+                if time.time() - os.stat(path).st_mtime > 3600:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._counts["hits"] + self._counts["misses"]
+            return {
+                **self._counts,
+                "hit_rate": round(self._counts["hits"] / lookups, 3) if lookups else 0.0,
+            }
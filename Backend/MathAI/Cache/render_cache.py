@@ -0,0 +1,144 @@
+import ast
+import hashlib
+import logging
+import os
+import shutil
+import threading
+
+logger = logging.getLogger("render-cache")
+
+
+def _strip_docstrings(tree):
+    """Drop docstrings so documentation-only edits map to the same scene."""
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            body = node.body
+            if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) \
+                    and isinstance(body[0].value.value, str):
+                node.body = body[1:] or [ast.Pass()]
+    return tree
+
+
+def canonical_source(code: str) -> str:
+    """
+    Canonical form of a Manim scene source.
+
+    Parsing with ``ast`` discards comments, blank lines and formatting; the
+    dump (without line/column attributes) is identical for any two sources
+    that differ only in those. Code that does not parse falls back to its
+    whitespace-normalised text.
+    """
+    try:
+        tree = _strip_docstrings(ast.parse(code))
+        return ast.dump(tree, include_attributes=False)
+    except SyntaxError:
+        return "\n".join(line.strip() for line in code.splitlines() if line.strip())
+
+
+class RenderCache:
+    """
+    Maps a canonical scene hash plus render flags to a previously rendered MP4.
+
+    Videos are stored as ``<directory>/<hash>.mp4`` inside the static media
+    tree, so a hit can be served by URL without touching Manim. Files are
+    published with an atomic rename, which makes concurrent writers of the
+    same scene safe (the last identical copy wins). Total size is bounded by
+    ``max_bytes``; the least recently used videos are evicted first.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(code: str, flags, scene_name: str) -> str:
+        payload = "\0".join([canonical_source(code), " ".join(flags), scene_name])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.mp4")
+
+    def lookup(self, key: str):
+        """Return the cached video path (relative, '/'-separated) or ``None``."""
+        path = self._path(key)
+        if not os.path.isfile(path):
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        logger.info(f"Render cache hit {key[:12]}")
+        return path.replace(os.sep, "/")
+
+    def path(self, key: str):
+        """The cached video path for ``key`` like ``lookup``, without counting a hit or miss."""
+        path = self._path(key)
+        return path.replace(os.sep, "/") if os.path.isfile(path) else None
+
+    def store(self, key: str, video_file: str):
+        """Publish ``video_file`` under ``key`` and return the cached path, or ``None`` on failure."""
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            shutil.copyfile(video_file, tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not cache rendered video {video_file}: {str(e)}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return None
+        self.evict()
+        return path.replace(os.sep, "/")
+
+    def evict(self):
+        """Remove least recently used videos until the cache fits in ``max_bytes``."""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith(".mp4"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                logger.info(f"Evicted cached render {os.path.basename(path)}")
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+render_cache = RenderCache(
+    directory=os.environ.get("RENDER_CACHE_DIR", os.path.join("media", "videos", "cache")),
+    max_bytes=int(os.environ.get("RENDER_CACHE_MB", 2048)) * 1024 * 1024,
+)
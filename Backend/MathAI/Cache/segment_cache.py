@@ -0,0 +1,14 @@
+import os
+from Cache.artifact_store import ArtifactStore
+
+# Manim names each animation's partial movie after hashes of the camera, the
+# animations and the scene's mobjects at the start of the play()/wait() call,
+# and renders only the calls whose file is missing. A scene edited after its
+# Nth animation therefore reuses the first N segments as long as the edit does
+# not change the state they start from; "uncached_*" segments are not shared.
+segment_cache = ArtifactStore(
+    "segments",
+    directory=os.environ.get("SEGMENT_CACHE_DIR", os.path.join("media", "videos", "segments")),
+    max_bytes=int(os.environ.get("SEGMENT_CACHE_MB", 1024)) * 1024 * 1024,
+    pattern=r"\d+(?:_\d+)+\.(?:mp4|mov|webm)",
+)
@@ -0,0 +1,255 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import aclosing
+
+import numpy as np
+
+logger = logging.getLogger("semantic-cache")
+
+# Words that change how a question is phrased but not what is asked
+FILLER_WORDS = {
+    "a", "an", "the", "what", "whats", "is", "are", "was", "of", "to", "for", "me", "please", "pls",
+    "can", "could", "would", "you", "tell", "find", "solve", "calculate", "compute", "evaluate",
+    "value", "answer", "help", "with", "how", "do", "i", "much", "equal", "equals", "result",
+}
+# Words that say what kind of answer is wanted (a hint or a full solution, why, what went wrong);
+# prompts only share an answer if they use the same ones
+INTENT_WORDS = {
+    "hint", "hints", "clue", "full", "complete", "entire", "whole", "solution", "solutions", "step", "steps",
+    "final", "answer", "only", "just", "explain", "explanation", "why", "wrong", "mistake", "error", "check",
+    "verify", "proof", "prove", "code", "example", "examples", "approach", "idea", "short", "brief", "detailed",
+}
+MATH_SYMBOLS = "+-*/^=<>()%√π"
+_TOKEN = re.compile(rf"[a-z0-9.]+|[{re.escape(MATH_SYMBOLS)}]")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, split operators off and drop filler words and punctuation."""
+    tokens = _TOKEN.findall(text.lower().replace("÷", "/").replace("×", "*"))
+    return " ".join(token.strip(".") for token in tokens if token.strip(".") and token not in FILLER_WORDS)
+
+
+def intent(text: str) -> str:
+    """The intent words of a prompt, sorted; taken before ``normalize`` drops filler such as "answer"."""
+    return " ".join(sorted(set(_TOKEN.findall(text.lower())) & INTENT_WORDS))
+
+
+def math_signature(normalized: str) -> str:
+    """
+    The numbers, operators and single-letter variables of a prompt, in order.
+
+    Two prompts can only share an answer if their signatures match exactly, so
+    "solve 10/20" and "solve 10/30" never collide however similar they look.
+    """
+    return "".join(
+        token for token in normalized.split()
+        if token in MATH_SYMBOLS or any(ch.isdigit() for ch in token) or len(token) == 1
+    )
+
+
+class HashedNgramEmbedder:
+    """
+    Dependency-free CPU embedding: character n-grams hashed into a fixed-size
+    vector, L2-normalised so that a dot product is the cosine similarity.
+    Rewordings that keep the key terms, and typo variants, land close
+    together; an embedding takes a fraction of a millisecond.
+    """
+
+    def __init__(self, dimensions: int = 512, ngram_sizes=(2, 3, 4)):
+        self.dimensions = dimensions
+        self.ngram_sizes = ngram_sizes
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        padded = f" {text} "
+        for n in self.ngram_sizes:
+            for i in range(len(padded) - n + 1):
+                digest = hashlib.blake2b(padded[i:i + n].encode("utf-8"), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+                sign = 1.0 if digest[4] & 1 else -1.0
+                vector[bucket] += sign
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SentenceTransformerEmbedder:
+    """Small sentence-transformers model (e.g. all-MiniLM-L6-v2) run on the CPU."""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dimensions = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+
+class _Namespace:
+    """Flat vector index for one endpoint: a preallocated matrix plus parallel entry lists."""
+
+    def __init__(self, dimensions: int, capacity: int):
+        self.vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        self.signatures = [None] * capacity
+        self.answers = [None] * capacity
+        self.created = np.zeros(capacity)
+        self.last_used = np.zeros(capacity)
+        self.size = 0
+
+
+class SemanticCache:
+    """
+    Returns a stored answer for prompts that are near-duplicates of earlier ones.
+
+    Prompts are normalised and embedded; a lookup scans the endpoint's
+    namespace (a flat NumPy matrix, one matrix-vector product) for the most
+    similar entry with the same match key: the math signature, the intent
+    words and a hash of ``context`` (e.g. a canvas description, which is
+    matched exactly instead of being embedded with the prompt). It is a hit
+    when the cosine similarity reaches the namespace's threshold. Each namespace holds at most
+    ``capacity`` entries; expired entries are replaced first, then the least
+    recently used.
+    """
+
+    def __init__(self, embedder, thresholds: dict, default_threshold: float = 0.92,
+                 capacity: int = 2048, ttl: float = 24 * 3600, enabled: bool = True):
+        self.embedder = embedder
+        self.thresholds = thresholds
+        self.default_threshold = default_threshold
+        self.capacity = capacity
+        self.ttl = ttl
+        self.enabled = enabled
+        self._namespaces = {}
+        self._lock = threading.Lock()
+        self._metrics = defaultdict(lambda: {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "similarity_sum": 0.0})
+
+    def threshold(self, namespace: str) -> float:
+        return self.thresholds.get(namespace, self.default_threshold)
+
+    def _namespace(self, namespace: str) -> _Namespace:
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            ns = _Namespace(self.embedder.dimensions, self.capacity)
+            self._namespaces[namespace] = ns
+        return ns
+
+    def _prepare(self, prompt: str, context: str):
+        normalized = normalize(prompt)
+        context_hash = hashlib.sha256(context.encode("utf-8")).hexdigest()[:16] if context else ""
+        return self.embedder.embed(normalized), (math_signature(normalized), intent(prompt), context_hash)
+
+    def lookup(self, namespace: str, prompt: str, context: str = ""):
+        """Return the cached answer for a near-duplicate of ``prompt`` asked in ``context``, or ``None``."""
+        if not self.enabled:
+            return None
+        vector, signature = self._prepare(prompt, context)
+        now = time.time()
+        with self._lock:
+            metrics = self._metrics[namespace]
+            ns = self._namespaces.get(namespace)
+            if ns is not None and ns.size:
+                scores = ns.vectors[:ns.size] @ vector
+                live = (now - ns.created[:ns.size]) <= self.ttl
+                matching = np.array([sig == signature for sig in ns.signatures[:ns.size]])
+                scores = np.where(live & matching, scores, -1.0)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold(namespace):
+                    ns.last_used[best] = now
+                    metrics["hits"] += 1
+                    metrics["similarity_sum"] += float(scores[best])
+                    logger.info(f"Semantic cache hit in {namespace} (similarity {scores[best]:.3f})")
+                    return ns.answers[best]
+            metrics["misses"] += 1
+        return None
+
+    def store(self, namespace: str, prompt: str, answer: str, context: str = ""):
+        if not self.enabled or not answer:
+            return
+        vector, signature = self._prepare(prompt, context)
+        now = time.time()
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns.size < self.capacity:
+                slot = ns.size
+                ns.size += 1
+            else:
+                expired = (now - ns.created) > self.ttl
+                slot = int(np.argmax(expired)) if expired.any() else int(np.argmin(ns.last_used))
+                self._metrics[namespace]["evictions"] += 1
+            ns.vectors[slot] = vector
+            ns.signatures[slot] = signature
+            ns.answers[slot] = answer
+            ns.created[slot] = now
+            ns.last_used[slot] = now
+            self._metrics[namespace]["stores"] += 1
+
+    def get_or_compute(self, namespace: str, prompt: str, compute, context: str = ""):
+        """Return a cached answer for ``prompt`` or call ``compute()`` and remember its result."""
+        answer = self.lookup(namespace, prompt, context)
+        if answer is not None:
+            return answer
+        answer = compute()
+        self.store(namespace, prompt, answer, context)
+        return answer
+
+    async def astream_or_compute(self, namespace: str, prompt: str, stream, context: str = ""):
+        """
+        Streaming ``get_or_compute``: a hit is yielded as a single chunk,
+        otherwise the chunks of ``stream()`` are passed through and their
+        joined text is stored once the stream has completed.
+        """
+        answer = self.lookup(namespace, prompt, context)
+        if answer is not None:
+            yield answer
+            return
+        parts = []
+        async with aclosing(stream()) as chunks:
+            async for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
+        self.store(namespace, prompt, "".join(parts), context)
+
+    def stats(self) -> dict:
+        with self._lock:
+            report = {}
+            for namespace, m in self._metrics.items():
+                lookups = m["hits"] + m["misses"]
+                ns = self._namespaces.get(namespace)
+                report[namespace] = {
+                    "threshold": self.threshold(namespace),
+                    "entries": ns.size if ns else 0,
+                    "hits": m["hits"],
+                    "misses": m["misses"],
+                    "stores": m["stores"],
+                    "evictions": m["evictions"],
+                    "hit_rate": round(m["hits"] / lookups, 3) if lookups else 0.0,
+                    "mean_hit_similarity": round(m["similarity_sum"] / m["hits"], 3) if m["hits"] else None,
+                }
+            return {"enabled": self.enabled, "namespaces": report}
+
+
+def _embedder():
+    model_name = os.environ.get("SEMANTIC_CACHE_MODEL")
+    if model_name:
+        try:
+            return SentenceTransformerEmbedder(model_name)
+        except ImportError:
+            logger.warning("sentence-transformers is not installed, using hashed n-gram embeddings")
+    return HashedNgramEmbedder()
+
+
+semantic_cache = SemanticCache(
+    embedder=_embedder(),
+    thresholds={
+        "general": float(os.environ.get("SEMANTIC_CACHE_GENERAL_THRESHOLD", 0.9)),
+        "code": float(os.environ.get("SEMANTIC_CACHE_CODE_THRESHOLD", 0.95)),
+        "canvas": float(os.environ.get("SEMANTIC_CACHE_CANVAS_THRESHOLD", 0.97)),
+    },
+    capacity=int(os.environ.get("SEMANTIC_CACHE_ENTRIES", 2048)),
+    ttl=float(os.environ.get("SEMANTIC_CACHE_TTL", 24 * 3600)),
+    enabled=os.environ.get("SEMANTIC_CACHE_MODE", "on").lower() != "off",
+)
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+logger = logging.getLogger("stage-cache")
+
+OFF = "off"
+READ_WRITE = "readwrite"
+READ_ONLY = "readonly"
+
+
+def prompt_version(template: str) -> str:
+    """Short hash of a prompt template; editing the template invalidates its entries."""
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:12]
+
+
+class StageCache:
+    """
+    Two-tier, content-addressed cache for pipeline stage outputs.
+
+    Entries are keyed on ``sha256(stage, prompt version, model, input)`` and
+    live in an in-memory LRU in front of a directory of JSON files. Both tiers
+    expire entries after ``ttl`` seconds; the memory tier is bounded by item
+    count and the disk tier by total bytes (oldest files are evicted first).
+
+    Modes:
+        readwrite: look up and store results (default).
+        readonly:  look up only, never write; used to replay recorded runs.
+        off:       bypass the cache entirely.
+    """
+
+    def __init__(self, directory: str, mode: str = READ_WRITE, ttl: float = 7 * 24 * 3600,
+                 memory_items: int = 512, disk_max_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.mode = mode
+        self.ttl = ttl
+        self.memory_items = memory_items
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = defaultdict(lambda: {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0})
+        self._writes_since_evict = 0
+
+    @staticmethod
+    def make_key(stage: str, version: str, model: str, value: str) -> str:
+        payload = json.dumps([stage, version, model, value], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _count(self, stage: str, metric: str):
+        with self._lock:
+            self._metrics[stage][metric] += 1
+
+    def get(self, stage: str, key: str):
+        """Return the cached value for ``key`` or ``None`` (always ``None`` when the cache is off)."""
+        if self.mode == OFF:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self._metrics[stage]["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            self._count(stage, "misses")
+            return None
+        if now - record["created"] > self.ttl:
+            if self.mode == READ_WRITE:
+                self._remove(path)
+            self._count(stage, "misses")
+            return None
+
+        if self.mode == READ_WRITE:
+            # Refresh mtime so size-based eviction drops least recently used entries first
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        self._remember(key, record["value"], record["created"])
+        self._count(stage, "disk_hits")
+        return record["value"]
+
+    def put(self, stage: str, key: str, value):
+        if self.mode != READ_WRITE:
+            return
+        created = time.time()
+        self._remember(key, value, created)
+
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"stage": stage, "created": created, "value": value}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write cache entry for {stage}: {str(e)}")
+            self._remove(tmp_path)
+            return
+        self._count(stage, "stores")
+
+        with self._lock:
+            self._writes_since_evict += 1
+            should_evict = self._writes_since_evict >= 32
+            if should_evict:
+                self._writes_since_evict = 0
+        if should_evict:
+            self.evict()
+
+    def get_or_compute(self, stage: str, version: str, model: str, value: str, compute, is_cacheable=None):
+        """
+        Return the cached output of ``stage`` for ``value``, computing and storing it on a miss.
+
+        ``is_cacheable(result)`` can reject results (e.g. error strings) from being stored.
+        """
+        if self.mode == OFF:
+            return compute()
+        key = self.make_key(stage, version, model, value)
+        cached = self.get(stage, key)
+        if cached is not None:
+            logger.info(f"[{stage}] Cache hit {key[:12]}")
+            return cached
+        result = compute()
+        if is_cacheable is None or is_cacheable(result):
+            self.put(stage, key, result)
+        return result
+
+    def _remember(self, key: str, value, created: float):
+        with self._lock:
+            self._memory[key] = (value, created)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self):
+        """Delete expired disk entries, then the oldest ones until under ``disk_max_bytes``."""
+        if not os.path.isdir(self.directory):
+            return
+        now = time.time()
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.ttl:
+                    self._remove(path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def stats(self) -> dict:
+        """Per-stage hit/miss counters plus the overall hit rate for each stage."""
+        with self._lock:
+            report = {}
+            for stage, counts in self._metrics.items():
+                lookups = counts["memory_hits"] + counts["disk_hits"] + counts["misses"]
+                hits = counts["memory_hits"] + counts["disk_hits"]
+                report[stage] = {**counts, "hit_rate": round(hits / lookups, 3) if lookups else 0.0}
+            return {"mode": self.mode, "memory_entries": len(self._memory), "stages": report}
+
+
+stage_cache = StageCache(
+    directory=os.environ.get("STAGE_CACHE_DIR", os.path.join("cache", "stages")),
+    mode=os.environ.get("STAGE_CACHE_MODE", READ_WRITE),
+    ttl=float(os.environ.get("STAGE_CACHE_TTL", 7 * 24 * 3600)),
+    memory_items=int(os.environ.get("STAGE_CACHE_MEMORY_ITEMS", 512)),
+    disk_max_bytes=int(os.environ.get("STAGE_CACHE_DISK_MB", 256)) * 1024 * 1024,
+)
@@ -0,0 +1,58 @@
+import os
+from Cache.artifact_store import ArtifactStore
+
+# MathTex strings that generated scenes use again and again; compiled once when the render workers start
+COMMON_FRAGMENTS = [
+    r"ax^2 + bx + c = 0",
+    r"x = \frac{-b \pm \sqrt{b^2 - 4ac}}{2a}",
+    r"b^2 - 4ac",
+    r"\Delta = b^2 - 4ac",
+    r"f(x)",
+    r"f'(x)",
+    r"f''(x)",
+    r"\frac{d}{dx}",
+    r"\frac{dy}{dx}",
+    r"\frac{d}{dx} x^n = n x^{n-1}",
+    r"\int",
+    r"\int_a^b f(x)\,dx",
+    r"\lim_{x \to 0}",
+    r"\sin(x)",
+    r"\cos(x)",
+    r"e^x",
+    r"\ln(x)",
+    r"\pi",
+    r"\theta",
+    r"x",
+    r"y",
+    r"x^2",
+    r"y = mx + b",
+    r"a^2 + b^2 = c^2",
+    r"=",
+    r"+",
+    r"-",
+    # Axis labels: DecimalNumber renders each character separately
+    *[str(n) for n in range(10)],
+    ".",
+]
+
+
+class TexCache(ArtifactStore):
+    """
+    Compiled LaTeX SVGs shared by all renders.
+
+    Manim names each compiled formula after a hash of its LaTeX source and
+    skips latex/dvisvgm when ``<tex_dir>/<hash>.svg`` exists; renders get
+    their ``tex_dir`` from ``checkout``. With ``prewarm`` the render workers
+    compile ``COMMON_FRAGMENTS`` when they start.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, prewarm: bool = True):
+        super().__init__("tex", directory, max_bytes, r"[0-9a-f]+\.svg")
+        self.prewarm = prewarm
+
+
+tex_cache = TexCache(
+    directory=os.environ.get("TEX_CACHE_DIR", os.path.join("media", "Tex")),
+    max_bytes=int(os.environ.get("TEX_CACHE_MB", 256)) * 1024 * 1024,
+    prewarm=os.environ.get("TEX_CACHE_PREWARM", "on").lower() != "off",
+)
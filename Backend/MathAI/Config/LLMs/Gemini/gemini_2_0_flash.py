@@ -1,27 +1,31 @@
 import os
-import google.generativeai as genai
 from langchain.llms.base import LLM
 from pydantic import Field
+from typing import Optional
 from langchain.agents import ZeroShotAgent, Tool
 from langchain.agents import AgentType
 from langchain.agents import initialize_agent
+from Config.LLMs.gateway import llm_gateway
 
 class GeminiLLM(LLM):
+    api_key: Optional[str] = None
     model: str = Field(default="gemini-2.0-flash")
 
-    def __init__(self, api: str, **kwargs):
-        apiKey = os.environ.get(api)
-        genai.configure(api_key=apiKey)
-        super().__init__(**kwargs)
+    def __init__(self, api: Optional[str] = None, **kwargs):
+        # ``api`` names an environment variable holding a dedicated key;
+        # without it every call takes a key from the shared Gemini key pool.
+        apiKey = os.environ.get(api) if api else None
+        super().__init__(api_key=apiKey, **kwargs)
 
     @property
     def _llm_type(self) -> str:
         return "gemini"
 
     def _call(self, prompt: str, stop=None):
-        model_instance = genai.GenerativeModel(self.model)
-        response = model_instance.generate_content(prompt)
-        return response if isinstance(response, str) else response.text
+        return llm_gateway.complete_sync(prompt, f"gemini/{self.model}", api_key=self.api_key)
+
+    async def _acall(self, prompt: str, stop=None):
+        return await llm_gateway.complete(prompt, f"gemini/{self.model}", api_key=self.api_key)
 
 # # Instantiate the custom GeminiLLM with the required API key parameter
 # llm = GeminiLLM("GEMINI_API_KEY")
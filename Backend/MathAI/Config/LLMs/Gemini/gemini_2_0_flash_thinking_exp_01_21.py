@@ -1,38 +1,31 @@
-import os
-import google.generativeai as genai
 from langchain.llms.base import LLM
+from langchain_core.outputs import GenerationChunk
 from pydantic import Field
 from langchain.agents import Tool, AgentType, initialize_agent
 from dotenv import load_dotenv
 from typing import Optional
+from Config.LLMs.gateway import llm_gateway
 
 class GeminiLLM(LLM):
     """Custom LLM wrapper for Google's Gemini model."""
     
     model: str = Field(default="gemini-2.0-flash-thinking-exp-01-21")
-    api_key: str = Field(...)  # Declare api_key as a required field
+    api_key: Optional[str] = None  # None: take a key from the shared Gemini key pool per call
 
     def __init__(self, api_key: Optional[str] = None, **kwargs):
         """
         Initialize the Gemini LLM.
         
         Args:
-            api_key (str, optional): API key for Gemini. If not provided, looks for GEMINI_API_KEY in environment.
+            api_key (str, optional): Dedicated API key for Gemini. If not provided, each call uses
+                the key with the most quota left among GEMINI_API_KEY, GEMINI_API_KEY1, ...
             **kwargs: Additional arguments to pass to the LLM.
         """
         # Load environment variables
         load_dotenv()
         
-        # Determine API key: use provided one or load from environment
-        key = api_key or os.environ.get("GEMINI_API_KEY")
-        if not key:
-            raise ValueError("Gemini API key is required. Provide it as an argument or set GEMINI_API_KEY environment variable.")
-        
         # Call the parent's __init__ with the API key so that internal fields like __pydantic_extra__ are set
-        super().__init__(api_key=key, **kwargs)
-        
-        # Now configure the genai library with the API key
-        genai.configure(api_key=self.api_key)
+        super().__init__(api_key=api_key, **kwargs)
     
     @property
     def _llm_type(self) -> str:
@@ -51,9 +44,25 @@ class GeminiLLM(LLM):
             str: The generated text.
         """
         try:
-            model_instance = genai.GenerativeModel(self.model)
-            response = model_instance.generate_content(prompt)
-            return response.text if hasattr(response, 'text') else str(response)
+            return llm_gateway.complete_sync(prompt, f"gemini/{self.model}", api_key=self.api_key)
+        except Exception as e:
+            raise RuntimeError(f"Error calling Gemini API: {str(e)}")
+
+    async def _acall(self, prompt: str, stop=None):
+        """Async variant of ``_call`` used by LangChain's ``ainvoke``."""
+        try:
+            return await llm_gateway.complete(prompt, f"gemini/{self.model}", api_key=self.api_key)
+        except Exception as e:
+            raise RuntimeError(f"Error calling Gemini API: {str(e)}")
+
+    async def _astream(self, prompt: str, stop=None, run_manager=None, **kwargs):
+        """Yield the answer in chunks as Gemini streams it; used by LangChain's ``astream``."""
+        try:
+            async for text in llm_gateway.stream(prompt, f"gemini/{self.model}", api_key=self.api_key):
+                chunk = GenerationChunk(text=text)
+                if run_manager:
+                    await run_manager.on_llm_new_token(text, chunk=chunk)
+                yield chunk
         except Exception as e:
             raise RuntimeError(f"Error calling Gemini API: {str(e)}")
 
@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger("circuit-breaker")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker.
+
+    ``failure_threshold`` consecutive provider failures (timeouts, transport
+    errors, 5xx) open the circuit: calls are refused at once instead of
+    waiting for their own timeouts. After ``recovery_time`` seconds the
+    circuit is half-open and lets ``half_open_probes`` calls through; a
+    successful probe closes it, a failed one opens it again for twice as long
+    (up to ``max_recovery_time``).
+
+    Quota (429) and request errors say nothing about the provider's health
+    and are not recorded.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_time: float = 30.0,
+                 max_recovery_time: float = 300.0, half_open_probes: int = 1, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.max_recovery_time = max_recovery_time
+        self.half_open_probes = half_open_probes
+        self.clock = clock
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._open_for = recovery_time
+        self._probes = 0
+        self._generation = 0
+        self._counts = {"rejected": 0, "opened": 0}
+        self._on_change = []
+        self._lock = threading.Lock()
+
+    def on_change(self, callback):
+        """Call ``callback(name, state)`` on every state change."""
+        self._on_change.append(callback)
+
+    def _set_state(self, state: str):
+        if state == self._state:
+            return
+        self._state = state
+        self._generation += 1
+        self._probes = 0
+        if state == OPEN:
+            self._opened_at = self.clock()
+            self._counts["opened"] += 1
+        logger.warning(f"Circuit for {self.name} is now {state}")
+        for callback in self._on_change:
+            callback(self.name, state)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and self.clock() - self._opened_at >= self._open_for:
+                self._set_state(HALF_OPEN)
+            return self._state
+
+    def acquire(self):
+        """
+        Permission to send one call: ``None`` if the circuit refuses it,
+        otherwise a permit to hand back through ``release`` when the call ends.
+        """
+        state = self.state
+        with self._lock:
+            if state == CLOSED:
+                return (CLOSED, self._generation)
+            if state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return (HALF_OPEN, self._generation)
+            self._counts["rejected"] += 1
+            return None
+
+    def release(self, permit):
+        """Free a half-open probe slot whose call ended without a success or failure being recorded."""
+        with self._lock:
+            if permit and permit == (HALF_OPEN, self._generation) and self._probes > 0:
+                self._probes -= 1
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self._state != CLOSED:
+                self._open_for = self.recovery_time
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN:
+                self._open_for = min(self.max_recovery_time, self._open_for * 2)
+                self._set_state(OPEN)
+            elif self._state == CLOSED and self._failures >= self.failure_threshold:
+                self._set_state(OPEN)
+
+    def retry_in(self) -> float:
+        """Seconds until an open circuit lets a probe through."""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self._open_for - (self.clock() - self._opened_at))
+
+    def stats(self) -> dict:
+        state = self.state
+        with self._lock:
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "retry_in": round(max(0.0, self._open_for - (self.clock() - self._opened_at)), 1) if state == OPEN else 0.0,
+                **self._counts,
+            }
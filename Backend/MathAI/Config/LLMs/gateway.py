@@ -0,0 +1,701 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+
+import httpx
+
+from Config.LLMs.circuit_breaker import OPEN, CircuitBreaker
+from Config.LLMs.hedging import Hedging
+from Config.LLMs.key_pool import KeyPool, estimate_tokens
+from Telemetry.metrics import (
+    hedged_call_duration, llm_attempts, llm_circuit_transitions, llm_cost, llm_duration, llm_failovers,
+    llm_hedge_budget_exhausted, llm_hedges, llm_retries, llm_tokens,
+)
+from Telemetry.pricing import cost
+from Telemetry.tracing import tracer
+
+logger = logging.getLogger("llm-gateway")
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class LLMGatewayError(RuntimeError):
+    """A provider call that failed after the gateway's retries.
+
+    ``status`` is the HTTP status, the exception name for transport errors or
+    ``"bad_response"`` for a 200 answer that cannot be parsed; the message starts with it (e.g. ``"429 gemini: ..."``).
+    """
+
+    def __init__(self, provider: str, status, message: str):
+        self.provider = provider
+        self.status = status
+        super().__init__(f"{status} {provider}: {message}")
+
+
+class CircuitOpenError(LLMGatewayError):
+    """Raised without sending anything while the provider's circuit breaker is open."""
+
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(provider, "circuit_open", f"provider unavailable, next probe in {retry_in:.1f}s")
+
+
+class GeminiProvider:
+    """Gemini ``generateContent`` / ``streamGenerateContent`` over the REST API."""
+
+    name = "gemini"
+    base_url = "https://generativelanguage.googleapis.com/v1beta"
+
+    def build_request(self, model: str, messages: list, params: dict, api_key: str, system=None, stream=False):
+        config = {}
+        for param, field in (("temperature", "temperature"), ("top_p", "topP"),
+                             ("top_k", "topK"), ("max_tokens", "maxOutputTokens")):
+            if param in params:
+                config[field] = params[param]
+        body = {
+            "contents": [
+                {"role": "model" if message["role"] == "assistant" else "user",
+                 "parts": [{"text": message["content"]}]}
+                for message in messages
+            ]
+        }
+        if system:
+            body["systemInstruction"] = {"parts": [{"text": system}]}
+        if config:
+            body["generationConfig"] = config
+        method = "streamGenerateContent?alt=sse" if stream else "generateContent"
+        return f"{self.base_url}/models/{model}:{method}", {"x-goog-api-key": api_key}, body
+
+    def parse(self, data: dict) -> str:
+        candidates = data.get("candidates") or []
+        if not candidates:
+            reason = (data.get("promptFeedback") or {}).get("blockReason", "no candidates")
+            raise LLMGatewayError(self.name, "bad_response", f"empty response ({reason})")
+        return self.parse_chunk(data)
+
+    def parse_chunk(self, data: dict) -> str:
+        candidates = data.get("candidates") or [{}]
+        parts = (candidates[0].get("content") or {}).get("parts") or []
+        return "".join(part.get("text", "") for part in parts)
+
+    def usage(self, data: dict):
+        return (data.get("usageMetadata") or {}).get("totalTokenCount")
+
+    def token_counts(self, data: dict):
+        """``(prompt, completion)`` token counts reported by the API, or ``None``."""
+        meta = data.get("usageMetadata") or {}
+        if "promptTokenCount" not in meta:
+            return None
+        return meta["promptTokenCount"], meta.get("candidatesTokenCount", 0)
+
+
+class OpenAICompatibleProvider:
+    """Any provider exposing the OpenAI ``/chat/completions`` endpoint (Groq, OpenRouter)."""
+
+    def __init__(self, name: str, base_url: str):
+        self.name = name
+        self.base_url = base_url
+
+    def build_request(self, model: str, messages: list, params: dict, api_key: str, system=None, stream=False):
+        if system:
+            messages = [{"role": "system", "content": system}] + messages
+        body = {"model": model, "messages": messages, "stream": stream}
+        for param in ("temperature", "top_p", "max_tokens"):
+            if param in params:
+                body[param] = params[param]
+        return f"{self.base_url}/chat/completions", {"Authorization": f"Bearer {api_key}"}, body
+
+    def parse(self, data: dict) -> str:
+        choices = data.get("choices") or []
+        if not choices:
+            raise LLMGatewayError(self.name, "bad_response", "empty response (no choices)")
+        return choices[0]["message"]["content"] or ""
+
+    def parse_chunk(self, data: dict) -> str:
+        choices = data.get("choices") or [{}]
+        return (choices[0].get("delta") or {}).get("content") or ""
+
+    def usage(self, data: dict):
+        return (data.get("usage") or {}).get("total_tokens")
+
+    def token_counts(self, data: dict):
+        """``(prompt, completion)`` token counts reported by the API, or ``None``."""
+        usage = data.get("usage") or {}
+        if "prompt_tokens" not in usage:
+            return None
+        return usage["prompt_tokens"], usage.get("completion_tokens", 0)
+
+
+class LLMGateway:
+    """
+    One asyncio-native entry point for every LLM call in the app.
+
+    Models are addressed as ``"<provider>/<model>"`` (``"gemini/gemini-2.0-flash"``,
+    ``"groq/deepseek-r1-distill-llama-70b"``). Per provider the gateway keeps a
+    pooled ``httpx.AsyncClient`` (HTTP/2 when ``h2`` is installed) and a
+    semaphore capping in-flight calls at ``concurrency[provider]``. Every call
+    shares one timeout and retry policy: transport errors, timeouts, 429 and
+    5xx responses are retried with exponential backoff and jitter, honouring
+    ``Retry-After``.
+
+    Calls that do not pass their own ``api_key`` take one from the provider's
+    ``KeyPool`` and carry it explicitly in the request. A 429 quarantines that
+    key and the retry goes to the key with the most headroom instead of
+    backing off.
+
+    The clients live on a dedicated event loop thread so the same pools serve
+    both coroutines (``await complete(...)`` from any loop) and the synchronous
+    agents running on worker threads (``complete_sync``).
+
+    Each provider has a ``CircuitBreaker``: once it has failed repeatedly,
+    calls to it are refused immediately (``CircuitOpenError``) until a
+    half-open probe succeeds, and retries stop as soon as it opens. Calls
+    given ``fallbacks`` then move on to the next model of their route at once.
+
+    Calls made with ``hedge=<stage>`` for a stage that has a ``HedgePolicy``
+    send a second request (to the stage's alternate model, or the same model
+    on another key) once the first is slower than the stage's recent
+    percentile, and return whichever answers first.
+
+    ``transport`` replaces the network for every provider, e.g. with the
+    offline ``StubTransport`` (see ``use_stub``) or a ``RecordingTransport``.
+    """
+
+    RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+    def __init__(self, providers, key_pools: dict, concurrency: dict, timeout: float, max_retries: int,
+                 backoff_base: float, backoff_max: float, transport=None, hedging: Hedging = None,
+                 breakers: dict = None):
+        self.providers = {provider.name: provider for provider in providers}
+        self.key_pools = key_pools
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.transport = transport
+        self.hedging = hedging or Hedging({}, {})
+        self.breakers = breakers or {}
+        for breaker in self.breakers.values():
+            breaker.on_change(lambda provider, state: llm_circuit_transitions.inc(provider=provider, state=state))
+        self.stubbed = False
+        self._clients = {}
+        self._semaphores = {}
+        self._stats = {name: {"requests": 0, "retries": 0, "errors": 0, "in_flight": 0}
+                       for name in self.providers}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+
+    def add_api_key(self, provider: str, api_key: str):
+        """Add ``api_key`` to ``provider``'s key pool (ignored while answering from the stub)."""
+        if not self.stubbed:
+            self.key_pools[provider].add(api_key)
+
+    def use_stub(self, transport):
+        """
+        Answer every call from ``transport`` instead of the real APIs.
+
+        The key pools are swapped for unlimited ones holding a dummy key, kept in
+        a temporary database, so no API keys are needed and the real pools'
+        quota bookkeeping is left untouched.
+        """
+        path = os.path.join(tempfile.mkdtemp(prefix="llm-stub-"), "keypool.db")
+        for name, pool in list(self.key_pools.items()):
+            stub_pool = KeyPool(name, f"STUB_{pool.env_prefix}", rpm=1e9, tpm=0,
+                                quarantine_base=pool.quarantine_base, quarantine_max=pool.quarantine_max, path=path)
+            stub_pool.add(f"stub-{name}-key")
+            self.key_pools[name] = stub_pool
+        self.transport = transport
+        self.stubbed = True
+        logger.info("LLM gateway is answering from the offline stub")
+
+    def _resolve(self, model: str):
+        provider_name, _, model_name = model.partition("/")
+        provider = self.providers.get(provider_name)
+        if provider is None or not model_name:
+            raise ValueError(f"Unknown model '{model}', expected '<provider>/<model>' with provider in {sorted(self.providers)}")
+        return provider, model_name
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=loop.run_forever, name="llm-gateway", daemon=True)
+                self._thread.start()
+                self._loop = loop
+            return self._loop
+
+    def _client(self, provider) -> httpx.AsyncClient:
+        client = self._clients.get(provider.name)
+        if client is None:
+            limit = self.concurrency.get(provider.name, 8)
+            client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+                limits=httpx.Limits(max_connections=limit, max_keepalive_connections=limit),
+                transport=self.transport,
+            )
+            self._clients[provider.name] = client
+            self._semaphores[provider.name] = asyncio.Semaphore(limit)
+        return client
+
+    def _backoff(self, attempt: int, retry_after=None) -> float:
+        if retry_after:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)
+
+    async def _read_stream(self, provider, response, on_token):
+        """
+        Consume an SSE response, passing each text chunk to ``on_token``.
+        Returns the full text and the last chunk that reported token usage.
+        """
+        chunks, usage = [], {}
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            payload = line[5:].strip()
+            if not payload or payload == "[DONE]":
+                continue
+            data = self._parse(provider, lambda: json.loads(payload))
+            text = self._parse(provider, lambda: provider.parse_chunk(data))
+            if text:
+                on_token(text)
+                chunks.append(text)
+            if provider.usage(data):
+                usage = data
+        return "".join(chunks), usage
+
+    @staticmethod
+    def _parse(provider, read):
+        """
+        Return ``read()``, turning a malformed or empty 200 response into a
+        ``bad_response`` error that is retried and fails over like a 5xx.
+        """
+        try:
+            return read()
+        except LLMGatewayError:
+            raise
+        except (ValueError, LookupError, TypeError, AttributeError) as e:
+            raise LLMGatewayError(provider.name, "bad_response", str(e)[:500] or type(e).__name__) from e
+
+    def _record(self, span, provider, model_name: str, outcome: str, prompt_estimate: int, text: str = None, data=None):
+        """Export one finished call as metrics and span attributes."""
+        llm_duration.observe(span.duration, provider=provider.name, model=model_name, outcome=outcome)
+        span.set_attribute("outcome", outcome)
+        if text is None:
+            return
+        reported = provider.token_counts(data or {})
+        prompt_tokens, completion_tokens = reported or (prompt_estimate, estimate_tokens(text))
+        spend = cost(model_name, prompt_tokens, completion_tokens)
+        llm_tokens.inc(prompt_tokens, provider=provider.name, model=model_name, kind="prompt")
+        llm_tokens.inc(completion_tokens, provider=provider.name, model=model_name, kind="completion")
+        llm_cost.inc(spend, provider=provider.name, model=model_name)
+        span.set_attributes(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            tokens_estimated=reported is None,
+            cost_usd=round(spend, 8),
+        )
+
+    async def _complete(self, prompt: str, model: str, params: dict, api_key, history, system, on_token):
+        provider, model_name = self._resolve(model)
+        breaker = self.breakers.get(provider.name)
+        permit = breaker.acquire() if breaker is not None else True
+        if not permit:
+            raise CircuitOpenError(provider.name, breaker.retry_in())
+        with tracer.span("llm.call", provider=provider.name, model=model_name, stream=on_token is not None) as span:
+            try:
+                return await self._attempts(span, provider, model, model_name, prompt, params, api_key,
+                                            history, system, on_token, breaker)
+            except asyncio.CancelledError:
+                self._record(span, provider, model_name, "cancelled", 0)
+                raise
+            except Exception:
+                self._record(span, provider, model_name, "error", 0)
+                raise
+            finally:
+                if breaker is not None:
+                    breaker.release(permit)
+
+    async def _attempts(self, span, provider, model: str, model_name: str, prompt: str, params: dict, api_key,
+                        history, system, on_token, breaker=None):
+        messages = list(history or []) + [{"role": "user", "content": prompt}]
+        pool = None if api_key else self.key_pools.get(provider.name)
+        if pool is not None and not pool.keys():
+            raise LLMGatewayError(provider.name, 401, f"no API key configured (set {pool.env_prefix})")
+        if pool is None and not api_key:
+            raise LLMGatewayError(provider.name, 401, "no API key configured")
+        estimate = estimate_tokens((system or "") + "".join(message["content"] for message in messages))
+        client = self._client(provider)
+        stats = self._stats[provider.name]
+
+        delivered = False
+
+        def emit(text):
+            nonlocal delivered
+            delivered = True
+            on_token(text)
+
+        async with self._semaphores[provider.name]:
+            stats["in_flight"] += 1
+            try:
+                for attempt in range(self.max_retries + 1):
+                    lease = await pool.acquire_async(estimate) if pool is not None else None
+                    key = lease.api_key if lease else api_key
+                    url, headers, body = provider.build_request(
+                        model_name, messages, params or {}, key, system, stream=on_token is not None
+                    )
+                    stats["requests"] += 1
+                    key_slot = lease.key_id if lease else "explicit"
+                    llm_attempts.inc(provider=provider.name, model=model_name, key_slot=key_slot)
+                    span.set_attributes(key_slot=key_slot, attempts=attempt + 1)
+                    start = time.perf_counter()
+                    status, retry_after = None, None
+                    try:
+                        if on_token is None:
+                            response = await client.post(url, headers=headers, json=body)
+                            status = response.status_code
+                            if status == 200:
+                                data = self._parse(provider, response.json)
+                                text = self._parse(provider, lambda: provider.parse(data))
+                            else:
+                                detail = response.text
+                        else:
+                            async with client.stream("POST", url, headers=headers, json=body) as response:
+                                status = response.status_code
+                                if status == 200:
+                                    text, data = await self._read_stream(provider, response, emit)
+                                else:
+                                    detail = (await response.aread()).decode("utf-8", errors="replace")
+                        if status == 200:
+                            if breaker is not None:
+                                breaker.record_success()
+                            if lease:
+                                await asyncio.to_thread(pool.release, lease, provider.usage(data))
+                            logger.debug(f"{model} answered in {time.perf_counter() - start:.2f}s")
+                            self._record(span, provider, model_name, "ok", estimate, text, data)
+                            return text
+                        error = LLMGatewayError(provider.name, status, detail[:500])
+                        retry_after = response.headers.get("retry-after")
+                    except (httpx.TimeoutException, httpx.TransportError) as e:
+                        error = LLMGatewayError(provider.name, type(e).__name__, str(e) or "transport error")
+                    except LLMGatewayError as e:
+                        # Raised by _parse: the request went through but its answer is unusable
+                        status, error = None, e
+
+                    # Timeouts, transport errors, bad responses and 5xx count against the provider, not the key
+                    if breaker is not None and status != 429 and (status is None or status in self.RETRY_STATUSES):
+                        breaker.record_failure()
+                    # Chunks already handed to on_token cannot be taken back
+                    if delivered or (status is not None and status not in self.RETRY_STATUSES):
+                        raise error
+                    if breaker is not None and breaker.state == OPEN:
+                        raise error
+                    if attempt == self.max_retries:
+                        raise error
+                    stats["retries"] += 1
+                    llm_retries.inc(provider=provider.name, model=model_name)
+                    span.set_attribute("retries", attempt + 1)
+                    span.add_event("retry", status=str(status or error.status), key_slot=key_slot)
+                    if status == 429 and lease:
+                        await asyncio.to_thread(pool.quarantine, lease)
+                        logger.warning(f"{model} call failed ({error}), retrying on another key")
+                        continue
+                    delay = self._backoff(attempt, retry_after)
+                    logger.warning(f"{model} call failed ({error}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+            except Exception:
+                stats["errors"] += 1
+                raise
+            finally:
+                stats["in_flight"] -= 1
+
+    async def _hedged(self, policy, stage: str, prompt: str, model: str, params: dict, api_key, history, system):
+        """
+        Send ``prompt`` to ``model`` and, if it has not answered by the policy's
+        deadline and the stage's budget allows, to the alternate model as well.
+        The first successful answer wins; the other request is cancelled.
+        """
+        alternate = self.hedging.alternate(model)
+        started = time.perf_counter()
+        measured = False
+
+        def primary_done(task):
+            if not task.cancelled() and task.exception() is None:
+                policy.observe_primary(time.perf_counter() - started, measured)
+
+        with tracer.span("llm.hedge", stage=stage, model=model) as span:
+            primary = asyncio.ensure_future(self._complete(prompt, model, params, api_key, history, system, None))
+            primary.add_done_callback(primary_done)
+            tasks, hedge, winner = [primary], None, None
+            try:
+                done, _ = await asyncio.wait(tasks, timeout=policy.delay())
+                if not done:
+                    if policy.admit():
+                        hedge = asyncio.ensure_future(self._complete(
+                            prompt, alternate, params, api_key if alternate == model else None, history, system, None
+                        ))
+                        tasks.append(hedge)
+                        span.add_event("hedge", model=alternate, after=round(time.perf_counter() - started, 3))
+                    else:
+                        llm_hedge_budget_exhausted.inc(stage=stage)
+
+                pending, error = set(tasks), None
+                while pending and winner is None:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in (task for task in tasks if task in done):
+                        if task.exception() is None:
+                            winner = task
+                            break
+                        error = error or task.exception()
+                if winner is None:
+                    raise error
+
+                elapsed = time.perf_counter() - started
+                policy.observe(elapsed, hedge_won=winner is hedge)
+                hedged_call_duration.observe(elapsed, stage=stage)
+                if hedge is not None:
+                    llm_hedges.inc(stage=stage, winner="hedge" if winner is hedge else "primary")
+                    span.set_attributes(hedged=True, winner="hedge" if winner is hedge else "primary")
+                return winner.result()
+            finally:
+                elapsed = time.perf_counter() - started
+                for task in tasks:
+                    if task.done():
+                        continue
+                    if task is primary and winner is not None and winner is hedge and policy.should_measure():
+                        measured = True  # let it finish so the unhedged latency stays measured
+                        continue
+                    task.cancel()
+                    if task is primary:
+                        policy.observe_cancelled(elapsed)
+
+    async def _route(self, models: list, prompt: str, params: dict, api_key, history, system, on_token, hedge):
+        """
+        Try ``models`` in order until one answers. A model whose provider's
+        circuit is open is passed over without a request; one that fails after
+        its retries hands over to the next. Streamed calls can only fail over
+        until their first chunk has been delivered.
+        """
+        delivered = False
+
+        def emit(text):
+            nonlocal delivered
+            delivered = True
+            on_token(text)
+
+        policy = self.hedging.policy(hedge) if on_token is None else None
+        error = None
+        for i, model in enumerate(models):
+            if error is not None:
+                reason = "circuit_open" if isinstance(error, CircuitOpenError) else "error"
+                logger.warning(f"{models[i - 1]} unavailable ({error}), failing over to {model}")
+                llm_failovers.inc(from_model=models[i - 1], to_model=model, reason=reason)
+                span = tracer.current()
+                if span is not None:
+                    span.add_event("failover", from_model=models[i - 1], to_model=model, reason=reason)
+            # An explicit key only belongs to the first model's provider
+            key = api_key if i == 0 else None
+            try:
+                if policy is not None:
+                    return await self._hedged(policy, hedge, prompt, model, params, key, history, system)
+                return await self._complete(prompt, model, params, key, history, system,
+                                            emit if on_token is not None else None)
+            except LLMGatewayError as e:
+                if delivered:
+                    raise
+                error = e
+        raise error
+
+    async def complete(self, prompt: str, model: str, params: dict = None, api_key: str = None,
+                       history: list = None, system: str = None, on_token=None, hedge: str = None,
+                       fallbacks: list = None) -> str:
+        """
+        Send ``prompt`` to ``model`` and return the generated text.
+
+        Args:
+            prompt (str): The user prompt.
+            model (str): ``"<provider>/<model>"``.
+            params (dict, optional): ``temperature``, ``top_p``, ``top_k``, ``max_tokens``.
+            api_key (str, optional): Use this key instead of one from the provider's key pool.
+            history (list, optional): Earlier turns as ``{"role": "user"|"assistant", "content": str}``.
+            system (str, optional): System instruction.
+            on_token (callable, optional): Stream the answer, calling ``on_token(text)`` for each
+                chunk as it arrives. It runs on the gateway loop and must not block.
+            hedge (str, optional): Stage name whose hedging policy applies (see ``Hedging``).
+                Streamed calls and stages without a policy are never hedged.
+            fallbacks (list, optional): Models to fail over to, in order, when ``model``'s
+                provider is unavailable or the call fails.
+
+        Raises:
+            LLMGatewayError: If the provider (and every fallback) still fails after retries;
+                ``CircuitOpenError`` if the last one's circuit is open.
+        """
+        loop = self._ensure_loop()
+        models = [model, *(fallbacks or [])]
+        coro = self._route(models, prompt, params, api_key, history, system, on_token, hedge)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        # LLMGatewayError is a RuntimeError, so the await must stay outside the try
+        if running is loop:
+            return await coro
+        # Keep the caller's span as the parent of the call's span on the gateway loop
+        coro = tracer.bind(coro, tracer.current())
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    async def stream(self, prompt: str, model: str, params: dict = None, api_key: str = None,
+                     history: list = None, system: str = None):
+        """
+        Async iterator over the answer's text chunks, for use from any event loop.
+
+        Takes the same arguments as ``complete``. Closing the iterator early (for
+        example when an HTTP client disconnects) cancels the provider request,
+        so abandoned answers stop consuming quota.
+        """
+        loop = self._ensure_loop()
+        caller = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        finished = object()
+
+        def put(item):
+            try:
+                caller.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                pass  # caller's loop already closed
+
+        future = asyncio.run_coroutine_threadsafe(
+            tracer.bind(self._complete(prompt, model, params, api_key, history, system, put), tracer.current()), loop
+        )
+        future.add_done_callback(lambda _: put(finished))
+        try:
+            while True:
+                item = await queue.get()
+                if item is finished:
+                    break
+                yield item
+            future.result()
+        finally:
+            if not future.done():
+                logger.info(f"{model} stream abandoned, cancelling request")
+                future.cancel()
+
+    def run(self, coro):
+        """Run ``coro`` on the gateway loop and block until it finishes (worker threads only)."""
+        loop = self._ensure_loop()
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("LLMGateway.run cannot be called from the gateway loop; await instead")
+        return asyncio.run_coroutine_threadsafe(tracer.bind(coro, tracer.current()), loop).result()
+
+    def complete_sync(self, prompt: str, model: str, params: dict = None, api_key: str = None,
+                      history: list = None, system: str = None, on_token=None, hedge: str = None,
+                      fallbacks: list = None) -> str:
+        """Blocking ``complete`` for code running on worker threads."""
+        return self.run(self.complete(prompt, model, params, api_key, history, system, on_token, hedge, fallbacks))
+
+    def stats(self) -> dict:
+        return {
+            "http2": HTTP2_AVAILABLE,
+            "providers": {
+                name: {**counters, "key_pool": self.key_pools[name].stats() if name in self.key_pools else None}
+                for name, counters in self._stats.items()
+            },
+            "circuits": {name: breaker.stats() for name, breaker in self.breakers.items()},
+            "hedging": self.hedging.stats(),
+        }
+
+    def close(self):
+        """Close the pooled connections and stop the gateway loop."""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+
+        async def _close():
+            for client in self._clients.values():
+                await client.aclose()
+            self._clients.clear()
+            self._semaphores.clear()
+
+        asyncio.run_coroutine_threadsafe(_close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+
+llm_gateway = LLMGateway(
+    providers=[
+        GeminiProvider(),
+        OpenAICompatibleProvider("groq", "https://api.groq.com/openai/v1"),
+        OpenAICompatibleProvider("openrouter", "https://openrouter.ai/api/v1"),
+    ],
+    key_pools={
+        "gemini": KeyPool(
+            "gemini", "GEMINI_API_KEY",
+            rpm=float(os.environ.get("GEMINI_RPM", 10)),
+            tpm=float(os.environ.get("GEMINI_TPM", 1000000)),
+            quarantine_base=float(os.environ.get("GEMINI_QUARANTINE", 10)),
+            quarantine_max=float(os.environ.get("GEMINI_QUARANTINE_MAX", 300)),
+        ),
+        "groq": KeyPool(
+            "groq", "GROQ_API_KEY",
+            rpm=float(os.environ.get("GROQ_RPM", 30)),
+            tpm=float(os.environ.get("GROQ_TPM", 0)),
+            quarantine_base=float(os.environ.get("GROQ_QUARANTINE", 10)),
+            quarantine_max=float(os.environ.get("GROQ_QUARANTINE_MAX", 300)),
+        ),
+        "openrouter": KeyPool(
+            "openrouter", "OPENROUTER_API_KEY",
+            rpm=float(os.environ.get("OPENROUTER_RPM", 20)),
+            tpm=float(os.environ.get("OPENROUTER_TPM", 0)),
+            quarantine_base=float(os.environ.get("OPENROUTER_QUARANTINE", 10)),
+            quarantine_max=float(os.environ.get("OPENROUTER_QUARANTINE_MAX", 300)),
+        ),
+    },
+    concurrency={
+        "gemini": int(os.environ.get("LLM_GATEWAY_GEMINI_CONCURRENCY", 8)),
+        "groq": int(os.environ.get("LLM_GATEWAY_GROQ_CONCURRENCY", 4)),
+        "openrouter": int(os.environ.get("LLM_GATEWAY_OPENROUTER_CONCURRENCY", 4)),
+    },
+    timeout=float(os.environ.get("LLM_GATEWAY_TIMEOUT", 120)),
+    max_retries=int(os.environ.get("LLM_GATEWAY_RETRIES", 3)),
+    backoff_base=float(os.environ.get("LLM_GATEWAY_BACKOFF", 1.0)),
+    backoff_max=float(os.environ.get("LLM_GATEWAY_BACKOFF_MAX", 30.0)),
+    hedging=Hedging.from_env(),
+    breakers={
+        name: CircuitBreaker(
+            name,
+            failure_threshold=int(os.environ.get("LLM_CIRCUIT_FAILURES", 5)),
+            recovery_time=float(os.environ.get("LLM_CIRCUIT_RECOVERY", 30)),
+            max_recovery_time=float(os.environ.get("LLM_CIRCUIT_RECOVERY_MAX", 300)),
+        )
+        for name in ("gemini", "groq", "openrouter")
+    },
+)
+
+# LLM_STUB=1 (or a recordings file) answers every call offline; LLM_RECORD=<file> records real answers
+if os.environ.get("LLM_STUB"):
+    from Config.LLMs.stub import StubTransport
+    llm_gateway.use_stub(StubTransport.from_file(
+        None if os.environ["LLM_STUB"] == "1" else os.environ["LLM_STUB"],
+        latency=os.environ.get("LLM_STUB_LATENCY"),
+        error_rate=float(os.environ["LLM_STUB_ERROR_RATE"]) if "LLM_STUB_ERROR_RATE" in os.environ else None,
+        seed=int(os.environ["LLM_STUB_SEED"]) if "LLM_STUB_SEED" in os.environ else None,
+        down=[name.strip() for name in os.environ.get("LLM_STUB_DOWN", "").split(",") if name.strip()],
+    ))
+elif os.environ.get("LLM_RECORD"):
+    from Config.LLMs.stub import RecordingTransport
+    llm_gateway.transport = RecordingTransport(os.environ["LLM_RECORD"], httpx.AsyncHTTPTransport(http2=HTTP2_AVAILABLE))
@@ -0,0 +1,198 @@
+import logging
+import math
+import os
+import random
+import threading
+from collections import deque
+
+logger = logging.getLogger("llm-hedging")
+
+
+def _percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def _weighted_percentile(samples, q: float) -> float:
+    """Percentile of ``(value, weight)`` pairs."""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    target, seen = q / 100 * sum(weight for _, weight in ordered), 0.0
+    for value, weight in ordered:
+        seen += weight
+        if seen >= target:
+            return value
+    return ordered[-1][0]
+
+
+class HedgePolicy:
+    """
+    When to hedge the LLM calls of one stage, and how that has worked out.
+
+    The hedge deadline is the ``percentile`` of the stage's recent primary
+    latencies, clamped to ``[min_delay, max_delay]`` (``max_delay`` until
+    ``min_samples`` calls have been seen). Hedges are paid for from a budget:
+    every call adds ``budget`` tokens (up to ``burst``) and each hedge spends
+    one, so at most about ``budget`` of the stage's calls send a second request.
+
+    Latencies are kept twice: ``primary`` (what the call would have taken
+    without hedging, which also sets the deadline) and ``effective`` (what the
+    caller waited). A primary that loses to its hedge is cancelled, so its
+    latency is unknown; instead a ``measure`` share of them is left to finish
+    and counted with weight ``1 / measure``, which keeps the unhedged tail
+    (and with it the deadline) unbiased. With ``measure`` 0, cancelled
+    primaries count with their time at cancellation, a lower bound.
+    """
+
+    def __init__(self, stage: str, budget: float, percentile: float, min_delay: float, max_delay: float,
+                 measure: float = 0.1, window: int = 500, min_samples: int = 20, burst: float = 5.0):
+        self.stage = stage
+        self.budget = budget
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.measure = measure
+        self.min_samples = min_samples
+        self.burst = burst
+        self._tokens = min(1.0, burst)
+        self._primary = deque(maxlen=window)
+        self._effective = deque(maxlen=window)
+        self._counts = {"calls": 0, "hedged": 0, "hedge_wins": 0, "budget_exhausted": 0}
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        """Seconds to wait for the primary call before hedging, and count the call against the budget."""
+        with self._lock:
+            self._counts["calls"] += 1
+            self._tokens = min(self.burst, self._tokens + self.budget)
+            return self._deadline()
+
+    def _deadline(self) -> float:
+        if len(self._primary) < self.min_samples:
+            return self.max_delay
+        return min(self.max_delay, max(self.min_delay, _weighted_percentile(self._primary, self.percentile)))
+
+    def admit(self) -> bool:
+        """Spend one hedge from the budget; False when it is exhausted."""
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                self._counts["hedged"] += 1
+                return True
+            self._counts["budget_exhausted"] += 1
+            return False
+
+    def should_measure(self) -> bool:
+        return random.random() < self.measure
+
+    def observe_primary(self, seconds: float, measured: bool = False):
+        """Latency of a primary request that finished (``measured``: after its hedge had already won)."""
+        with self._lock:
+            self._primary.append((seconds, 1.0 / self.measure if measured else 1.0))
+
+    def observe_cancelled(self, seconds: float):
+        """A primary cancelled after ``seconds`` because its hedge won."""
+        if self.measure <= 0:
+            self.observe_primary(seconds)
+
+    def observe(self, seconds: float, hedge_won: bool):
+        with self._lock:
+            self._effective.append(seconds)
+            if hedge_won:
+                self._counts["hedge_wins"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            primary, effective, counts = list(self._primary), list(self._effective), dict(self._counts)
+            deadline = self._deadline()
+        primary_p99, effective_p99 = _weighted_percentile(primary, 99), _percentile(effective, 99)
+        return {
+            **counts,
+            "budget": self.budget,
+            "hedge_rate": round(counts["hedged"] / counts["calls"], 3) if counts["calls"] else 0.0,
+            "hedge_win_rate": round(counts["hedge_wins"] / counts["hedged"], 3) if counts["hedged"] else 0.0,
+            "deadline": round(deadline, 3),
+            "primary_p50": round(_weighted_percentile(primary, 50), 3),
+            "primary_p99": round(primary_p99, 3),
+            "effective_p50": round(_percentile(effective, 50), 3),
+            "effective_p99": round(effective_p99, 3),
+            "p99_saved": round(max(0.0, primary_p99 - effective_p99), 3),
+        }
+
+
+class Hedging:
+    """
+    Hedging policies by stage, plus the model each hedge is sent to.
+
+    Stages without a policy are never hedged, unless ``default`` holds the
+    ``HedgePolicy`` settings to give every other stage its own policy. A model
+    without an alternate is hedged to itself: the second request goes out on
+    whichever pool key has the most headroom, usually a different one.
+    """
+
+    def __init__(self, policies: dict, alternates: dict, default: dict = None):
+        self.policies = policies
+        self.alternates = alternates
+        self.default = default
+        self._lock = threading.Lock()
+
+    def policy(self, stage: str):
+        if stage is None:
+            return None
+        policy = self.policies.get(stage)
+        if policy is None and self.default is not None:
+            with self._lock:
+                policy = self.policies.setdefault(stage, HedgePolicy(stage, **self.default))
+        return policy
+
+    def alternate(self, model: str) -> str:
+        return self.alternates.get(model, model)
+
+    def stats(self) -> dict:
+        return {
+            "stages": {stage: policy.stats() for stage, policy in list(self.policies.items())},
+            "alternates": dict(self.alternates),
+        }
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build the policies from the environment:
+
+        - ``LLM_HEDGE_STAGES``: comma-separated stages (agent names such as
+          ``VisualizationSpec``, or ``*`` for all), each optionally with its own
+          budget as ``Stage:0.05``. Unset or empty disables hedging.
+        - ``LLM_HEDGE_BUDGET`` (0.1), ``LLM_HEDGE_PERCENTILE`` (95),
+          ``LLM_HEDGE_MIN_DELAY`` (2s), ``LLM_HEDGE_MAX_DELAY`` (30s),
+          ``LLM_HEDGE_MEASURE`` (0.1): defaults for every stage.
+        - ``LLM_HEDGE_ALTERNATES``: ``model=alternate`` pairs separated by
+          commas, e.g. ``groq/deepseek-r1-distill-llama-70b=gemini/gemini-2.0-flash``.
+        """
+        defaults = {
+            "budget": float(os.environ.get("LLM_HEDGE_BUDGET", 0.1)),
+            "percentile": float(os.environ.get("LLM_HEDGE_PERCENTILE", 95)),
+            "min_delay": float(os.environ.get("LLM_HEDGE_MIN_DELAY", 2.0)),
+            "max_delay": float(os.environ.get("LLM_HEDGE_MAX_DELAY", 30.0)),
+            "measure": float(os.environ.get("LLM_HEDGE_MEASURE", 0.1)),
+        }
+        settings = {}
+        for entry in filter(None, (part.strip() for part in os.environ.get("LLM_HEDGE_STAGES", "").split(","))):
+            stage, _, budget = entry.partition(":")
+            try:
+                settings[stage] = {**defaults, **({"budget": float(budget)} if budget else {})}
+            except ValueError:
+                logger.warning(f"Invalid hedging budget in '{entry}', using {defaults['budget']}")
+                settings[stage] = defaults
+        default = settings.pop("*", None)
+        policies = {stage: HedgePolicy(stage, **kwargs) for stage, kwargs in settings.items()}
+        alternates = {}
+        for pair in filter(None, (part.strip() for part in os.environ.get("LLM_HEDGE_ALTERNATES", "").split(","))):
+            model, _, alternate = pair.partition("=")
+            if alternate:
+                alternates[model.strip()] = alternate.strip()
+        if policies or default:
+            logger.info(f"Hedging LLM calls for stages: {', '.join(policies) or 'all'}")
+        return cls(policies, alternates, default)
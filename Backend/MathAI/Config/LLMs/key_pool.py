@@ -0,0 +1,254 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import time
+
+logger = logging.getLogger("key-pool")
+
+KEY_POOL_DB_PATH = os.environ.get("KEY_POOL_DB_PATH", "keypool.db")
+
+# Usage rows older than this no longer count against a key's per-minute quota
+WINDOW = 60.0
+
+
+def key_id(api_key: str) -> str:
+    """Stable, non-secret identifier of an API key (safe to log and store)."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return max(1, len(text) // 4)
+
+
+class KeyLease:
+    """One reserved request slot on a key; hand it back via ``release`` or ``quarantine``."""
+
+    def __init__(self, api_key: str, usage_id: int):
+        self.api_key = api_key
+        self.key_id = key_id(api_key)
+        self.usage_id = usage_id
+
+
+class KeyPool:
+    """
+    Quota-aware scheduler for a provider's API keys, shared by every process.
+
+    Usage lives in SQLite, so all workers of a deployment see the same
+    requests-per-minute and tokens-per-minute figures for each key. ``acquire``
+    reserves a slot on the key with the most headroom (the smaller of its free
+    RPM and TPM fractions) and sleeps only when every key is full or
+    quarantined. Keys that answer with ResourceExhausted are quarantined for an
+    exponentially growing period; a successful call clears their strikes.
+
+    Only key hashes are written to disk. Keys come from ``add`` or, lazily,
+    from the ``<env_prefix>`` and ``<env_prefix><n>`` environment variables.
+    """
+
+    def __init__(self, name: str, env_prefix: str, rpm: float, tpm: float,
+                 quarantine_base: float, quarantine_max: float, path: str = KEY_POOL_DB_PATH):
+        self.name = name
+        self.env_prefix = env_prefix
+        self.rpm = rpm
+        self.tpm = tpm  # 0 disables the token limit
+        self.quarantine_base = quarantine_base
+        self.quarantine_max = quarantine_max
+        self.path = path
+        self._keys = {}
+        self._env_loaded = False
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS key_usage (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    pool TEXT NOT NULL,
+                    key_id TEXT NOT NULL,
+                    ts REAL NOT NULL,
+                    tokens INTEGER NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS key_usage_window ON key_usage (pool, ts)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS key_state (
+                    pool TEXT NOT NULL,
+                    key_id TEXT NOT NULL,
+                    quarantined_until REAL NOT NULL DEFAULT 0,
+                    strikes INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (pool, key_id)
+                )
+                """
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        # Usage rows are short-lived bookkeeping; losing the last few on power loss is harmless
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def add(self, api_key: str):
+        if api_key:
+            self._keys[key_id(api_key)] = api_key
+
+    def keys(self) -> list:
+        if not self._env_loaded:
+            self._env_loaded = True
+            from dotenv import load_dotenv
+            load_dotenv()
+            pattern = re.compile(rf"^{re.escape(self.env_prefix)}\d*$")
+            for name in sorted(os.environ):
+                if pattern.match(name):
+                    self.add(os.environ[name])
+        return list(self._keys.values())
+
+    def _try_acquire(self, tokens: int):
+        """Reserve a slot on the best key; returns ``(lease, None)`` or ``(None, seconds_to_wait)``."""
+        keys = self.keys()
+        if not keys:
+            raise LookupError(f"No API keys configured for {self.name} (set {self.env_prefix}, {self.env_prefix}1, ...)")
+        if self.tpm:
+            tokens = min(tokens, self.tpm)
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM key_usage WHERE pool = ? AND ts < ?", (self.name, now - WINDOW))
+            usage = {
+                row["key_id"]: row
+                for row in conn.execute(
+                    "SELECT key_id, COUNT(*) AS requests, SUM(tokens) AS tokens, MIN(ts) AS oldest "
+                    "FROM key_usage WHERE pool = ? GROUP BY key_id",
+                    (self.name,),
+                )
+            }
+            quarantined = {
+                row["key_id"]: row["quarantined_until"]
+                for row in conn.execute(
+                    "SELECT key_id, quarantined_until FROM key_state WHERE pool = ? AND quarantined_until > ?",
+                    (self.name, now),
+                )
+            }
+
+            best, best_headroom, wait = None, 0.0, None
+            for api_key in keys:
+                kid = key_id(api_key)
+                if kid in quarantined:
+                    delay = quarantined[kid] - now
+                else:
+                    row = usage.get(kid)
+                    used_requests = row["requests"] if row else 0
+                    used_tokens = row["tokens"] if row else 0
+                    free_requests = self.rpm - used_requests
+                    free_tokens = self.tpm - used_tokens if self.tpm else None
+                    if free_requests >= 1 and (free_tokens is None or free_tokens >= tokens):
+                        headroom = free_requests / self.rpm
+                        if free_tokens is not None:
+                            headroom = min(headroom, free_tokens / self.tpm)
+                        if best is None or headroom > best_headroom:
+                            best, best_headroom = api_key, headroom
+                        continue
+                    delay = (row["oldest"] if row else now) + WINDOW - now
+                wait = delay if wait is None else min(wait, delay)
+
+            if best is None:
+                conn.execute("ROLLBACK")
+                return None, max(0.05, wait)
+            cur = conn.execute(
+                "INSERT INTO key_usage (pool, key_id, ts, tokens) VALUES (?, ?, ?, ?)",
+                (self.name, key_id(best), now, tokens),
+            )
+            conn.execute("COMMIT")
+            return KeyLease(best, cur.lastrowid), None
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def acquire(self, tokens: int = 1) -> KeyLease:
+        """Block until a key has room for one request of about ``tokens`` tokens."""
+        while True:
+            lease, wait = self._try_acquire(tokens)
+            if lease is not None:
+                return lease
+            logger.info(f"All {self.name} keys are at quota, waiting {wait:.1f}s")
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int = 1) -> KeyLease:
+        """
+        ``acquire`` for coroutines: the SQLite transaction runs on a worker thread
+        (it can wait up to 30s for another process's write lock) and quota waits
+        use ``asyncio.sleep``, so the event loop is never blocked.
+        """
+        while True:
+            lease, wait = await asyncio.to_thread(self._try_acquire, tokens)
+            if lease is not None:
+                return lease
+            logger.info(f"All {self.name} keys are at quota, waiting {wait:.1f}s")
+            await asyncio.sleep(wait)
+
+    def release(self, lease: KeyLease, tokens: int = None):
+        """Record the call as successful, replacing the token estimate with ``tokens`` if known."""
+        with self._connect() as conn:
+            if tokens is not None:
+                conn.execute("UPDATE key_usage SET tokens = ? WHERE id = ?", (tokens, lease.usage_id))
+            conn.execute(
+                "UPDATE key_state SET strikes = MAX(strikes - 1, 0) WHERE pool = ? AND key_id = ?",
+                (self.name, lease.key_id),
+            )
+
+    def quarantine(self, lease: KeyLease) -> float:
+        """Take the lease's key out of rotation after a quota rejection; returns the pause applied."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT strikes FROM key_state WHERE pool = ? AND key_id = ?", (self.name, lease.key_id)
+            ).fetchone()
+            strikes = row["strikes"] if row else 0
+            pause = min(self.quarantine_max, self.quarantine_base * (2 ** strikes))
+            conn.execute(
+                "INSERT INTO key_state (pool, key_id, quarantined_until, strikes) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (pool, key_id) DO UPDATE SET quarantined_until = excluded.quarantined_until, "
+                "strikes = excluded.strikes",
+                (self.name, lease.key_id, time.time() + pause, strikes + 1),
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        logger.warning(f"{self.name} key {lease.key_id} exhausted, quarantined for {pause:.0f}s")
+        return pause
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._connect() as conn:
+            usage = {
+                row["key_id"]: row
+                for row in conn.execute(
+                    "SELECT key_id, COUNT(*) AS requests, SUM(tokens) AS tokens FROM key_usage "
+                    "WHERE pool = ? AND ts >= ? GROUP BY key_id",
+                    (self.name, now - WINDOW),
+                )
+            }
+            state = {
+                row["key_id"]: row
+                for row in conn.execute("SELECT * FROM key_state WHERE pool = ?", (self.name,))
+            }
+        keys = {}
+        for api_key in self.keys():
+            kid = key_id(api_key)
+            row, st = usage.get(kid), state.get(kid)
+            keys[kid] = {
+                "requests_last_minute": row["requests"] if row else 0,
+                "tokens_last_minute": row["tokens"] if row else 0,
+                "quarantined_for": round(max(0.0, st["quarantined_until"] - now), 1) if st else 0.0,
+                "strikes": st["strikes"] if st else 0,
+            }
+        return {"rpm": self.rpm, "tpm": self.tpm, "keys": keys}
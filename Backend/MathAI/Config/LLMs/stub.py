@@ -0,0 +1,227 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import threading
+
+import httpx
+
+logger = logging.getLogger("llm-stub")
+
+DEFAULT_RESPONSES_PATH = os.path.join(os.path.dirname(__file__), "stub_responses.json")
+
+
+def prompt_sha(prompt: str) -> str:
+    """Identifier of a prompt in recordings."""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def parse_latency(spec):
+    """
+    Parse a latency distribution into a sampler ``f(rng) -> seconds``.
+
+    Accepted forms: a number (fixed), ``"fixed:0.5"``, ``"uniform:0.2,1.5"``,
+    ``"normal:0.8,0.2"`` (clamped at 0) and ``"lognormal:0.8,0.5"`` (median
+    and sigma, which gives the long right tail real LLM calls have).
+    """
+    if isinstance(spec, (int, float)):
+        return lambda rng: float(spec)
+    kind, _, args = str(spec).partition(":")
+    values = [float(v) for v in args.split(",")] if args else []
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: values[0] * math.exp(rng.gauss(0.0, values[1]))
+    raise ValueError(f"Unknown latency distribution '{spec}'")
+
+
+# Provider of each API host, for simulated outages
+PROVIDER_HOSTS = {
+    "generativelanguage.googleapis.com": "gemini",
+    "api.groq.com": "groq",
+    "openrouter.ai": "openrouter",
+}
+
+
+def _request_info(request: httpx.Request):
+    """Return ``(api, model, prompt, stream)`` for a Gemini or OpenAI-compatible request."""
+    body = json.loads(request.content or b"{}")
+    path = request.url.path
+    if ":generateContent" in path or ":streamGenerateContent" in path:
+        model = path.rsplit("/models/", 1)[-1].split(":", 1)[0]
+        contents = body.get("contents") or [{}]
+        prompt = "".join(part.get("text", "") for part in contents[-1].get("parts", []))
+        return "gemini", model, prompt, ":streamGenerateContent" in path
+    messages = body.get("messages") or [{}]
+    return "openai", body.get("model", ""), messages[-1].get("content", ""), bool(body.get("stream"))
+
+
+def _payload(api: str, text: str, final: bool, tokens: int):
+    if api == "gemini":
+        data = {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+        if final:
+            data["usageMetadata"] = {"totalTokenCount": tokens}
+        return data
+    return {
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "delta": {"content": text}}],
+        "usage": {"total_tokens": tokens},
+    }
+
+
+class StubTransport(httpx.AsyncBaseTransport):
+    """
+    Offline stand-in for the Gemini, Groq and OpenRouter HTTP APIs.
+
+    Answers every request from a recordings file after a delay drawn from a
+    latency distribution, so the LLM gateway, key pools and pipelines run
+    unchanged without network access or API keys. Both formats and both
+    modes (plain and SSE streaming) are produced; streamed answers are split
+    into chunks spread over the sampled latency.
+
+    The recordings file is JSON::
+
+        {
+          "latency": {"default": "lognormal:0.8,0.5", "deepseek": "fixed:0.3"},
+          "error_rate": 0.0,
+          "responses": [
+            {"prompt_sha": "<from RecordingTransport>", "text": "..."},
+            {"match": "substring of the prompt", "model": "optional substring of the model", "text": "..."}
+          ],
+          "default": "answer for anything else"
+        }
+
+    A response is picked by exact recorded prompt first, then by the first
+    ``match`` rule contained in the prompt. ``latency`` keys other than
+    ``default`` are matched against the model name. With ``error_rate`` a
+    share of calls answers 503, exercising the gateway's retry path. Calls to
+    the providers in ``down`` fail with a connection error, simulating an
+    outage for the circuit breakers and failover routes.
+    """
+
+    def __init__(self, responses: list, default: str, latency: dict, error_rate: float = 0.0,
+                 seed: int = None, chunk_chars: int = 64, down=()):
+        self.exact = {entry["prompt_sha"]: entry["text"] for entry in responses if "prompt_sha" in entry}
+        self.rules = [entry for entry in responses if "match" in entry]
+        self.default = default
+        self.latency = {key: parse_latency(spec) for key, spec in latency.items()}
+        self.error_rate = error_rate
+        self.chunk_chars = chunk_chars
+        self.down = set(down)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    @classmethod
+    def from_file(cls, path: str = None, latency: str = None, error_rate: float = None, seed: int = None,
+                  down=()):
+        """Load recordings from ``path``; ``latency`` and ``error_rate`` override the file's values."""
+        with open(path or DEFAULT_RESPONSES_PATH, encoding="utf-8") as f:
+            data = json.load(f)
+        latencies = data.get("latency") or {"default": 0.0}
+        if latency is not None:
+            latencies = {"default": latency}
+        return cls(
+            data.get("responses", []),
+            data.get("default", ""),
+            latencies,
+            error_rate=data.get("error_rate", 0.0) if error_rate is None else error_rate,
+            seed=seed,
+            down=down,
+        )
+
+    def answer(self, model: str, prompt: str) -> str:
+        text = self.exact.get(prompt_sha(prompt))
+        if text is not None:
+            return text
+        for rule in self.rules:
+            if rule["match"] in prompt and rule.get("model", "") in model:
+                return rule["text"]
+        return self.default
+
+    def _sample(self, model: str):
+        sampler = next((s for key, s in self.latency.items() if key != "default" and key in model),
+                       self.latency.get("default"))
+        with self._lock:
+            self.calls += 1
+            delay = sampler(self._rng) if sampler else 0.0
+            failed = self._rng.random() < self.error_rate
+        return delay, failed
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        api, model, prompt, stream = _request_info(request)
+        delay, failed = self._sample(model)
+        if PROVIDER_HOSTS.get(request.url.host, request.url.host) in self.down:
+            await asyncio.sleep(delay / 4)
+            raise httpx.ConnectError("stub: provider is down", request=request)
+        if failed:
+            await asyncio.sleep(delay / 4)
+            return httpx.Response(503, json={"error": {"message": "stub: injected failure"}}, request=request)
+        text = self.answer(model, prompt)
+        tokens = max(1, (len(prompt) + len(text)) // 4)
+        if not stream:
+            await asyncio.sleep(delay)
+            return httpx.Response(200, json=_payload(api, text, True, tokens), request=request)
+
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)] or [""]
+
+        async def body():
+            # Time to first token is about a third of the total, the rest is spread over the chunks
+            await asyncio.sleep(delay / 3)
+            for i, chunk in enumerate(chunks):
+                if i:
+                    await asyncio.sleep(2 * delay / 3 / len(chunks))
+                data = _payload(api, chunk, i == len(chunks) - 1, tokens)
+                yield f"data: {json.dumps(data)}\n\n".encode("utf-8")
+
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=body(), request=request)
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """
+    Passes requests to the real APIs and appends every successful
+    non-streaming answer to a recordings file that ``StubTransport`` can
+    replay (entries are keyed by prompt hash; prompts are not stored).
+    """
+
+    def __init__(self, path: str, inner: httpx.AsyncBaseTransport = None):
+        self.path = path
+        self.inner = inner or httpx.AsyncHTTPTransport()
+        self._lock = threading.Lock()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        api, model, prompt, stream = _request_info(request)
+        response = await self.inner.handle_async_request(request)
+        if stream or response.status_code != 200:
+            return response
+        content = await response.aread()
+        try:
+            data = json.loads(content)
+            if api == "gemini":
+                text = "".join(p.get("text", "") for p in data["candidates"][0]["content"]["parts"])
+            else:
+                text = data["choices"][0]["message"]["content"]
+            self._append({"model": model, "prompt_sha": prompt_sha(prompt), "text": text})
+        except (KeyError, IndexError, ValueError) as e:
+            logger.warning(f"Could not record {model} response: {str(e)}")
+        headers = [(k, v) for k, v in response.headers.items() if k.lower() not in ("content-encoding", "content-length")]
+        return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+    def _append(self, entry: dict):
+        with self._lock:
+            data = {"responses": []}
+            if os.path.exists(self.path):
+                with open(self.path, encoding="utf-8") as f:
+                    data = json.load(f)
+            data.setdefault("responses", []).append(entry)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+
+    async def aclose(self):
+        await self.inner.aclose()
@@ -0,0 +1,85 @@
+import logging
+import threading
+
+logger = logging.getLogger("pipeline-registry")
+
+
+class PipelineRegistry:
+    """
+    Process-wide cache of expensive, thread-safe objects.
+
+    Pipelines and their LLM clients hold no per-request state, so one instance
+    of each can serve every request. Objects are built lazily on first use (or
+    eagerly by ``warm``) and reused afterwards.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._factories = {}
+        self._instances = {}
+
+    def register(self, name: str, factory):
+        """Register a zero-argument ``factory`` building the object called ``name``."""
+        self._factories[name] = factory
+
+    def get(self, name: str):
+        """Return the shared instance for ``name``, building it on first use."""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                logger.info(f"Building shared instance: {name}")
+                self._instances[name] = self._factories[name]()
+            return self._instances[name]
+
+    def warm(self):
+        """Build every registered object now, typically at app startup."""
+        for name in self._factories:
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error(f"Failed to warm {name}: {str(e)}")
+
+
+def _video_pipeline():
+    from VideoModel.pipeline import AgenticPipeline
+    return AgenticPipeline()
+
+
+def _visual_pipeline():
+    from VisualModel.pipeline import AgenticPipeline
+    return AgenticPipeline()
+
+
+def _gemini_llm():
+    from Config.LLMs.Gemini.gemini_2_0_flash_thinking_exp_01_21 import GeminiLLM
+    return GeminiLLM()
+
+
+def _image_describer():
+    from CanvasModel.ExtractInfo import ImageDescriber
+    return ImageDescriber()
+
+
+registry = PipelineRegistry()
+registry.register("video_pipeline", _video_pipeline)
+registry.register("visual_pipeline", _visual_pipeline)
+registry.register("gemini_llm", _gemini_llm)
+registry.register("image_describer", _image_describer)
+
+
+def get_video_pipeline():
+    return registry.get("video_pipeline")
+
+
+def get_visual_pipeline():
+    return registry.get("visual_pipeline")
+
+
+def get_gemini_llm():
+    return registry.get("gemini_llm")
+
+
+def get_image_describer():
+    return registry.get("image_describer")
@@ -1,32 +1,74 @@
 from Services.solveModel import solve_math_problem
-from Services.videoModel import generate_video
+from Services.videoModel import generate_video, upgrade_video, best_video
 from Services.visualModel import generate_visual
-from Services.CodeAgent import CodeAgent
-from Services.GeneralAgent import GeneralAgent
-from Services.CanvasAgent import CanvasAgent
+from contextlib import aclosing
+from concurrent.futures import Future
+from Workers.pool import llm_pool, render_pool
+from Workers.singleflight import pipeline_flights, problem_key
+from Workers.streaming import stage_callbacks
+from Services.CodeAgent import CodeAgent, CodeAgentStream
+from Services.GeneralAgent import GeneralAgent, GeneralAgentStream
+from Services.CanvasAgent import CanvasAgent, CanvasAgentStream
 
 class SkethMentorController:
-    def solve_math_problem(self, problem: str) -> str:
+    def solve_math_problem(self, problem: str, on_result=None, on_token=None) -> str:
 
         try:
-            return solve_math_problem(problem)
+            return solve_math_problem(problem, on_result=on_result, on_token=on_token)
         except Exception as e:
             raise Exception(f"Error solving math problem: {str(e)}")
 
-    def generate_video(self, problem: str, host: str, scheme: str) -> dict:
+    def generate_video(self, problem: str, host: str, scheme: str, on_stage=None, on_result=None) -> dict:
         
         try:
-            return generate_video(problem, host, scheme)
+            return generate_video(problem, host, scheme, on_stage=on_stage, on_result=on_result)
         except Exception as e:
             raise Exception(f"Error generating video: {str(e)}")
 
-    def generate_visual(self, problem: str, host: str, scheme: str) -> dict:
+    def upgrade_video(self, params: dict, on_stage=None) -> dict:
         
         try:
-            return generate_visual(problem, host, scheme)
+            return upgrade_video(params, on_stage=on_stage)
+        except Exception as e:
+            raise Exception(f"Error upgrading video: {str(e)}")
+
+    def video_path(self, video_id: str):
+        return best_video(video_id)
+
+    def generate_visual(self, problem: str, host: str, scheme: str, on_stage=None, on_result=None) -> dict:
+        
+        try:
+            return generate_visual(problem, host, scheme, on_stage=on_stage, on_result=on_result)
         except Exception as e:
             raise Exception(f"Error generating video: {str(e)}")
 
+    def submit_video(self, problem: str, host: str, scheme: str, listener=None) -> Future:
+        """
+        Queue generate_video on the render pool, sharing one pipeline run between identical requests.
+
+        Requests for the same problem (ignoring case and whitespace) that arrive
+        while a run is in flight attach to it and receive its result; ``listener``
+        receives its "stage"/"stage_result" events from the moment it attaches.
+        """
+        def run(emit):
+            on_stage, on_result = stage_callbacks(emit)
+            return self.generate_video(problem, host, scheme, on_stage=on_stage, on_result=on_result)
+
+        return pipeline_flights.submit(
+            "generate_video", problem_key(problem, host, scheme), render_pool, run, listener=listener
+        )
+
+    def submit_visual(self, problem: str, host: str, scheme: str, listener=None) -> Future:
+        """Queue generate_visual on the LLM pool, coalescing identical in-flight requests like ``submit_video``."""
+        def run(emit):
+            on_stage, on_result = stage_callbacks(emit)
+            code = self.generate_visual(problem, host, scheme, on_stage=on_stage, on_result=on_result)
+            return {"code": code}
+
+        return pipeline_flights.submit(
+            "generate_visual", problem_key(problem, host, scheme), llm_pool, run, listener=listener
+        )
+
     def generalAgent(self, prompt: str) -> dict:
         
         try:
@@ -47,4 +89,21 @@ class SkethMentorController:
             return CanvasAgent(prompt,image_path=image_path)
         except Exception as e:
             raise Exception(f"Error generating code Agent: {str(e)}")
-    
\ No newline at end of file
+    
+
+    async def _stream(self, chunks, error_message: str):
+        try:
+            async with aclosing(chunks) as stream:
+                async for chunk in stream:
+                    yield chunk
+        except Exception as e:
+            raise Exception(f"{error_message}: {str(e)}")
+
+    def generalAgentStream(self, prompt: str):
+        return self._stream(GeneralAgentStream(prompt), "Error generating General Agent")
+
+    def CodeAgentStream(self, prompt: str):
+        return self._stream(CodeAgentStream(prompt), "Error generating code Agent")
+
+    def CanvasAgentStream(self, prompt: str, image_path: str):
+        return self._stream(CanvasAgentStream(prompt, image_path=image_path), "Error generating code Agent")
@@ -1,10 +1,5 @@
-import os
-import google.generativeai as genai
-from langchain.llms.base import LLM
-from pydantic import Field
-from dotenv import load_dotenv
-from typing import Optional
-from Config.LLMs.Gemini.gemini_2_0_flash_thinking_exp_01_21 import GeminiLLM
+from contextlib import aclosing
+from Config.registry import get_gemini_llm
 
 class SketchMentor():
     """
@@ -13,14 +8,15 @@ class SketchMentor():
     to provide clear, step-by-step solutions and explanations.
     """
     def __init__(self, specialized_instruction, **kwargs):
-        self.LLM = GeminiLLM()
-        self.specialized_instruction = specialized_instruction
+        # The Gemini LLM is shared process-wide, so a SketchMentor per request costs nothing
+        self.LLM = get_gemini_llm()
         if specialized_instruction == None:
             specialized_instruction =  (
             "You are Sketch Mentor, an expert mentor specialized in math and programming problems. "
             "Provide clear, detailed, and step-by-step explanations for each solution. "
             "Focus only on math and programming related content. \n\n"
         )
+        self.specialized_instruction = specialized_instruction
     def _call(self, prompt: str, stop=None):
         full_prompt = self.specialized_instruction + prompt
         
@@ -29,3 +25,13 @@ class SketchMentor():
             return response.text if hasattr(response, 'text') else str(response)
         except Exception as e:
             raise RuntimeError(f"Error calling Gemini API: {str(e)}")
+
+    async def astream(self, prompt: str):
+        """
+        Yield the answer in text chunks as the model produces them.
+        Closing the iterator early cancels the underlying request.
+        """
+        full_prompt = self.specialized_instruction + prompt
+        async with aclosing(self.LLM.astream(full_prompt)) as chunks:
+            async for chunk in chunks:
+                yield chunk
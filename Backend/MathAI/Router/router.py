@@ -1,7 +1,21 @@
 # router.py
+import asyncio
 from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import RedirectResponse, StreamingResponse
 from pydantic import BaseModel
 from Controller.controller import SkethMentorController
+from Workers.pool import llm_pool, render_pool, PoolSaturatedError
+from Workers.jobs import job_manager, JobQueueFullError, DONE, FAILED
+from Workers.streaming import ThreadEventStream, token_events, stage_callbacks
+from Workers.singleflight import pipeline_flights
+from Workers.render_workers import render_workers
+from Cache.stage_cache import stage_cache
+from Cache.render_cache import render_cache
+from Cache.tex_cache import tex_cache
+from Cache.semantic_cache import semantic_cache
+from Config.LLMs.gateway import llm_gateway
+from Telemetry.metrics import metrics
+from Telemetry.tracing import tracer
 
 router = APIRouter(prefix="/math")
 
@@ -10,6 +24,95 @@ class ProblemRequest(BaseModel):
 
 controller = SkethMentorController()
 
+CANVAS_IMAGE_PATH = r"D:\SketchMentor\Backend\MathAI\Assets\canvas.png"
+
+def _saturated(e: PoolSaturatedError) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+job_manager.register(
+    "generate_video",
+    lambda params, on_stage: controller.generate_video(
+        params["problem"], params["host"], params["scheme"], on_stage=on_stage
+    ),
+)
+job_manager.register("upgrade_video", controller.upgrade_video)
+
+@metrics.collector
+def _runtime_metrics():
+    """
+    Cache, pool and coalescing counters exported on /metrics alongside the latency histograms.
+    Runs SQLite queries (key pool stats), so /metrics must stay a plain ``def`` endpoint.
+    """
+    stages = stage_cache.stats()["stages"]
+    renders = render_cache.stats()
+    semantic = semantic_cache.stats()["namespaces"]
+    pools = [llm_pool.stats(), render_pool.stats()]
+    flights = pipeline_flights.stats()
+    gateway = llm_gateway.stats()
+    hedging = gateway["hedging"]["stages"]
+    manim = render_workers.stats()
+    return [
+        ("sketchmentor_stage_cache_lookups_total", "counter", "Stage cache lookups, by result.", [
+            ({"stage": stage, "result": result}, counts[key])
+            for stage, counts in stages.items()
+            for result, key in (("memory_hit", "memory_hits"), ("disk_hit", "disk_hits"), ("miss", "misses"))
+        ]),
+        ("sketchmentor_render_cache_lookups_total", "counter", "Render cache lookups, by result.", [
+            ({"result": "hit"}, renders["hits"]),
+            ({"result": "miss"}, renders["misses"]),
+        ]),
+        ("sketchmentor_semantic_cache_lookups_total", "counter", "Semantic cache lookups, by endpoint and result.", [
+            ({"namespace": namespace, "result": result}, counts[key])
+            for namespace, counts in semantic.items()
+            for result, key in (("hit", "hits"), ("miss", "misses"))
+        ]),
+        ("sketchmentor_pool_in_flight", "gauge", "Tasks running or queued in each worker pool.", [
+            ({"pool": pool["name"]}, pool["in_flight"]) for pool in pools
+        ]),
+        ("sketchmentor_pool_rejected_total", "counter", "Tasks rejected because a worker pool was saturated.", [
+            ({"pool": pool["name"]}, pool["rejected"]) for pool in pools
+        ]),
+        ("sketchmentor_coalesced_requests_total", "counter", "Requests served by an identical in-flight pipeline run.", [
+            ({"endpoint": name}, m["coalesced"]) for name, m in flights.items()
+        ]),
+        ("sketchmentor_pipeline_runs_total", "counter", "Pipeline runs started by the coalescing layer.", [
+            ({"endpoint": name}, m["computations"]) for name, m in flights.items()
+        ]),
+        ("sketchmentor_llm_circuit_open", "gauge", "1 while a provider's circuit breaker refuses calls, 0.5 while half-open.", [
+            ({"provider": name}, {"closed": 0, "half_open": 0.5, "open": 1}[circuit["state"]])
+            for name, circuit in gateway["circuits"].items()
+        ]),
+        ("sketchmentor_llm_hedge_p99_seconds", "gauge",
+         "p99 latency of hedged stages' LLM calls: 'effective' as seen by callers, 'primary' estimated without hedging.", [
+            ({"stage": stage, "latency": latency}, h[f"{latency}_p99"])
+            for stage, h in hedging.items()
+            for latency in ("primary", "effective")
+        ]),
+        ("sketchmentor_render_worker_jobs_total", "counter", "Manim renders on warm render workers, by outcome.", [
+            ({"outcome": outcome}, manim[outcome]) for outcome in ("renders", "failures", "timeouts", "crashes", "recycled")
+        ]),
+    ]
+
+def _event_stream(submit) -> StreamingResponse:
+    """Start the job via ``submit(emit)`` and stream its events; 503 if the pool is saturated."""
+    try:
+        stream = ThreadEventStream(submit).start()
+    except PoolSaturatedError as e:
+        raise _saturated(e)
+    return StreamingResponse(
+        stream.events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _token_stream(chunks, result_key: str) -> StreamingResponse:
+    """Stream ``chunks`` as SSE ``token`` events followed by the full ``result``."""
+    return StreamingResponse(
+        token_events(chunks, result_key),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.post("/solve-math-problem")
 async def solve_math_problem_endpoint(problem_request: ProblemRequest):
     """
@@ -22,11 +125,13 @@ async def solve_math_problem_endpoint(problem_request: ProblemRequest):
         dict: JSON response with the key "code" containing the p5.js code.
 
     Raises:
-        HTTPException: 500 if an error occurs.
+        HTTPException: 503 if the worker pool is saturated, 500 if an error occurs.
     """
     try:
-        code = controller.solve_math_problem(problem_request.problem)
+        code = await llm_pool.run(controller.solve_math_problem, problem_request.problem)
         return {"code": code}
+    except PoolSaturatedError as e:
+        raise _saturated(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -39,19 +144,107 @@ async def generate_video_endpoint(problem_request: ProblemRequest, request: Requ
         problem (str): The problem description to visualize.
 
     Returns:
-        dict: JSON response with "video_path" (URL) and "status".
+        dict: JSON response with "video_path" (URL of the 480p15 preview) and "status";
+        with progressive rendering also "video_id", "stable_path" (see /videos/{video_id})
+        and "upgrade" ({"quality", "job_id", "status"} of the queued high-quality render).
 
     Raises:
-        HTTPException: 500 if an error occurs.
+        HTTPException: 503 if the worker pool is saturated, 500 if an error occurs.
     """
     try:
         scheme = request.url.scheme 
         host = request.url.netloc   
-        result = controller.generate_video(problem_request.problem, host, scheme)
+        result = await asyncio.wrap_future(controller.submit_video(problem_request.problem, host, scheme))
         return result
+    except PoolSaturatedError as e:
+        raise _saturated(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+@router.post("/jobs/generate-video", status_code=202)
+async def submit_video_job_endpoint(problem_request: ProblemRequest, request: Request):
+    """
+    Endpoint to queue a visualization video job and return immediately.
+
+    Request Body:
+        problem (str): The problem description to visualize.
+
+    Returns:
+        dict: JSON response with "job_id" and "status" ("queued").
+
+    Raises:
+        HTTPException: 503 if the job queue is full.
+    """
+    try:
+        job_id = job_manager.submit("generate_video", {
+            "problem": problem_request.problem,
+            "host": request.url.netloc,
+            "scheme": request.url.scheme,
+        })
+        return {"job_id": job_id, "status": "queued"}
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+
+@router.get("/videos/{video_id}")
+async def video_endpoint(video_id: str):
+    """
+    Stable URL of a generated video.
+
+    Redirects to the high-quality render once its upgrade job has finished,
+    and to the 480p15 preview until then.
+
+    Raises:
+        HTTPException: 404 if no version of the video is cached.
+    """
+    path = controller.video_path(video_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+    return RedirectResponse(f"/{path}", status_code=307)
+
+@router.get("/jobs/{job_id}")
+async def job_status_endpoint(job_id: str):
+    """
+    Endpoint reporting the state of a queued job.
+
+    Returns:
+        dict: "job_id", "status" (queued/running/done/failed), the current pipeline
+        "stage", "progress" between 0 and 1, and "error" when the job failed.
+
+    Raises:
+        HTTPException: 404 if the job does not exist.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "progress": job["progress"],
+        "error": job["error"],
+    }
+
+@router.get("/jobs/{job_id}/result")
+async def job_result_endpoint(job_id: str):
+    """
+    Endpoint returning the result of a finished job.
+
+    Returns:
+        dict: The job result, e.g. "video_path" (URL) and "status" for video jobs.
+
+    Raises:
+        HTTPException: 404 if the job does not exist, 409 if it has not finished,
+        500 if it failed.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == FAILED:
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job["status"] != DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return job["result"]
+
 @router.post("/generate-visual")
 async def generate_visual_endpoint(problem_request: ProblemRequest, request: Request):
     """
@@ -64,13 +257,14 @@ async def generate_visual_endpoint(problem_request: ProblemRequest, request: Req
         dict: JSON response with "video_path" (URL) and "status".
 
     Raises:
-        HTTPException: 500 if an error occurs.
+        HTTPException: 503 if the worker pool is saturated, 500 if an error occurs.
     """
     try:
         scheme = request.url.scheme  
         host = request.url.netloc    
-        code = controller.generate_visual(problem_request.problem, host, scheme)
-        return {"code": code}
+        return await asyncio.wrap_future(controller.submit_visual(problem_request.problem, host, scheme))
+    except PoolSaturatedError as e:
+        raise _saturated(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -86,11 +280,13 @@ async def generalAgent_endpoint(problem_request: ProblemRequest):
         dict: JSON response with the key "code" containing the p5.js code.
 
     Raises:
-        HTTPException: 500 if an error occurs.
+        HTTPException: 503 if the worker pool is saturated, 500 if an error occurs.
     """
     try:
-        response = controller.generalAgent(problem_request.problem)
+        response = await llm_pool.run(controller.generalAgent, problem_request.problem)
         return {"response": response}
+    except PoolSaturatedError as e:
+        raise _saturated(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -106,11 +302,13 @@ async def codeAgent_endpoint(problem_request: ProblemRequest):
         dict: JSON response with the key "code" containing the p5.js code.
 
     Raises:
-        HTTPException: 500 if an error occurs.
+        HTTPException: 503 if the worker pool is saturated, 500 if an error occurs.
     """
     try:
-        response = controller.CodeAgent(problem_request.problem)
+        response = await llm_pool.run(controller.CodeAgent, problem_request.problem)
         return {"code": response}
+    except PoolSaturatedError as e:
+        raise _saturated(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -126,11 +324,173 @@ async def canvasAgent_endpoint(problem_request: ProblemRequest):
         dict: JSON response with the key "code" containing the p5.js code.
 
     Raises:
-        HTTPException: 500 if an error occurs.
+        HTTPException: 503 if the worker pool is saturated, 500 if an error occurs.
     """
     try:
-        image_path = "D:\SketchMentor\Backend\MathAI\Assets\canvas.png"
-        response = controller.CanvasAgent(problem_request.problem, image_path)
+        response = await llm_pool.run(controller.CanvasAgent, problem_request.problem, CANVAS_IMAGE_PATH)
         return {"code": response}
+    except PoolSaturatedError as e:
+        raise _saturated(e)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Plain def: the key pool stats query SQLite, so FastAPI runs this on its threadpool, not the event loop
+@router.get("/pools")
+def pools_endpoint():
+    """
+    Endpoint reporting occupancy of the LLM and render worker pools.
+
+    Returns:
+        dict: Per-pool counters (workers, queue limit, in-flight, rejected), plus
+        "gateway" with per-provider LLM gateway requests, retries, errors and in-flight calls,
+        each API key's last-minute usage and quarantine state (keys shown as hashes),
+        provider circuit breaker states and per-stage hedging figures, "render_workers" with the warm
+        Manim processes (idle, renders, failures, timeouts, crashes, recycled), and "coalescing" with per-endpoint pipeline runs started, identical requests
+        coalesced into them and the dedup ratio.
+    """
+    return {
+        "llm": llm_pool.stats(),
+        "render": render_pool.stats(),
+        "gateway": llm_gateway.stats(),
+        "render_workers": render_workers.stats(),
+        "coalescing": pipeline_flights.stats(),
+    }
+
+@router.get("/cache")
+async def cache_stats_endpoint():
+    """
+    Endpoint reporting pipeline stage and render cache metrics.
+
+    Returns:
+        dict: "stages" with the cache mode and per-stage memory/disk hits, misses,
+        stores and hit rate; "renders" with render cache hits, misses and hit rate;
+        "semantic" with per-endpoint near-duplicate prompt hits, misses and hit rate;
+        "tex" with the shared LaTeX cache's renders, formula hits, misses, compilations and hit rate.
+    """
+    return {
+        "stages": stage_cache.stats(),
+        "renders": render_cache.stats(),
+        "semantic": semantic_cache.stats(),
+        "tex": tex_cache.stats(),
+    }
+
+@router.get("/traces")
+async def traces_endpoint(limit: int = 20, trace_id: str = None):
+    """
+    Endpoint returning recently finished request traces from the in-process span buffer.
+
+    Returns:
+        dict: "traces", newest first, each with its root span name, total duration and
+        spans (agent calls, pipeline stages, LLM calls with model, key slot, tokens,
+        cost and retries); with ``trace_id``, only that trace.
+    """
+    if trace_id is not None:
+        return {"traces": [{"trace_id": trace_id, "spans": [s.to_dict() for s in tracer.exporter.spans(trace_id)]}]}
+    return {"traces": tracer.exporter.traces(max(1, limit))}
+
+@router.post("/stream/solve-math-problem")
+async def stream_solve_math_problem_endpoint(problem_request: ProblemRequest):
+    """
+    Streaming variant of /solve-math-problem using Server-Sent Events.
+
+    Events:
+        token: {"step", "text"} chunks of each solver step as the model writes them.
+        stage_result: {"stage", "output"} once a solver step (or the p5.js segments) is done.
+        result: {"code"} with the final p5.js code.
+        error: {"detail"} if solving failed.
+
+    Raises:
+        HTTPException: 503 if the worker pool is saturated.
+    """
+    def run(emit):
+        _, on_result = stage_callbacks(emit)
+        code = controller.solve_math_problem(
+            problem_request.problem,
+            on_result=on_result,
+            on_token=lambda step, text: emit("token", {"step": step, "text": text}),
+        )
+        return {"code": code}
+
+    return _event_stream(lambda emit: llm_pool.submit(run, emit))
+
+@router.post("/stream/generate-video")
+async def stream_generate_video_endpoint(problem_request: ProblemRequest, request: Request):
+    """
+    Streaming variant of /generate-video using Server-Sent Events.
+
+    Events:
+        stage: {"stage", "progress"} when a pipeline stage starts.
+        stage_result: {"stage", "output"} when a pipeline stage finishes.
+        result: {"video_path", "status"} once the video is rendered.
+        error: {"detail"} if generation failed.
+
+    Raises:
+        HTTPException: 503 if the render pool is saturated.
+    """
+    scheme = request.url.scheme
+    host = request.url.netloc
+    return _event_stream(
+        lambda emit: controller.submit_video(problem_request.problem, host, scheme, listener=emit)
+    )
+
+@router.post("/stream/generate-visual")
+async def stream_generate_visual_endpoint(problem_request: ProblemRequest, request: Request):
+    """
+    Streaming variant of /generate-visual using Server-Sent Events.
+
+    Events:
+        stage: {"stage", "progress"} when a pipeline stage starts.
+        stage_result: {"stage", "output"} when a pipeline stage finishes.
+        result: {"code"} with the final visualization code.
+        error: {"detail"} if generation failed.
+
+    Raises:
+        HTTPException: 503 if the worker pool is saturated.
+    """
+    scheme = request.url.scheme
+    host = request.url.netloc
+    return _event_stream(
+        lambda emit: controller.submit_visual(problem_request.problem, host, scheme, listener=emit)
+    )
+
+@router.post("/stream/general-agent")
+async def stream_generalAgent_endpoint(problem_request: ProblemRequest):
+    """
+    Streaming variant of /general-agent using Server-Sent Events.
+
+    Events:
+        token: {"text"} chunks of the answer as the model writes them.
+        result: {"response"} with the full answer.
+        error: {"detail"} if the model call failed.
+
+    Disconnecting cancels the model request.
+    """
+    return _token_stream(controller.generalAgentStream(problem_request.problem), "response")
+
+@router.post("/stream/code-agent")
+async def stream_codeAgent_endpoint(problem_request: ProblemRequest):
+    """
+    Streaming variant of /code-agent using Server-Sent Events.
+
+    Events:
+        token: {"text"} chunks of the answer as the model writes them.
+        result: {"code"} with the full answer.
+        error: {"detail"} if the model call failed.
+
+    Disconnecting cancels the model request.
+    """
+    return _token_stream(controller.CodeAgentStream(problem_request.problem), "code")
+
+@router.post("/stream/canvas-agent")
+async def stream_canvasAgent_endpoint(problem_request: ProblemRequest):
+    """
+    Streaming variant of /canvas-agent using Server-Sent Events.
+
+    Events:
+        token: {"text"} chunks of the answer as the model writes them.
+        result: {"code"} with the full answer.
+        error: {"detail"} if describing the canvas or the model call failed.
+
+    Disconnecting cancels the model request.
+    """
+    return _token_stream(controller.CanvasAgentStream(problem_request.problem, CANVAS_IMAGE_PATH), "code")
\ No newline at end of file
@@ -1,6 +1,22 @@
+import asyncio
+from contextlib import aclosing
 from typing import Optional
 from GeneralAgent.GeneralAgent import SketchMentor
-from CanvasModel.ExtractInfo import ImageDescriber
+from Config.registry import get_image_describer
+from Cache.semantic_cache import semantic_cache
+
+def _specialized_instruction(canvas_description: str) -> str:
+    return (
+        f"From canvas -> {canvas_description}\n\n"
+        "You are Sketch Mentor, an expert mentor specialized in math and programming problems. "
+        "Engage in an interactive, friendly, and conversational style that is both programmatically-oriented and supportive. "
+        "When a user scribbles content from the canvas, analyze the observation and use it as context to deliver an accurate, perfect math or programming solution. "
+        "Provide clear, detailed, and step-by-step explanations for each solution, including hints for solving code, debugging, and rectifying errors. "
+        "Focus exclusively on math and programming related content. "
+        "At the end of each complete response, include a motivating math or programming related line such as 'Keep solving with precision and passion! 🚀' along with relevant emojis like 😊💻👍 to boost engagement. "
+        "Whenever possible, guide the user with hints rather than providing complete answers, but if the user explicitly insists on a full answer, then provide it. "
+        "\n\n"
+    )
 
 def CanvasAgent(prompt: str,image_path: str) -> str:
     """
@@ -14,22 +30,29 @@ def CanvasAgent(prompt: str,image_path: str) -> str:
     Returns:
         str: The solution generated by SketchMentor.
     """
-    describer = ImageDescriber()
+    describer = get_image_describer()
     canvas_description = describer.describe(image_path)
-    specialized_instruction = (
-        f"From canvas -> {canvas_description}\n\n"
-        "You are Sketch Mentor, an expert mentor specialized in math and programming problems. "
-        "Engage in an interactive, friendly, and conversational style that is both programmatically-oriented and supportive. "
-        "When a user scribbles content from the canvas, analyze the observation and use it as context to deliver an accurate, perfect math or programming solution. "
-        "Provide clear, detailed, and step-by-step explanations for each solution, including hints for solving code, debugging, and rectifying errors. "
-        "Focus exclusively on math and programming related content. "
-        "At the end of each complete response, include a motivating math or programming related line such as 'Keep solving with precision and passion! 🚀' along with relevant emojis like 😊💻👍 to boost engagement. "
-        "Whenever possible, guide the user with hints rather than providing complete answers, but if the user explicitly insists on a full answer, then provide it. "
-        "\n\n"
+    sketch_mentor = SketchMentor(specialized_instruction = _specialized_instruction(canvas_description))
+    # The answer depends on what is drawn as much as on the question; the description must match exactly
+    return semantic_cache.get_or_compute(
+        "canvas", prompt, lambda: sketch_mentor._call(prompt), context=canvas_description
     )
 
-    sketch_mentor = SketchMentor(specialized_instruction = specialized_instruction)
-    return sketch_mentor._call(prompt)
+async def CanvasAgentStream(prompt: str, image_path: str):
+    """
+    Streaming variant of CanvasAgent: yields the answer's text chunks.
+    The canvas is described first (off the event loop); closing the iterator
+    early cancels the Gemini request.
+    """
+    describer = get_image_describer()
+    canvas_description = await asyncio.to_thread(describer.describe, image_path)
+    sketch_mentor = SketchMentor(specialized_instruction = _specialized_instruction(canvas_description))
+    answer = semantic_cache.astream_or_compute(
+        "canvas", prompt, lambda: sketch_mentor.astream(prompt), context=canvas_description
+    )
+    async with aclosing(answer) as chunks:
+        async for chunk in chunks:
+            yield chunk
 
 # if __name__ == "__main__":
 #     # Example problem prompt: solving a math equation
@@ -1,5 +1,17 @@
 from typing import Optional
 from GeneralAgent.GeneralAgent import SketchMentor
+from Cache.semantic_cache import semantic_cache
+
+SPECIALIZED_INSTRUCTION = (
+    "You are Sketch Mentor, an expert mentor specialized in math and programming problems. "
+    "Engage in an interactive, friendly, and conversational style that is both programmatically-oriented and supportive. "
+    "Provide clear, detailed, and step-by-step explanations for each solution, including hints for solving code, debugging, and rectifying errors. "
+    "Focus exclusively on math and programming related content. "
+    "At the end of each complete response, include a competitive programic line such as 'Let's code our way to success! 🚀' to motivate solving the problem, and add relevant emojis 😊💻👍 to enhance engagement. "
+    "Whenever possible, guide the user with hints rather than providing complete answers, but if the user explicitly insists on a full answer, then provide it. "
+    "\n\n"
+)
+
 
 def CodeAgent(prompt: str) -> str:
     """
@@ -13,18 +25,17 @@ def CodeAgent(prompt: str) -> str:
     Returns:
         str: The solution generated by SketchMentor.
     """
-    specialized_instruction = (
-        "You are Sketch Mentor, an expert mentor specialized in math and programming problems. "
-        "Engage in an interactive, friendly, and conversational style that is both programmatically-oriented and supportive. "
-        "Provide clear, detailed, and step-by-step explanations for each solution, including hints for solving code, debugging, and rectifying errors. "
-        "Focus exclusively on math and programming related content. "
-        "At the end of each complete response, include a competitive programic line such as 'Let's code our way to success! 🚀' to motivate solving the problem, and add relevant emojis 😊💻👍 to enhance engagement. "
-        "Whenever possible, guide the user with hints rather than providing complete answers, but if the user explicitly insists on a full answer, then provide it. "
-        "\n\n"
-    )
+    sketch_mentor = SketchMentor(specialized_instruction = SPECIALIZED_INSTRUCTION)
+    return semantic_cache.get_or_compute("code", prompt, lambda: sketch_mentor._call(prompt))
 
-    sketch_mentor = SketchMentor(specialized_instruction = specialized_instruction)
-    return sketch_mentor._call(prompt)
+def CodeAgentStream(prompt: str):
+    """
+    Streaming variant of CodeAgent: an async iterator over the answer's text chunks.
+    Closing it early cancels the Gemini request. A near-duplicate of an earlier
+    prompt is answered from the semantic cache as a single chunk.
+    """
+    sketch_mentor = SketchMentor(specialized_instruction = SPECIALIZED_INSTRUCTION)
+    return semantic_cache.astream_or_compute("code", prompt, lambda: sketch_mentor.astream(prompt))
 
 # if __name__ == "__main__":
 #     # Example problem prompt: solving a math equation
@@ -1,5 +1,16 @@
 from typing import Optional
 from GeneralAgent.GeneralAgent import SketchMentor
+from Cache.semantic_cache import semantic_cache
+
+SPECIALIZED_INSTRUCTION = (
+    "You are Sketch Mentor, an expert mentor specialized in math problems. "
+    "Engage in an interactive, friendly, and conversational style that is supportive and fun. "
+    "Provide clear, detailed, and step-by-step explanations for each math solution. "
+    "Focus exclusively on math related content and guide users with hints for solving problems, but if the user insists, provide complete solutions. "
+    "At the end of each complete response, include a motivating math-related line such as 'Keep crunching those numbers, math is magic! ✨🔢' along with relevant emojis to boost engagement. "
+    "\n\n"
+)
+
 
 def GeneralAgent(prompt: str) -> str:
     """
@@ -13,17 +24,17 @@ def GeneralAgent(prompt: str) -> str:
     Returns:
         str: The solution generated by SketchMentor.
     """
-    specialized_instruction = (
-        "You are Sketch Mentor, an expert mentor specialized in math problems. "
-        "Engage in an interactive, friendly, and conversational style that is supportive and fun. "
-        "Provide clear, detailed, and step-by-step explanations for each math solution. "
-        "Focus exclusively on math related content and guide users with hints for solving problems, but if the user insists, provide complete solutions. "
-        "At the end of each complete response, include a motivating math-related line such as 'Keep crunching those numbers, math is magic! ✨🔢' along with relevant emojis to boost engagement. "
-        "\n\n"
-    )
+    sketch_mentor = SketchMentor(specialized_instruction = SPECIALIZED_INSTRUCTION)
+    return semantic_cache.get_or_compute("general", prompt, lambda: sketch_mentor._call(prompt))
 
-    sketch_mentor = SketchMentor(specialized_instruction = specialized_instruction)
-    return sketch_mentor._call(prompt)
+def GeneralAgentStream(prompt: str):
+    """
+    Streaming variant of GeneralAgent: an async iterator over the answer's text chunks.
+    Closing it early cancels the Gemini request. A near-duplicate of an earlier
+    prompt is answered from the semantic cache as a single chunk.
+    """
+    sketch_mentor = SketchMentor(specialized_instruction = SPECIALIZED_INSTRUCTION)
+    return semantic_cache.astream_or_compute("general", prompt, lambda: sketch_mentor.astream(prompt))
 
 # if __name__ == "__main__":
 #     # Example problem prompt: solving a math equation
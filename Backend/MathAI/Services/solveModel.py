@@ -1,30 +1,76 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from SolveProblem.agent import GeminiP5JSGenerator, FullcodeGenerator
 from SolveProblem.visualAndSolve import MathProblemSolver
+from Telemetry.tracing import tracer
 
-def solve_math_problem(problem: str, host: str = "localhost:8001", scheme: str = "http") -> str:
+logger = logging.getLogger("solve-model")
+
+SEGMENT_CONCURRENCY = int(os.environ.get("SEGMENT_CONCURRENCY", 4))
+
+def generate_segment_codes(segments: list) -> list:
+    """
+    Turn solver segments into p5.js code, preserving segment order.
+
+    Text segments are converted concurrently (bounded by SEGMENT_CONCURRENCY);
+    the LLM gateway's key pool spreads the calls over every configured Gemini
+    key. Code segments pass through as-is. Per-segment latency and the critical
+    path are logged.
+    """
+    generator = GeminiP5JSGenerator()
+
+    def convert(indexed_segment):
+        i, segment = indexed_segment
+        if segment["type"] != "text":
+            return segment["content"], 0.0
+        start = time.perf_counter()
+        return generator.generate_p5js_code(segment["content"]), time.perf_counter() - start
+
+    started = time.perf_counter()
+    workers = max(1, min(SEGMENT_CONCURRENCY, len(segments)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="p5js-segment") as executor:
+        results = list(executor.map(tracer.wrap(convert), enumerate(segments)))
+    wall = time.perf_counter() - started
+
+    latencies = [latency for _, latency in results]
+    for i, latency in enumerate(latencies):
+        if latency:
+            logger.info(f"Segment {i} generated in {latency:.2f}s")
+    if latencies:
+        logger.info(
+            f"Generated {len(segments)} segments in {wall:.2f}s with {workers} workers "
+            f"(critical path {max(latencies):.2f}s, sequential {sum(latencies):.2f}s)"
+        )
+    return [code for code, _ in results]
+
+@tracer.traced("solve_math_problem")
+def solve_math_problem(problem: str, host: str = "localhost:8001", scheme: str = "http", on_result=None, on_token=None) -> str:
     """
     Solve the math problem and generate the corresponding p5.js visualization code.
 
     Args:
         problem (str): The math problem to be solved.
+        on_result (callable, optional): Called as ``on_result(step, output)`` after each
+            solver step and once the per-segment code is ready.
+        on_token (callable, optional): Called as ``on_token(step, text)`` for each chunk
+            streamed from the solver's chat model.
 
     Returns:
         str: The generated p5.js code.
     """
     solver = MathProblemSolver()
-    text_to_code = GeminiP5JSGenerator()
     full_code_generator = FullcodeGenerator()
     
-    final_result = solver.solve_math_problem(problem)
+    final_result = solver.solve_math_problem(problem, on_result=on_result, on_token=on_token)
+    segment_codes = generate_segment_codes(list(final_result.values()))
+    if on_result is not None:
+        on_result("segments", segment_codes)
     separate_code = ""
-    for i, segment in enumerate(final_result.values()):
-        if segment["type"] == "text":
-            code = text_to_code.generate_p5js_code(segment["content"])
-            separate_code += f"{i} th order/segment code\n"
-            separate_code += code
-        else:
-            separate_code += f"{i} th order/segment code\n"
-            separate_code += segment["content"]
+    for i, code in enumerate(segment_codes):
+        separate_code += f"{i} th order/segment code\n"
+        separate_code += code
     
     full_code = full_code_generator.generate_p5js_code(separate_code)
     return full_code
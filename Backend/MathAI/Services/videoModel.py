@@ -1,13 +1,196 @@
 import logging
 import os
+import re
 import subprocess
 import uuid
+from Cache.render_cache import render_cache
+from Cache.segment_cache import segment_cache
+from Cache.stage_cache import stage_cache
+from Cache.tex_cache import tex_cache
+from Telemetry.metrics import stage_duration
+from VideoModel.static_check import blocking_issues, check_scene, format_issues
+from Telemetry.tracing import tracer
+from Workers.jobs import job_manager, JobQueueFullError
+from Workers.render_workers import RenderUnavailable, render_workers
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("video-generator")
 
-def generate_video(problem: str, host: str = "localhost:8001", scheme: str = "http"):
+# Manim quality preset -> (CLI flags, output folder)
+QUALITIES = {
+    "low_quality": (["-pql"], "480p15"),
+    "medium_quality": (["-qm"], "720p30"),
+    "high_quality": (["-qh"], "1080p60"),
+}
+PREVIEW_QUALITY = "low_quality"
+# Rendered in the background once the preview is out; "off" disables progressive rendering
+UPGRADE_QUALITY = os.environ.get("RENDER_UPGRADE_QUALITY", "high_quality")
+SCENE_NAME = "VisualizationVideo"
+# Diagnose-and-render retries after a failed preview; unchanged animations come from the segment cache
+RENDER_FIX_ATTEMPTS = int(os.environ.get("RENDER_FIX_ATTEMPTS", 2))
+
+def _finished_segments(segment_dir: str, seeded: set) -> set:
+    """Segments a failed render wrote, minus the newest one, which it may have been writing when it stopped."""
+    try:
+        written = [entry for entry in os.scandir(segment_dir)
+                   if entry.name not in seeded and segment_cache.pattern.fullmatch(entry.name)]
+    except OSError:
+        return set()
+    written.sort(key=lambda entry: entry.stat().st_mtime_ns)
+    return {entry.name for entry in written[:-1]}
+
+def _render_cli(file_path: str, scene_name: str, quality: str) -> str:
+    """Render with a fresh ``manim`` process and return the video path relative to the working directory."""
+    tex_dir, seeded = tex_cache.checkout()
+    segment_dir, segments_seeded = segment_cache.checkout()
+    config_file = os.path.join(tex_dir, "manim.cfg")
+    with open(config_file, "w") as f:
+        f.write(
+            f"[CLI]\ntex_dir = {os.path.abspath(tex_dir)}\n"
+            f"partial_movie_dir = {os.path.abspath(segment_dir)}\n"
+        )
+    quality_flags, quality_dir = QUALITIES[quality]
+    manim_command = ["manim", *quality_flags, "--config_file", config_file, file_path, scene_name]
+    logger.info(f"Running Manim command: {' '.join(manim_command)}")
+    
+    proc_result = None
+    try:
+        proc_result = subprocess.run(manim_command, capture_output=True, text=True)
+    finally:
+        tex = tex_cache.checkin(tex_dir, seeded)
+        succeeded = proc_result is not None and proc_result.returncode == 0
+        complete = None if succeeded else _finished_segments(segment_dir, segments_seeded)
+        segments = segment_cache.checkin(segment_dir, segments_seeded, complete=complete)
+    tracer.current().set_attributes(
+        returncode=proc_result.returncode,
+        **{f"tex.{key}": value for key, value in tex.items()},
+        **{f"segments.{key}": value for key, value in segments.items()},
+    )
+    if proc_result.returncode != 0:
+        logger.error(f"Manim command failed with error: {proc_result.stderr}")
+        raise Exception(f"Manim error: {proc_result.stderr}")
+    
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    output_dir = os.path.join("media", "videos", base_name, quality_dir)
+    output_file = os.path.join(output_dir, f"{scene_name}.mp4")
+    
+    if not os.path.exists(output_file):
+        logger.error(f"Output video file not found at: {output_file}")
+        expected_dir = os.path.join(os.getcwd(), "media", "videos", base_name)
+        if os.path.exists(expected_dir):
+            for root, dirs, files in os.walk(expected_dir):
+                for file in files:
+                    if file.endswith(".mp4"):
+                        found_file = os.path.join(root, file)
+                        logger.info(f"Found video at: {found_file}")
+                        relative_path = os.path.relpath(found_file, os.path.join(os.getcwd(), "media"))
+                        output_file = os.path.join("media", relative_path)
+                        break
+        else:
+            logger.error(f"Expected directory not found: {expected_dir}")
+            raise Exception("Video generation failed - output file not found")
+    return output_file
+
+def _render_scene(code: str, scene_name: str, quality: str) -> str:
+    """Render ``scene_name`` from ``code`` at ``quality`` and return the video path relative to the working directory."""
+    unique_id = uuid.uuid4().hex[:8]
+    file_name = f"manim_visualization_{unique_id}.py"
+    file_path = os.path.join(os.getcwd(), file_name)
+    
+    logger.info(f"Writing generated code to {file_path}")
+    with open(file_path, "w") as f:
+        f.write(code)
+    
+    span = tracer.current()
+    try:
+        if render_workers.enabled:
+            span.set_attribute("renderer", "worker")
+            try:
+                return render_workers.render(code, file_path, scene_name, quality)
+            except RenderUnavailable as e:
+                logger.warning(f"Render workers unavailable, using the Manim CLI: {str(e)}")
+        span.set_attribute("renderer", "cli")
+        return _render_cli(file_path, scene_name, quality)
+    finally:
+        try:
+            os.remove(file_path)
+        except Exception as e:
+            logger.warning(f"Could not remove temporary file {file_path}: {str(e)}")
+
+def _upgrade_key(video_id: str, quality: str) -> str:
+    return f"{video_id}-{QUALITIES[quality][1]}"
+
+def best_video(video_id: str):
+    """
+    Path of the best rendered version of a video (the upgrade once it is done,
+    the preview until then), or ``None`` if neither is cached.
+    """
+    if not re.fullmatch(r"[0-9a-f]{64}", video_id):
+        return None
+    keys = [video_id]
+    if UPGRADE_QUALITY in QUALITIES:
+        keys.insert(0, _upgrade_key(video_id, UPGRADE_QUALITY))
+    for key in keys:
+        path = render_cache.path(key)
+        if path:
+            return path
+    return None
+
+def _schedule_upgrade(code: str, video_id: str, host: str, scheme: str) -> dict:
+    """Queue the high-quality render of a previewed video and describe it for the response."""
+    if UPGRADE_QUALITY not in QUALITIES:
+        return {}
+    upgrade = {"quality": QUALITIES[UPGRADE_QUALITY][1], "job_id": None}
+    if render_cache.path(_upgrade_key(video_id, UPGRADE_QUALITY)):
+        upgrade["status"] = "done"
+    else:
+        try:
+            upgrade["job_id"] = job_manager.submit("upgrade_video", {
+                "code": code,
+                "video_id": video_id,
+                "quality": UPGRADE_QUALITY,
+                "host": host,
+                "scheme": scheme,
+            })
+            upgrade["status"] = "queued"
+        except JobQueueFullError:
+            logger.warning(f"Job queue full, not upgrading video {video_id[:12]}")
+            upgrade["status"] = "skipped"
+    return {
+        "video_id": video_id,
+        "stable_path": f"{scheme}://{host}/math/videos/{video_id}",
+        "upgrade": upgrade,
+    }
+
+@tracer.traced("upgrade_video")
+def upgrade_video(params: dict, on_stage=None) -> dict:
+    """
+    Job handler rendering a previewed video again at ``params["quality"]``.
+
+    The result is stored in the render cache next to the preview, where
+    ``best_video`` (and so the video's stable URL) picks it up. A failed
+    upgrade fails the job and leaves the preview in place.
+    
+    Returns:
+        dict: "video_path" (URL of the upgraded video), "video_id" and "quality".
+    """
+    video_id, quality = params["video_id"], params["quality"]
+    key = _upgrade_key(video_id, quality)
+    output_file = render_cache.path(key)
+    if output_file is None:
+        if on_stage is not None:
+            on_stage("render", 0.0)
+        with tracer.span("stage render", pipeline="video", stage="render_upgrade", cache="miss", quality=quality) as span:
+            output_file = _render_scene(params["code"], SCENE_NAME, quality)
+        stage_duration.observe(span.duration, pipeline="video", stage="render_upgrade", cache="miss")
+        output_file = render_cache.store(key, output_file) or output_file
+    video_url = f"{params['scheme']}://{params['host']}/{output_file}"
+    logger.info(f"Upgraded video {video_id[:12]} to {QUALITIES[quality][1]}: {video_url}")
+    return {"video_path": video_url, "video_id": video_id, "quality": QUALITIES[quality][1]}
+
+@tracer.traced("generate_video")
+def generate_video(problem: str, host: str = "localhost:8001", scheme: str = "http", on_stage=None, on_result=None):
     """
     Generates a visualization video for the given problem description.
     
@@ -15,69 +198,88 @@ def generate_video(problem: str, host: str = "localhost:8001", scheme: str = "ht
         problem (str): The problem description to visualize.
         host (str): The hostname used for constructing the video URL.
         scheme (str): The URL scheme (e.g. "http" or "https").
+        on_stage (callable, optional): Called as ``on_stage(stage, progress)`` when each
+              pipeline stage (and finally "render") starts. A failed preview render is
+              diagnosed and rendered again up to ``RENDER_FIX_ATTEMPTS`` times.
+        on_result (callable, optional): Called as ``on_result(stage, output)`` when each
+              pipeline stage finishes.
     
     Returns:
         dict: A dictionary with keys "video_path" (the URL to the video) and "status"
-              indicating whether the operation was a success or a fallback.
+              indicating whether the operation was a success or a fallback. Unless
+              progressive rendering is off (``RENDER_UPGRADE_QUALITY=off``), "video_path"
+              is the 480p15 preview and the dict also holds "video_id", "stable_path"
+              (a URL redirecting to the best version rendered so far) and "upgrade" with
+              the quality, "job_id" and "status" of the background high-quality render,
+              which can be followed through the job API.
     """
     logger.info(f"Received video generation request for problem: {problem}")
     try:
-        from ..VideoModel.pipeline import AgenticPipeline
+        from VideoModel.pipeline import STAGES
+        from Config.registry import get_video_pipeline
         
-        pipeline = AgenticPipeline()
-        pipeline_result = pipeline.run(problem)
+        pipeline = get_video_pipeline()
+        pipeline_result = pipeline.run(problem, on_stage=on_stage, on_result=on_result)
         
         if pipeline_result["status"] not in ["success", "fallback"]:
             logger.error(f"Pipeline failed with status: {pipeline_result['status']}")
             raise Exception("Pipeline failed to generate code.")
         
-        unique_id = uuid.uuid4().hex[:8]
-        file_name = f"manim_visualization_{unique_id}.py"
-        file_path = os.path.join(os.getcwd(), file_name)
+        code = pipeline_result["code"]
+        # Code whose preview needed a render fix before is rendered (and upgraded) in its fixed form
+        fix_key = stage_cache.make_key("render_fix", "", "", code)
+        code = stage_cache.get("render_fix", fix_key) or code
+        cache_key = render_cache.key(code, QUALITIES[PREVIEW_QUALITY][0], SCENE_NAME)
+        with tracer.span("stage render", pipeline="video", stage="render") as span:
+            cached_file = render_cache.lookup(cache_key)
+            span.set_attribute("cache", "hit" if cached_file else "miss")
+        if cached_file:
+            stage_duration.observe(span.duration, pipeline="video", stage="render", cache="hit")
+            video_url = f"{scheme}://{host}/{cached_file}"
+            logger.info(f"Serving previously rendered video: {video_url}")
+            return {"video_path": video_url, "status": pipeline_result["status"],
+                    **_schedule_upgrade(code, cache_key, host, scheme)}
         
-        logger.info(f"Writing generated code to {file_path}")
-        with open(file_path, "w") as f:
-            f.write(pipeline_result["code"])
+        if on_stage is not None:
+            on_stage("render", STAGES.index("render") / len(STAGES))
         
-        scene_name = "VisualizationVideo"
-        manim_command = ["manim", "-pql", file_path, scene_name]
-        logger.info(f"Running Manim command: {' '.join(manim_command)}")
+        render_code = code
+        for attempt in range(RENDER_FIX_ATTEMPTS + 1):
+            try:
+                # Scenes that cannot render (e.g. an unchecked fallback) are rejected without starting Manim
+                issues = blocking_issues(check_scene(render_code, SCENE_NAME))
+                if issues:
+                    raise Exception(format_issues(issues))
+                # A scene that fails the cheap preview never reaches the expensive upgrade render
+                with tracer.span("stage render", pipeline="video", stage="render", cache="miss", attempt=attempt) as span:
+                    output_file = _render_scene(render_code, SCENE_NAME, PREVIEW_QUALITY)
+                stage_duration.observe(span.duration, pipeline="video", stage="render", cache="miss")
+                break
+            except Exception as e:
+                if attempt == RENDER_FIX_ATTEMPTS:
+                    raise
+                logger.warning(f"Render failed (attempt {attempt + 1}/{RENDER_FIX_ATTEMPTS + 1}), diagnosing: {str(e)[:200]}")
+                # Only the animations after the fix have to be encoded again
+                with tracer.span("stage render_fix", pipeline="video", stage="render_fix", attempt=attempt) as span:
+                    fixed_code = pipeline.error_diagnosis.process(render_code, (getattr(e, "log", "") or str(e))[-3000:])
+                stage_duration.observe(span.duration, pipeline="video", stage="render_fix", cache="none")
+                if not fixed_code or fixed_code == render_code:
+                    raise
+                render_code = fixed_code
         
-        proc_result = subprocess.run(manim_command, capture_output=True, text=True)
-        if proc_result.returncode != 0:
-            logger.error(f"Manim command failed with error: {proc_result.stderr}")
-            raise Exception(f"Manim error: {proc_result.stderr}")
+        if render_code != code:
+            stage_cache.put("render_fix", fix_key, render_code)
+            cache_key = render_cache.key(render_code, QUALITIES[PREVIEW_QUALITY][0], SCENE_NAME)
         
-        base_name = os.path.splitext(os.path.basename(file_path))[0]
-        quality = "480p15"
-        output_dir = os.path.join("media", "videos", base_name, quality)
-        output_file = os.path.join(output_dir, f"{scene_name}.mp4")
-        
-        if not os.path.exists(output_file):
-            logger.error(f"Output video file not found at: {output_file}")
-            expected_dir = os.path.join(os.getcwd(), "media", "videos", base_name)
-            if os.path.exists(expected_dir):
-                for root, dirs, files in os.walk(expected_dir):
-                    for file in files:
-                        if file.endswith(".mp4"):
-                            found_file = os.path.join(root, file)
-                            logger.info(f"Found video at: {found_file}")
-                            relative_path = os.path.relpath(found_file, os.path.join(os.getcwd(), "media"))
-                            output_file = os.path.join("media", relative_path)
-                            break
-            else:
-                logger.error(f"Expected directory not found: {expected_dir}")
-                raise Exception("Video generation failed - output file not found")
+        cached_file = render_cache.store(cache_key, output_file)
+        if cached_file:
+            output_file = cached_file
         
         video_url = f"{scheme}://{host}/{output_file}"
         logger.info(f"Video generated successfully at: {video_url}")
         
-        try:
-            os.remove(file_path)
-        except Exception as e:
-            logger.warning(f"Could not remove temporary file {file_path}: {str(e)}")
-        
-        return {"video_path": video_url, "status": pipeline_result["status"]}
+        return {"video_path": video_url, "status": pipeline_result["status"],
+                **(_schedule_upgrade(render_code, cache_key, host, scheme) if cached_file else {})}
     
     except Exception as e:
         logger.exception(f"Error in video generation: {str(e)}")
@@ -7,7 +7,7 @@ import uuid
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("video-generator")
 
-def generate_visual(problem: str, host: str = "localhost:8001", scheme: str = "http"):
+def generate_visual(problem: str, host: str = "localhost:8001", scheme: str = "http", on_stage=None, on_result=None):
     """
     Generates a visualization video for the given problem description.
     
@@ -15,6 +15,10 @@ def generate_visual(problem: str, host: str = "localhost:8001", scheme: str = "h
         problem (str): The problem description to visualize.
         host (str): The hostname used for constructing the video URL.
         scheme (str): The URL scheme (e.g. "http" or "https").
+        on_stage (callable, optional): Called as ``on_stage(stage, progress)`` when each
+            pipeline stage starts.
+        on_result (callable, optional): Called as ``on_result(stage, output)`` when each
+            pipeline stage finishes.
     
     Returns:
         dict: A dictionary with keys "video_path" (the URL to the video) and "status"
@@ -22,9 +26,9 @@ def generate_visual(problem: str, host: str = "localhost:8001", scheme: str = "h
     """
     logger.info(f"Received video generation request for problem: {problem}")
     try:
-        from ..VisualModel.pipeline import AgenticPipeline
-        pipeline = AgenticPipeline()
-        pipeline_result = pipeline.run(problem)
+        from Config.registry import get_visual_pipeline
+        pipeline = get_visual_pipeline()
+        pipeline_result = pipeline.run(problem, on_stage=on_stage, on_result=on_result)
         
         if pipeline_result["status"] not in ["success", "fallback"]:
             logger.error(f"Pipeline failed with status: {pipeline_result['status']}")
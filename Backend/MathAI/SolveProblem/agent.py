@@ -1,53 +1,24 @@
-import os
-import time
-import google.generativeai as genai
-from google.generativeai import types
 from .prompt import generation_prompt_template, validation_prompt_template, full_code_generation_prompt, full_code_validation_prompt
 from dotenv import load_dotenv
+from Config.LLMs.gateway import llm_gateway
+
+MODEL = "gemini/gemini-2.0-flash-thinking-exp-01-21"
+GENERATION_PARAMS = {"temperature": 0.7, "top_p": 0.95, "top_k": 64, "max_tokens": 65536}
 class GeminiP5JSGenerator:
     """
     A class to generate and refine p5.js code using the Gemini API.
-    Alternates between two API keys for each request.
+    Each request is sent with the key that currently has the most quota left.
     """
     def __init__(self):
         load_dotenv()
-        # Load API keys from environment variables.
-        self.api_keys = [
-            os.environ.get("GEMINI_API_KEY1"),
-            os.environ.get("GEMINI_API_KEY2")
-        ]
-        self.key_index = 0
-
-    def get_model(self):
-        """
-        Configure the Gemini API with the next API key and return the model.
-        """
-        genai.configure(api_key=self.api_keys[self.key_index])
-        model = genai.GenerativeModel("gemini-2.0-flash-thinking-exp-01-21")  # Adjust model name if needed
-        self.key_index = (self.key_index + 1) % len(self.api_keys)
-        return model
 
     def call_api(self, prompt):
         """
-        Call the Gemini API with the provided prompt using the non-streaming method.
+        Call the Gemini API through the LLM gateway, which picks the key from the
+        shared key pool and retries transient or quota errors on another key.
         Returns the generated text.
         """
-        generation_config = types.GenerationConfig(
-            temperature=0.7,
-            top_p=0.95,
-            top_k=64,
-            max_output_tokens=65536
-        )
-        model = self.get_model()
-        try:
-            response = model.generate_content(prompt, generation_config=generation_config)
-            return response.text
-        except Exception as e:
-            print(f"Error with API key {self.api_keys[(self.key_index - 1) % len(self.api_keys)]}: {e}")
-            time.sleep(1)
-            model = self.get_model()
-            response = model.generate_content(prompt, generation_config=generation_config)
-            return response.text
+        return llm_gateway.complete_sync(prompt, MODEL, GENERATION_PARAMS, hedge="P5JSGenerator")
 
     def generate_p5js_code(self, input_text):
         """
@@ -72,46 +43,18 @@ class GeminiP5JSGenerator:
 class FullcodeGenerator:
     """
     A class to generate and refine p5.js code using the Gemini API.
-    Alternates between two API keys for each request.
+    Each request is sent with the key that currently has the most quota left.
     """
     def __init__(self):
-        # Load API keys from environment variables.
-        self.api_keys = [
-            os.environ.get("GEMINI_API_KEY3"),
-            os.environ.get("GEMINI_API_KEY4")
-        ]
-        self.key_index = 0
-
-    def get_model(self):
-        """
-        Configure the Gemini API with the next API key and return the model.
-        """
-        genai.configure(api_key=self.api_keys[self.key_index])
-        model = genai.GenerativeModel("gemini-2.0-flash-thinking-exp-01-21")  # Adjust model name if needed
-        self.key_index = (self.key_index + 1) % len(self.api_keys)
-        return model
+        load_dotenv()
 
     def call_api(self, prompt):
         """
-        Call the Gemini API with the provided prompt using the non-streaming method.
+        Call the Gemini API through the LLM gateway, which picks the key from the
+        shared key pool and retries transient or quota errors on another key.
         Returns the generated text.
         """
-        generation_config = types.GenerationConfig(
-            temperature=0.7,
-            top_p=0.95,
-            top_k=64,
-            max_output_tokens=65536
-        )
-        model = self.get_model()
-        try:
-            response = model.generate_content(prompt, generation_config=generation_config)
-            return response.text
-        except Exception as e:
-            print(f"Error with API key {self.api_keys[(self.key_index - 1) % len(self.api_keys)]}: {e}")
-            time.sleep(1)
-            model = self.get_model()
-            response = model.generate_content(prompt, generation_config=generation_config)
-            return response.text
+        return llm_gateway.complete_sync(prompt, MODEL, GENERATION_PARAMS, hedge="FullcodeGenerator")
 
     def generate_p5js_code(self, input_text):
         """
@@ -1,103 +1,69 @@
-import google.generativeai as genai
 import os
-import time
-import sys
-import itertools
 import re
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from VisualModel.config import Config
-from VisualModel.pipeline import AgenticPipeline
+from Config.registry import get_visual_pipeline
+from Config.LLMs.gateway import llm_gateway
 from SolveProblem.agent import GeminiP5JSGenerator
 from SolveProblem.agent import FullcodeGenerator
+from Telemetry.tracing import tracer
 
 class MathProblemSolver:
+    # Maximum number of visualization pipelines run at the same time per problem
+    VISUALIZATION_CONCURRENCY = int(os.environ.get("VISUALIZATION_CONCURRENCY", 3))
+
+    MODEL = "gemini/gemini-1.5-pro"
+    GENERATION_PARAMS = {"temperature": 1, "top_p": 0.95, "top_k": 40, "max_tokens": 8192}
+
     def __init__(self):
         # Load environment variables from .env file
         load_dotenv()
-        self.api_key1 = os.environ["GEMINI_API_KEY1"]
-        self.api_key2 = os.environ["GEMINI_API_KEY2"]
-        # Create two chat sessions using the two different API keys
-        self.chats = [self.create_chat(self.api_key1), self.create_chat(self.api_key2)]
-        self.current_chat_index = 0  # Pointer to the current chat session
+        # One conversation shared by every step; each turn is sent with whichever
+        # pooled API key has the most quota left
+        self.history = []
         
-        # Initialize visualization pipeline (clients are handled internally)
-        self.pipeline = AgenticPipeline()
-
-    def create_chat(self, api_key):
-        """Creates and returns a chat session using the provided API key."""
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(
-            model_name="gemini-1.5-pro",
-            generation_config={
-                "temperature": 1,
-                "top_p": 0.95,
-                "top_k": 40,
-                "max_output_tokens": 8192,
-                "response_mime_type": "text/plain",
-            }
-        )
-        return model.start_chat(history=[])
-
-    def fun_wait(self, duration=10):
-        """Display a fun spinner animation for the specified duration (in seconds)."""
-        spinner = itertools.cycle(['|', '/', '-', '\\'])
-        end_time = time.time() + duration
-        while time.time() < end_time:
-            sys.stdout.write(next(spinner))
-            sys.stdout.flush()
-            time.sleep(0.1)
-            sys.stdout.write('\b')
-
-    def safe_send_message(self, prompt, max_retries=5, base_wait=10):
+        # Shared visualization pipeline (clients are handled internally)
+        self.pipeline = get_visual_pipeline()
+
+    def safe_send_message(self, prompt, on_token=None):
         """
-        Send a message to the API using one of the two chat sessions.
-        Alternates between API keys to avoid quota errors, with retries on ResourceExhausted errors.
+        Send a message in the solver's conversation and record the exchange.
+        The LLM gateway picks the API key from the shared key pool, quarantining
+        keys that hit ResourceExhausted and retrying on the key with the most headroom.
+        If ``on_token`` is given the response is streamed and each chunk's text is
+        passed to it as it arrives.
         """
-        attempt = 0
-        while attempt < max_retries:
-            current_chat = self.chats[self.current_chat_index]
-            try:
-                print(f"Using API key {self.current_chat_index + 1}... Processing your request... please wait ", end="", flush=True)
-                self.fun_wait(base_wait)  # Wait before sending the request
-                response = current_chat.send_message(prompt).text
-                print("\nPausing briefly after API call...")
-                self.fun_wait(base_wait)  # Pause after successful call
-                self.current_chat_index = (self.current_chat_index + 1) % len(self.chats)  # Switch API key
-                return response
-            except Exception as e:
-                if "ResourceExhausted" in str(e):
-                    print(f"\nResourceExhausted error on API key {self.current_chat_index + 1}.")
-                    self.current_chat_index = (self.current_chat_index + 1) % len(self.chats)
-                    attempt += 1
-                    wait_time = base_wait * (2 ** attempt)  # Exponential backoff
-                    print(f"\nAttempt {attempt}/{max_retries}: Waiting for {wait_time} seconds before retrying...")
-                    self.fun_wait(wait_time)
-                else:
-                    raise e
-        raise Exception("Failed to process the request after multiple attempts due to resource exhaustion.")
+        print("Processing your request...")
+        response = llm_gateway.complete_sync(
+            prompt, self.MODEL, self.GENERATION_PARAMS, history=self.history, on_token=on_token
+        )
+        self.history.append({"role": "user", "content": prompt})
+        self.history.append({"role": "assistant", "content": response})
+        return response
 
     # Agent functions as methods
-    def interpret(self, problem):
+    def interpret(self, problem, on_token=None):
         """Rephrase the math problem and identify key components."""
         prompt = f"Rephrase this math problem and identify key components: {problem}"
-        return self.safe_send_message(prompt)
+        return self.safe_send_message(prompt, on_token=on_token)
 
-    def strategize(self, problem, rephrased):
+    def strategize(self, problem, rephrased, on_token=None):
         """Choose the best method to solve the problem and explain why."""
         prompt = f"For '{problem}' and its rephrasing '{rephrased}', choose the best method and explain why."
-        return self.safe_send_message(prompt)
+        return self.safe_send_message(prompt, on_token=on_token)
 
-    def solve(self, problem, strategy):
+    def solve(self, problem, strategy, on_token=None):
         """Solve the problem step by step using the chosen strategy."""
         prompt = f"Using '{strategy}', solve '{problem}' step by step."
-        return self.safe_send_message(prompt)
+        return self.safe_send_message(prompt, on_token=on_token)
 
-    def verify(self, problem, solution):
+    def verify(self, problem, solution, on_token=None):
         """Verify the solution's correctness and suggest fixes if needed."""
         prompt = f"Verify '{solution}' for '{problem}'. Is it correct? If not, suggest fixes."
-        return self.safe_send_message(prompt)
+        return self.safe_send_message(prompt, on_token=on_token)
 
-    def explain(self, problem, solution):
+    def explain(self, problem, solution, on_token=None):
         """Explain the solution step by step, inserting visualization tags where helpful."""
         prompt = (
             f"Explain the solution to '{problem}' clearly, step by step. "
@@ -106,7 +72,7 @@ class MathProblemSolver:
             "with triple backticks before and after the tag to mark its placement. "
             f"Solution: {solution}"
         )
-        return self.safe_send_message(prompt)
+        return self.safe_send_message(prompt, on_token=on_token)
 
     def split_string_as_dict(self, s):
         """Splits a string into a dictionary separating code blocks (marked by triple backticks) and text."""
@@ -128,33 +94,69 @@ class MathProblemSolver:
 
         return result
 
-    def solve_math_problem(self, problem):
+    def generate_visualization(self, tag):
+        """Run the visual pipeline for one tag; failures degrade to a placeholder comment."""
+        print(f"Generating visualization for: {tag}, please wait...")
+        try:
+            generated_code = self.pipeline.run(tag)
+            if generated_code.get("code"):
+                return generated_code["code"]
+            print(f"Visualization for '{tag}' failed: {generated_code.get('message', generated_code.get('status'))}")
+        except Exception as e:
+            print(f"Visualization for '{tag}' failed: {e}")
+        return f"// Visualization unavailable: {tag}"
+
+    def render_visualizations(self, explanation):
+        """
+        Replace every [visualization ...] tag in ``explanation`` with generated code.
+        Distinct tags run concurrently (up to VISUALIZATION_CONCURRENCY at once),
+        repeated tags are generated once, and results are spliced back in place.
+        """
+        pattern = re.compile(r"\[visualization\s+(.+?)\]")
+        unique_tags = list(dict.fromkeys(pattern.findall(explanation)))
+        if not unique_tags:
+            return explanation
+
+        workers = max(1, min(self.VISUALIZATION_CONCURRENCY, len(unique_tags)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="visualization") as executor:
+            codes = dict(zip(unique_tags, executor.map(tracer.wrap(self.generate_visualization), unique_tags)))
+        return pattern.sub(lambda match: codes[match.group(1)], explanation)
+
+    def solve_math_problem(self, problem, on_result=None, on_token=None):
         """
         Solve the math problem and generate an explanation with embedded visualizations.
-        This example uses a predefined explanation; you can uncomment the agent calls
-        to integrate real-time API responses.
+        ``on_result(step, output)`` is called after each agent step and
+        ``on_token(step, text)`` with streamed chunks of each step's answer.
         """
-        # Example of how you might integrate the agent calls:
-        #
-        rephrased = self.interpret(problem)
+        def publish(step, output):
+            if on_result is not None:
+                on_result(step, output)
+
+        def tokens(step):
+            if on_token is None:
+                return None
+            return lambda text: on_token(step, text)
+
+        rephrased = self.interpret(problem, on_token=tokens("interpret"))
         print("\nRephrased problem:", rephrased)
-        strategy = self.strategize(problem, rephrased)
+        publish("interpret", rephrased)
+        strategy = self.strategize(problem, rephrased, on_token=tokens("strategize"))
         print("\nChosen strategy:", strategy)
-        solution = self.solve(problem, strategy)
+        publish("strategize", strategy)
+        solution = self.solve(problem, strategy, on_token=tokens("solve"))
         print("\nSolution:", solution)
-        verification = self.verify(problem, solution)
+        publish("solve", solution)
+        verification = self.verify(problem, solution, on_token=tokens("verify"))
         print("\nVerification:", verification)
         if "incorrect" in verification.lower():
             solution = verification.split("corrected solution:")[-1].strip()
             print("\nCorrected Solution:", solution)
-        final_explanation = self.explain(problem, solution)
+        publish("verify", verification)
+        final_explanation = self.explain(problem, solution, on_token=tokens("explain"))
+        publish("explain", final_explanation)
         
         # Replace visualization tags with generated p5.js code
-        tags = re.findall(r"\[visualization\s+(.+?)\]", final_explanation)
-        for tag in tags:
-            print(f"Generating visualization for: {tag}, please wait...")
-            generated_code = self.pipeline.run(tag)
-            final_explanation = final_explanation.replace(f"[visualization {tag}]", generated_code["code"])
+        final_explanation = self.render_visualizations(final_explanation)
         result = self.split_string_as_dict(final_explanation)
         return result
 
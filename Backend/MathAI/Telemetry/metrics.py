@@ -0,0 +1,196 @@
+import bisect
+import logging
+import threading
+
+logger = logging.getLogger("metrics")
+
+# Latency buckets (seconds) wide enough for cache hits up to multi-minute Manim renders
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with labels, e.g. ``tokens.inc(120, provider="groq", kind="completion")``."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels(self.labels, key)} {_number(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, exported with ``_bucket``, ``_sum`` and ``_count`` series."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            series["counts"][index] += 1
+            series["sum"] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(series["counts"]), series["sum"]) for key, series in self._series.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(self.labels, key, [('le', _number(bound))])} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labels, key)} {cumulative}"
+
+
+class MetricsRegistry:
+    """
+    Process-wide set of metrics rendered in the Prometheus text format.
+
+    Counters and histograms are updated as work happens. ``collector``
+    callbacks are called at scrape time for values that already live
+    elsewhere (cache and pool statistics); each returns
+    ``(name, kind, documentation, [(labels_dict, value), ...])`` tuples.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labels=()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def collector(self, fn):
+        """Register ``fn`` to be called on every scrape (usable as a decorator)."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for collect in self._collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                logger.warning(f"Metrics collector {getattr(collect, '__name__', collect)} failed: {str(e)}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+agent_duration = metrics.histogram(
+    "sketchmentor_agent_duration_seconds", "Duration of agent process() calls.", ("agent", "model", "outcome")
+)
+stage_duration = metrics.histogram(
+    "sketchmentor_stage_duration_seconds", "Duration of pipeline stages, including cache lookups and the Manim render.",
+    ("pipeline", "stage", "cache"),
+)
+llm_duration = metrics.histogram(
+    "sketchmentor_llm_request_duration_seconds", "Duration of LLM gateway calls, retries included.",
+    ("provider", "model", "outcome"),
+)
+llm_attempts = metrics.counter(
+    "sketchmentor_llm_attempts_total", "HTTP requests sent to LLM providers, by API key slot (key hash).",
+    ("provider", "model", "key_slot"),
+)
+llm_retries = metrics.counter("sketchmentor_llm_retries_total", "Retried LLM requests.", ("provider", "model"))
+llm_tokens = metrics.counter(
+    "sketchmentor_llm_tokens_total", "LLM tokens, by kind (prompt or completion).", ("provider", "model", "kind")
+)
+llm_cost = metrics.counter(
+    "sketchmentor_llm_cost_usd_total", "Estimated LLM spend from list prices (see LLM_PRICES_FILE).",
+    ("provider", "model"),
+)
+llm_hedges = metrics.counter(
+    "sketchmentor_llm_hedges_total", "Hedged LLM calls, by stage and by which request answered first.",
+    ("stage", "winner"),
+)
+llm_hedge_budget_exhausted = metrics.counter(
+    "sketchmentor_llm_hedge_budget_exhausted_total", "LLM calls past their hedge deadline that the stage budget did not allow to hedge.",
+    ("stage",),
+)
+hedged_call_duration = metrics.histogram(
+    "sketchmentor_llm_hedged_call_duration_seconds", "Latency callers saw for LLM calls in hedged stages.", ("stage",)
+)
+llm_circuit_transitions = metrics.counter(
+    "sketchmentor_llm_circuit_transitions_total", "Provider circuit breaker state changes, by new state.",
+    ("provider", "state"),
+)
+llm_failovers = metrics.counter(
+    "sketchmentor_llm_failovers_total", "LLM calls moved to the next model of their route.",
+    ("from_model", "to_model", "reason"),
+)
+render_artifact_lookups = metrics.counter(
+    "sketchmentor_render_artifact_lookups_total",
+    "Compiled LaTeX formulas (cache=tex) and animation segments (cache=segments) renders looked up in the shared stores, by result.",
+    ("cache", "result"),
+)
+render_artifact_hit_ratio = metrics.histogram(
+    "sketchmentor_render_artifact_hit_ratio", "Share of each render's formulas or animation segments served from the shared stores.",
+    ("cache",), buckets=(0.0, 0.25, 0.5, 0.75, 0.9, 1.0),
+)
@@ -0,0 +1,39 @@
+import json
+import logging
+import os
+
+logger = logging.getLogger("pricing")
+
+# USD per million (prompt, completion) tokens, by model name without the provider prefix.
+# List prices at the time of writing; experimental and ":free" models cost nothing.
+# Override or extend with a JSON file of the same shape in LLM_PRICES_FILE.
+MODEL_PRICES = {
+    "gemini-1.5-pro": (1.25, 5.00),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-thinking-exp-01-21": (0.0, 0.0),
+    "gemini-2.0-pro-exp-02-05": (0.0, 0.0),
+    "learnlm-1.5-pro-experimental": (0.0, 0.0),
+    "deepseek-r1-distill-llama-70b": (0.75, 0.99),
+    "qwen/qwen2.5-vl-72b-instruct:free": (0.0, 0.0),
+}
+
+
+def _load_overrides():
+    path = os.environ.get("LLM_PRICES_FILE")
+    if not path:
+        return
+    try:
+        with open(path, encoding="utf-8") as f:
+            MODEL_PRICES.update({model: tuple(prices) for model, prices in json.load(f).items()})
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not load LLM prices from {path}: {str(e)}")
+
+
+def cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimated USD cost of one call; unknown models count as free."""
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6
+
+
+_load_overrides()
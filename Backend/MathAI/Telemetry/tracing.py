@@ -0,0 +1,185 @@
+import contextvars
+import functools
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger("tracing")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    One timed operation, shaped like an OpenTelemetry span.
+
+    Spans share a ``trace_id`` with their parent; the root span of a request
+    starts a new trace. Times are Unix epoch nanoseconds.
+    """
+
+    def __init__(self, name: str, parent=None, attributes: dict = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.status = "UNSET"
+        self.status_message = None
+        self.start_time_ns = time.time_ns()
+        self.end_time_ns = None
+        self.thread = threading.current_thread().name
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, **attributes):
+        self.events.append({"name": name, "time_ns": time.time_ns(), "attributes": attributes})
+
+    def record_exception(self, error: BaseException):
+        self.status = "ERROR"
+        self.status_message = str(error)[:500]
+        self.add_event("exception", type=type(error).__name__, message=self.status_message)
+
+    @property
+    def duration(self) -> float:
+        """Seconds between start and end (or now, while the span is open)."""
+        end = self.end_time_ns or time.time_ns()
+        return (end - self.start_time_ns) / 1e9
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time_ns": self.start_time_ns,
+            "end_time_ns": self.end_time_ns,
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "status_message": self.status_message,
+            "thread": self.thread,
+            "attributes": self.attributes,
+            "events": self.events,
+        }
+
+
+class InMemorySpanExporter:
+    """Keeps the most recent finished spans in a bounded ring buffer."""
+
+    def __init__(self, max_spans: int):
+        self._spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self, trace_id: str = None, limit: int = None) -> list:
+        with self._lock:
+            spans = [s for s in self._spans if trace_id is None or s.trace_id == trace_id]
+        return spans[-limit:] if limit else spans
+
+    def traces(self, limit: int = 20) -> list:
+        """The last ``limit`` traces, newest first, each with its spans in start order."""
+        grouped = {}
+        for span in self.spans():
+            grouped.setdefault(span.trace_id, []).append(span)
+        result = []
+        for trace_id in reversed(list(grouped)):
+            spans = sorted(grouped[trace_id], key=lambda s: s.start_time_ns)
+            result.append({
+                "trace_id": trace_id,
+                "root": next((s.name for s in spans if s.parent_span_id is None), spans[0].name),
+                "duration_ms": round((max(s.end_time_ns for s in spans) - spans[0].start_time_ns) / 1e6, 3),
+                "spans": [s.to_dict() for s in spans],
+            })
+            if len(result) == limit:
+                break
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+
+class Tracer:
+    """
+    Creates spans and tracks the current one per thread / asyncio task.
+
+    The current span lives in a ``ContextVar``. Work handed to another thread
+    or event loop does not inherit it automatically: capture ``current()`` and
+    pass it as ``parent`` (or wrap the coroutine with ``bind``).
+    """
+
+    def __init__(self, exporter: InMemorySpanExporter, enabled: bool = True):
+        self.exporter = exporter
+        self.enabled = enabled
+
+    @staticmethod
+    def current():
+        return _current_span.get()
+
+    @contextmanager
+    def span(self, name: str, parent=None, **attributes):
+        """Open a child span of ``parent`` (default: the current span) for the ``with`` block."""
+        span = Span(name, parent or _current_span.get(), attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_time_ns = time.time_ns()
+            if span.status == "UNSET":
+                span.status = "OK"
+            if self.enabled:
+                self.exporter.export(span)
+
+    def traced(self, name: str):
+        """Decorator running every call of the function in a span called ``name``."""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def wrap(self, fn):
+        """Bind ``fn`` to the current span so that it keeps its parent when run on another thread."""
+        parent = _current_span.get()
+        if parent is None:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = _current_span.set(parent)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _current_span.reset(token)
+        return wrapper
+
+    async def bind(self, coro, parent):
+        """Await ``coro`` with ``parent`` as its current span (for coroutines sent to another loop)."""
+        token = _current_span.set(parent)
+        try:
+            return await coro
+        finally:
+            _current_span.reset(token)
+
+
+tracer = Tracer(
+    InMemorySpanExporter(int(os.environ.get("TRACE_BUFFER_SPANS", 5000))),
+    enabled=os.environ.get("TRACING", "on").lower() != "off",
+)
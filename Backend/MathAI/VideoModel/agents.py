@@ -1,14 +1,71 @@
 from .utils import Utils
+from .config import Config
+import asyncio
+import functools
 import time
 from .prompts import PROMPTS
+from Telemetry.metrics import agent_duration
+from Telemetry.tracing import tracer
+
+# Sampling parameters the Groq-hosted agents have always used
+GROQ_PARAMS = {"temperature": 0.6, "max_tokens": 4096, "top_p": 0.95}
+
+
+def traced(method):
+    """
+    Record each call of an agent method as a span (parent of its LLM calls)
+    and in the agent latency histogram.
+
+    Agents report failures by logging and returning a fallback value rather
+    than raising, so the outcome comes from ``log_error`` having been called
+    during the span, or from the ``result`` of a validation dict.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        agent = self.name if method.__name__ == "process" else f"{self.name}.{method.__name__}"
+        with tracer.span(f"agent {agent}", agent=agent, model=self.model_name) as span:
+            outcome = "error"
+            try:
+                result = method(self, *args, **kwargs)
+                if isinstance(result, dict) and "result" in result:
+                    outcome = result["result"]
+                elif "error" not in span.attributes:
+                    outcome = "ok"
+                return result
+            finally:
+                span.set_attribute("outcome", outcome)
+                agent_duration.observe(span.duration, agent=agent, model=self.model_name, outcome=outcome)
+    return wrapper
 
 
 class BaseAgent:
     """Base class for all agents in the pipeline."""
     
-    def __init__(self, name, logger):
+    def __init__(self, name, logger, llm=None, model_name=None):
         self.name = name
         self.logger = logger
+        self.llm = llm
+        self.model_name = model_name
+        # Other models of this agent's failover route (Config.ROUTES)
+        self.fallbacks = [model for model in Config.ROUTES.get(name, []) if model != model_name]
+    
+    def complete(self, prompt, params=None, model=None):
+        """
+        Send ``prompt`` through the LLM gateway and return the stripped answer.
+        The agent's name is the stage whose hedging policy (if any) applies.
+        Without an explicit ``model`` the call fails over along the agent's route.
+        """
+        fallbacks = None if model else self.fallbacks
+        return self.llm.complete_sync(
+            prompt, model or self.model_name, params, hedge=self.name, fallbacks=fallbacks
+        ).strip()
+    
+    async def acomplete(self, prompt, params=None, model=None):
+        """Awaitable ``complete`` for agents that fan out several calls at once."""
+        fallbacks = None if model else self.fallbacks
+        return (await self.llm.complete(
+            prompt, model or self.model_name, params, hedge=self.name, fallbacks=fallbacks
+        )).strip()
     
     def log_start(self, message):
         self.logger.info(f"[{self.name}] Starting: {message}")
@@ -18,22 +75,22 @@ class BaseAgent:
     
     def log_error(self, message):
         self.logger.error(f"[{self.name}] Error: {message}")
+        span = tracer.current()
+        if span is not None:
+            span.set_attribute("error", message[:500])
 
 
 class PromptAnalysisAgent(BaseAgent):
     """Agent responsible for extracting mathematical concepts from user prompts."""
     
-    def __init__(self, gemini_model, logger):
-        super().__init__("PromptAnalysis", logger)
-        self.model = gemini_model
+    def __init__(self, llm, model_name, logger):
+        super().__init__("PromptAnalysis", logger, llm, model_name)
     
+    @traced
     def process(self, prompt):
         self.log_start(f"Analyzing prompt: {prompt}")
         try:
-            response = self.model.generate_content(
-                PROMPTS["prompt_analysis"].format(prompt=prompt)
-            )
-            concept = response.text.strip()
+            concept = self.complete(PROMPTS["prompt_analysis"].format(prompt=prompt))
             self.log_complete(f"Extracted concept: {concept}")
             return concept
         except Exception as e:
@@ -44,17 +101,14 @@ class PromptAnalysisAgent(BaseAgent):
 class MathVerificationAgent(BaseAgent):
     """Agent responsible for verifying mathematical correctness for animation."""
     
-    def __init__(self, gemini_model, logger):
-        super().__init__("MathVerification", logger)
-        self.model = gemini_model
+    def __init__(self, llm, model_name, logger):
+        super().__init__("MathVerification", logger, llm, model_name)
     
+    @traced
     def process(self, concept):
         self.log_start(f"Verifying concept: {concept}")
         try:
-            response = self.model.generate_content(
-                PROMPTS["math_verification"].format(concept=concept)
-            )
-            result = response.text.strip()
+            result = self.complete(PROMPTS["math_verification"].format(concept=concept))
             self.log_complete(f"Verification result: {result}")
             return result
         except Exception as e:
@@ -65,23 +119,14 @@ class MathVerificationAgent(BaseAgent):
 class VisualizationSpecAgent(BaseAgent):
     """Agent responsible for creating animation specifications."""
     
-    def __init__(self, groq_client, model_name, logger):
-        super().__init__("VisualizationSpec", logger)
-        self.client = groq_client
-        self.model_name = model_name
+    def __init__(self, llm, model_name, logger):
+        super().__init__("VisualizationSpec", logger, llm, model_name)
     
+    @traced
     def process(self, concept):
         self.log_start(f"Generating visualization spec for: {concept}")
         try:
-            completion = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[{"role": "user", "content": PROMPTS["visualization_spec"].format(concept=concept)}],
-                temperature=0.6,
-                max_completion_tokens=4096,
-                top_p=0.95,
-                stream=False
-            )
-            spec = completion.choices[0].message.content.strip()
+            spec = self.complete(PROMPTS["visualization_spec"].format(concept=concept), GROQ_PARAMS)
             self.log_complete(f"Generated visualization specification")
             return spec
         except Exception as e:
@@ -92,38 +137,22 @@ class VisualizationSpecAgent(BaseAgent):
 class CodeStructureAgent(BaseAgent):
     """Agent responsible for generating Manim code structure."""
     
-    def __init__(self, groq_client, model_name, logger):
-        super().__init__("CodeStructure", logger)
-        self.client = groq_client
-        self.model_name = model_name
+    def __init__(self, llm, model_name, logger):
+        super().__init__("CodeStructure", logger, llm, model_name)
     
+    @traced
     def process(self, specification):
         self.log_start(f"Generating code structure")
         try:
-            completion = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[{"role": "user", "content": PROMPTS["code_structure"].format(specification=specification)}],
-                temperature=0.6,
-                max_completion_tokens=4096,
-                top_p=0.95,
-                stream=False
-            )
-            struct = completion.choices[0].message.content.strip()
+            prompt = PROMPTS["code_structure"].format(specification=specification)
+            struct = self.complete(prompt, GROQ_PARAMS)
             self.log_complete(f"Generated code structure")
             
-            # Retry if the response is empty or "None"
+            # Retry at once if the response is empty or "None", on the next model of the route if there is one
             if struct.lower() == "none" or not struct:
-                self.logger.warning("Empty structure received, retrying...")
-                time.sleep(5)
-                completion = self.client.chat.completions.create(
-                    model=self.model_name,
-                    messages=[{"role": "user", "content": PROMPTS["code_structure"].format(specification=specification)}],
-                    temperature=0.6,
-                    max_completion_tokens=4096,
-                    top_p=0.95,
-                    stream=False
-                )
-                struct = completion.choices[0].message.content.strip()
+                retry_model = self.fallbacks[0] if self.fallbacks else None
+                self.logger.warning(f"Empty structure received, retrying on {retry_model or self.model_name}...")
+                struct = self.complete(prompt, GROQ_PARAMS, retry_model)
                 self.log_complete(f"Generated code structure on retry")
             
             return struct
@@ -132,24 +161,15 @@ class CodeStructureAgent(BaseAgent):
             return f"Error in code structure generation: {str(e)}"
 
 
-class CodeGenerationAgent:
-    def __init__(self, groq_client, model_name,logger):
-        self.groq_client = groq_client
-        self.logger = logger
-        self.model_name = model_name
+class CodeGenerationAgent(BaseAgent):
+    def __init__(self, llm, model_name, logger):
+        super().__init__("CodeGeneration", logger, llm, model_name)
     
+    @traced
     def process(self, code_struct):
         self.logger.info("Generating code with Groq")
         try:
-            completion = self.groq_client.chat.completions.create(
-                model=self.model_name,
-                messages=[{"role": "user", "content": PROMPTS["code_generation"].format(code_struct=code_struct)}],
-                temperature=0.6,
-                max_tokens=4096,  # Corrected from max_completion_tokens to max_tokens
-                top_p=0.95,
-                stream=False
-            )
-            code = completion.choices[0].message.content.strip()
+            code = self.complete(PROMPTS["code_generation"].format(code_struct=code_struct), GROQ_PARAMS)
             return code
         except Exception as e:
             self.logger.error(f"Groq API error: {str(e)}")
@@ -159,17 +179,14 @@ class CodeGenerationAgent:
 class CodeTestingAgent(BaseAgent):
     """Agent responsible for testing code for potential issues."""
     
-    def __init__(self, gemini_model, logger):
-        super().__init__("CodeTesting", logger)
-        self.model = gemini_model
+    def __init__(self, llm, model_name, logger):
+        super().__init__("CodeTesting", logger, llm, model_name)
     
+    @traced
     def process(self, code):
         self.log_start(f"Testing code")
         try:
-            response = self.model.generate_content(
-                PROMPTS["code_testing"].format(code=code)
-            )
-            result = response.text.strip()
+            result = self.complete(PROMPTS["code_testing"].format(code=code))
             self.log_complete(f"Testing results: {result[:100]}...")
             return result
         except Exception as e:
@@ -180,17 +197,14 @@ class CodeTestingAgent(BaseAgent):
 class CodeOptimizationAgent(BaseAgent):
     """Agent responsible for optimizing the generated code."""
     
-    def __init__(self, gemini_model, logger):
-        super().__init__("CodeOptimization", logger)
-        self.model = gemini_model
+    def __init__(self, llm, model_name, logger):
+        super().__init__("CodeOptimization", logger, llm, model_name)
     
+    @traced
     def process(self, code):
         self.log_start(f"Optimizing code")
         try:
-            response = self.model.generate_content(
-                PROMPTS["code_optimization"].format(code=code)
-            )
-            optimized = Utils.clean_code_response(response.text.strip())
+            optimized = Utils.clean_code_response(self.complete(PROMPTS["code_optimization"].format(code=code)))
             self.log_complete(f"Optimized code")
             return optimized
         except Exception as e:
@@ -201,17 +215,14 @@ class CodeOptimizationAgent(BaseAgent):
 class ErrorDiagnosisAgent(BaseAgent):
     """Agent responsible for diagnosing and fixing errors in code."""
     
-    def __init__(self, gemini_model, logger):
-        super().__init__("ErrorDiagnosis", logger)
-        self.model = gemini_model
+    def __init__(self, llm, model_name, logger):
+        super().__init__("ErrorDiagnosis", logger, llm, model_name)
     
+    @traced
     def process(self, code, error):
         self.log_start(f"Diagnosing error: {error[:100]}...")
         try:
-            response = self.model.generate_content(
-                PROMPTS["error_diagnosis"].format(code=code, error=error)
-            )
-            diagnosis = response.text.strip()
+            diagnosis = self.complete(PROMPTS["error_diagnosis"].format(code=code, error=error))
             
             # Try to extract fixed code
             fixed_code = Utils.clean_code_response(diagnosis)
@@ -230,83 +241,129 @@ class ErrorDiagnosisAgent(BaseAgent):
 class ValidationConsensusAgent(BaseAgent):
     """Agent responsible for validating the code using multiple models."""
     
-    def __init__(self, gemini_flash_model, gemini_learn_model, groq_client, groq_model, logger):
-        super().__init__("ValidationConsensus", logger)
+    PASS_THRESHOLD = 0.6  # At least 60% average pass rate
+    VALIDATOR_TIMEOUT = 90  # Seconds before a validator counts as a score of 0
+    
+    def __init__(self, llm, gemini_flash_model, gemini_learn_model, groq_model, logger):
+        super().__init__("ValidationConsensus", logger, llm, gemini_flash_model)
         self.gemini_flash_model = gemini_flash_model
         self.gemini_learn_model = gemini_learn_model
-        self.groq_client = groq_client
         self.groq_model = groq_model
     
-    def process(self, code):
-        self.log_start(f"Validating code")
-        
-        validation_results = []
+    async def _validate(self, name, model, params, code):
+        """Run a single validator and return its result with the call duration."""
+        start = time.perf_counter()
+        try:
+            response = await self.acomplete(PROMPTS["validation_consensus"].format(code=code), params, model)
+            
+            # Parse validation response
+            lines = response.split('\n')
+            yes_count = 0
+            for line in lines:
+                if line.strip().upper().startswith("YES"):
+                    yes_count += 1
+            
+            self.logger.info(f"[{name}] Validation score: {yes_count/5}")
+            return {
+                "validator": name,
+                "pass_rate": yes_count / 5,  # 5 questions in the prompt
+                "response": response,
+                "duration": time.perf_counter() - start
+            }
+        except Exception as e:
+            self.log_error(f"Error with {name} validator: {str(e)}")
+            return {
+                "validator": name,
+                "pass_rate": 0,
+                "response": f"Error: {str(e)}",
+                "duration": time.perf_counter() - start
+            }
+    
+    async def _run_validators(self, code):
+        """
+        Fan out all validators at once and stop as soon as the outcome is decided:
+        the average passes once the scores so far reach the threshold even if every
+        remaining validator scores 0, and fails once it cannot reach it even if every
+        remaining validator scores 1. Undecided calls are cancelled, which closes
+        their HTTP requests.
+        """
         validators = [
-            ("Gemini Flash", self.gemini_flash_model, True),
-            ("Gemini Learn", self.gemini_learn_model, True),
-            ("Groq DeepSeek", self.groq_client, False)
+            ("Gemini Flash", self.gemini_flash_model, None),
+            ("Gemini Learn", self.gemini_learn_model, None),
+            ("Groq DeepSeek", self.groq_model, GROQ_PARAMS)
         ]
-        
-        for name, model, is_gemini in validators:
-            try:
-                if is_gemini:
-                    response = model.generate_content(
-                        PROMPTS["validation_consensus"].format(code=code)
-                    ).text.strip()
-                else:
-                    completion = self.groq_client.chat.completions.create(
-                        model=self.groq_model,
-                        messages=[{"role": "user", "content": PROMPTS["validation_consensus"].format(code=code)}],
-                        temperature=0.6,
-                        max_completion_tokens=4096,
-                        top_p=0.95,
-                        stream=False
-                    )
-                    response = completion.choices[0].message.content.strip()
-                
-                # Parse validation response
-                lines = response.split('\n')
-                yes_count = 0
-                for line in lines:
-                    if line.strip().upper().startswith("YES"):
-                        yes_count += 1
-                
-                validation_results.append({
-                    "validator": name,
-                    "pass_rate": yes_count / 5,  # 5 questions in the prompt
-                    "response": response
-                })
-                
-                self.logger.info(f"[{name}] Validation score: {yes_count/5}")
+        total = len(validators)
+        tasks = {
+            asyncio.ensure_future(self._validate(name, model, params, code)): name
+            for name, model, params in validators
+        }
+        validation_results = []
+        pending = set(tasks)
+        started = time.perf_counter()
+        try:
+            while pending:
+                remaining_time = self.VALIDATOR_TIMEOUT - (time.perf_counter() - started)
+                done, pending = await asyncio.wait(pending, timeout=max(0, remaining_time), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    for task in pending:
+                        self.log_error(f"{tasks[task]} validator timed out after {self.VALIDATOR_TIMEOUT}s")
+                        validation_results.append({
+                            "validator": tasks[task],
+                            "pass_rate": 0,
+                            "response": "Error: validator timed out",
+                            "duration": self.VALIDATOR_TIMEOUT
+                        })
+                        task.cancel()
+                    pending = set()
+                    break
+                validation_results.extend(task.result() for task in done)
                 
-            except Exception as e:
-                self.log_error(f"Error with {name} validator: {str(e)}")
-                validation_results.append({
-                    "validator": name,
-                    "pass_rate": 0,
-                    "response": f"Error: {str(e)}"
-                })
+                score_sum = sum(v["pass_rate"] for v in validation_results)
+                if score_sum / total >= self.PASS_THRESHOLD:
+                    break
+                if (score_sum + len(pending)) / total < self.PASS_THRESHOLD:
+                    break
+        finally:
+            # Remaining calls cannot change the outcome; stop waiting for them.
+            for task in pending:
+                task.cancel()
+        
+        skipped = [tasks[task] for task in pending]
+        return validation_results, skipped, total, time.perf_counter() - started
+    
+    @traced
+    def process(self, code):
+        self.log_start(f"Validating code")
+        
+        validation_results, skipped, total, elapsed = self.llm.run(self._run_validators(code))
+        sequential = sum(v["duration"] for v in validation_results)
+        score_sum = sum(v["pass_rate"] for v in validation_results)
+        passed = score_sum / total >= self.PASS_THRESHOLD
         
-        # Calculate average validation score
-        avg_score = sum(v["pass_rate"] for v in validation_results) / len(validation_results)
-        self.log_complete(f"Validation complete. Average score: {avg_score}")
+        # Average over the validators that actually reported
+        avg_score = score_sum / len(validation_results)
+        self.log_complete(
+            f"Validation complete. Average score: {avg_score} "
+            f"({len(validation_results)}/{total} validators, skipped: {skipped or 'none'}, "
+            f"{elapsed:.1f}s wall clock, saved {max(0, sequential - elapsed):.1f}s vs sequential)"
+        )
         
-        if avg_score >= 0.6:  # At least 60% pass rate
-            return {"result": "pass", "code": code, "score": avg_score}
+        if passed:
+            return {"result": "pass", "code": code, "score": avg_score, "time_saved": max(0, sequential - elapsed)}
         else:
             return {
                 "result": "fail", 
                 "code": code, 
                 "score": avg_score,
+                "time_saved": max(0, sequential - elapsed),
                 "feedback": "\n".join([f"{v['validator']}: {v['response']}" for v in validation_results])
             }
     
+    @traced
     def generate_fallback(self, concept):
         self.log_start(f"Generating fallback code for: {concept}")
         try:
-            response = self.gemini_flash_model.generate_content(
-                PROMPTS["fallback_generation"].format(concept=concept)
-            ).text.strip()
+            response = self.complete(PROMPTS["fallback_generation"].format(concept=concept))
             fallback_code = Utils.clean_code_response(response)
             self.log_complete(f"Generated fallback code")
             return fallback_code
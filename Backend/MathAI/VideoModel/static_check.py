@@ -0,0 +1,423 @@
+"""
+Static checks of generated Manim code, run before anything is rendered.
+
+A render that fails costs a Manim process (seconds) plus an LLM round trip to
+diagnose it; most generated scenes that fail do so for reasons visible in the
+source. ``check_scene`` parses the code with ``ast`` and, without executing
+it, looks for:
+
+- syntax errors and a missing or malformed scene class;
+- names imported from manim (or used after ``from manim import *``) that the
+  installed manim does not export, and names that are never defined;
+- calls to methods that the manim class of the object does not have, and
+  keyword arguments that its signature does not accept;
+- LaTeX mistakes in ``MathTex``/``Tex`` strings: unbalanced braces,
+  ``\\left``/``\\right`` and ``\\begin``/``\\end``, ``$`` inside math mode and
+  backslash escapes that Python has already turned into control characters
+  (``"\\frac"`` without the ``r`` prefix).
+
+API checks need manim to be importable; it is imported once, on first use.
+Without it only the syntax, scene and LaTeX checks run. Only what can be
+resolved with certainty is reported, so a clean result is no guarantee that
+the scene renders. Undefined names are advisory (``blocking`` is False): code
+can still define names in ways the checker does not follow.
+"""
+import ast
+import builtins
+import functools
+import importlib
+import importlib.util
+import inspect
+import logging
+import re
+
+logger = logging.getLogger("manim-static-check")
+
+SCENE_NAME = "VisualizationVideo"
+
+# Mobjects whose positional string arguments are compiled by LaTeX
+TEX_CLASSES = {"MathTex", "Tex", "SingleStringMathTex"}
+MATH_MODE_CLASSES = {"MathTex", "SingleStringMathTex"}
+
+# A control character followed by letters is a LaTeX command whose backslash Python consumed
+_CONSUMED_ESCAPE = re.compile(r"[\a\b\f\r\t\v][A-Za-z]|\n(?:abla|eq|eg|ot|otin|u|i|e|ewline|mid|leq|geq)(?![A-Za-z])")
+# Issue kinds that are reported but should not stop a render on their own
+ADVISORY_KINDS = {"name"}
+
+_ESCAPE_NAMES = {"\a": r"\a", "\b": r"\b", "\f": r"\f", "\n": r"\n", "\r": r"\r", "\t": r"\t", "\v": r"\v"}
+
+
+@functools.lru_cache(maxsize=1)
+def manim_api():
+    """Names exported by the installed manim (what ``from manim import *`` binds), or ``None`` without manim."""
+    if importlib.util.find_spec("manim") is None:
+        return None
+    try:
+        manim = importlib.import_module("manim")
+    except Exception as e:
+        logger.warning(f"Could not import manim, skipping API checks: {str(e)}")
+        return None
+    names = getattr(manim, "__all__", None) or [name for name in dir(manim) if not name.startswith("_")]
+    return {name: getattr(manim, name) for name in names if hasattr(manim, name)}
+
+
+def _accepted_keywords(target):
+    """Keyword arguments ``target`` accepts, or ``None`` if it accepts any (``**kwargs`` all the way down)."""
+    if inspect.isclass(target):
+        names = set()
+        for klass in target.__mro__:
+            init = klass.__dict__.get("__init__")
+            if init is None:
+                continue
+            if klass is object:
+                # Every __init__ passed **kwargs on; whatever consumes them is not visible here
+                return None
+            try:
+                parameters = inspect.signature(init).parameters.values()
+            except (TypeError, ValueError):
+                return None
+            names |= {p.name for p in parameters if p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY)}
+            # Without **kwargs this __init__ is where unknown keywords fail
+            if not any(p.kind == p.VAR_KEYWORD for p in parameters):
+                return names
+        return None
+    try:
+        parameters = inspect.signature(target).parameters.values()
+    except (TypeError, ValueError):
+        return None
+    if any(p.kind == p.VAR_KEYWORD for p in parameters):
+        return None
+    return {p.name for p in parameters if p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY)}
+
+
+def _has_method(klass, name: str) -> bool:
+    if hasattr(klass, name):
+        return True
+    # Mobject.__getattr__ generates get_<attr>/set_<attr> accessors
+    return "__getattr__" in dir(klass) and name.startswith(("get_", "set_"))
+
+
+def check_latex(text: str, math_mode: bool) -> list:
+    """Problems in one LaTeX string, as messages."""
+    problems = []
+    escape = _CONSUMED_ESCAPE.search(text)
+    if escape:
+        char = escape.group(0)[0]
+        problems.append(
+            f"{_ESCAPE_NAMES[char]} in {text!r} is a Python escape, not LaTeX: use a raw string (r\"...\") or double the backslash"
+        )
+
+    depth = 0
+    for match in re.finditer(r"\\.|[{}]", text):
+        token = match.group(0)
+        if token == "{":
+            depth += 1
+        elif token == "}":
+            depth -= 1
+            if depth < 0:
+                problems.append(f"unmatched '}}' in {text!r}")
+                depth = 0
+    if depth > 0:
+        problems.append(f"{depth} unclosed '{{' in {text!r}")
+
+    lefts = len(re.findall(r"\\left(?![A-Za-z])", text))
+    rights = len(re.findall(r"\\right(?![A-Za-z])", text))
+    if lefts != rights:
+        problems.append(f"{lefts} \\left but {rights} \\right in {text!r}")
+
+    environments = []
+    for kind, name in re.findall(r"\\(begin|end)\s*\{([^}]*)\}", text):
+        if kind == "begin":
+            environments.append(name)
+        elif not environments or environments.pop() != name:
+            problems.append(f"\\end{{{name}}} without a matching \\begin{{{name}}} in {text!r}")
+    for name in environments:
+        problems.append(f"\\begin{{{name}}} is never closed in {text!r}")
+
+    dollars = len(re.findall(r"(?<!\\)\$", text))
+    if math_mode and dollars:
+        problems.append(f"'$' in {text!r}: MathTex is already in math mode")
+    elif not math_mode and dollars % 2:
+        problems.append(f"unbalanced '$' in {text!r}")
+    return problems
+
+
+class _SceneChecker(ast.NodeVisitor):
+    def __init__(self, api, scene_name: str):
+        self.api = api
+        self.scene_name = scene_name
+        self.issues = []
+        self.imported = {}   # name -> manim object, or None when it comes from another module
+        self.manim_modules = set()  # names bound to the manim package itself
+        self.star = False
+        self.other_star = False
+        self.bound = set()
+        self.classes = {}
+        self.variables = {}  # name -> manim class of the value assigned to it, per function
+        self.scene = None
+        self.self_attributes = set()
+
+    def report(self, node, kind: str, message: str):
+        self.issues.append({"line": getattr(node, "lineno", 0), "kind": kind, "message": message,
+                            "blocking": kind not in ADVISORY_KINDS})
+
+    # Imports and names
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            bound = alias.asname or alias.name.split(".")[0]
+            self.bound.add(bound)
+            if alias.name == "manim" or (alias.asname is None and alias.name.startswith("manim.")):
+                self.manim_modules.add(bound)
+
+    def visit_ImportFrom(self, node):
+        module = node.module or ""
+        is_manim = module == "manim" or module.startswith("manim.")
+        for alias in node.names:
+            if alias.name == "*":
+                if module == "manim":
+                    self.star = True
+                else:
+                    self.other_star = True
+                continue
+            bound = alias.asname or alias.name
+            self.bound.add(bound)
+            self.imported[bound] = None
+            if not is_manim or self.api is None:
+                continue
+            try:
+                source = importlib.import_module(module)
+            except Exception:
+                self.report(node, "import", f"module '{module}' does not exist in the installed manim")
+                continue
+            if not hasattr(source, alias.name):
+                self.report(node, "import", f"'{alias.name}' cannot be imported from '{module}'")
+            else:
+                self.imported[bound] = getattr(source, alias.name)
+
+    def resolve(self, node):
+        """The manim object an expression names, if it can be determined statically."""
+        if self.api is None:
+            return None
+        if isinstance(node, ast.Name):
+            if node.id in self.classes:
+                return None
+            if node.id in self.imported:
+                return self.imported[node.id]
+            if self.star and node.id not in self.bound:
+                return self.api.get(node.id)
+        elif isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) \
+                and node.value.id in self.manim_modules:
+            return self.api.get(node.attr)
+        return None
+
+    # Scene class
+
+    def _is_scene_base(self, base, seen=()) -> bool:
+        if isinstance(base, ast.Name) and base.id in self.classes and base.id not in seen:
+            return any(self._is_scene_base(b, (*seen, base.id)) for b in self.classes[base.id].bases)
+        resolved = self.resolve(base)
+        if resolved is not None and self.api and inspect.isclass(self.api.get("Scene")):
+            return inspect.isclass(resolved) and issubclass(resolved, self.api["Scene"])
+        name = base.id if isinstance(base, ast.Name) else getattr(base, "attr", "")
+        return name.endswith("Scene")
+
+    def _scene_base_class(self, node):
+        """The manim Scene subclass the scene derives from, when it resolves."""
+        for base in node.bases:
+            if isinstance(base, ast.Name) and base.id in self.classes:
+                found = self._scene_base_class(self.classes[base.id])
+            else:
+                found = self.resolve(base)
+            if inspect.isclass(found):
+                return found
+        return None
+
+    def _class_methods(self, node, seen=()) -> set:
+        names = {item.name for item in node.body if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))}
+        names |= {t.id for item in node.body if isinstance(item, ast.Assign) for t in item.targets if isinstance(t, ast.Name)}
+        for base in node.bases:
+            if isinstance(base, ast.Name) and base.id in self.classes and base.id not in seen:
+                names |= self._class_methods(self.classes[base.id], (*seen, base.id))
+        return names
+
+    def check_scene_class(self, tree):
+        scene = self.classes.get(self.scene_name)
+        if scene is None:
+            self.report(tree, "scene", f"no class named {self.scene_name}: the render looks the scene up by that name")
+            return
+        self.scene = scene
+        if not any(self._is_scene_base(base) for base in scene.bases):
+            self.report(scene, "scene", f"{self.scene_name} must subclass manim's Scene (or another Scene class)")
+        if "construct" not in self._class_methods(scene):
+            self.report(scene, "scene", f"{self.scene_name} has no construct() method, so it renders nothing")
+
+    # Calls
+
+    def visit_FunctionDef(self, node):
+        outer = self.variables
+        self.variables = {}
+        self.generic_visit(node)
+        self.variables = outer
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Assign(self, node):
+        self.generic_visit(node)
+        cls = self.resolve(node.value.func) if isinstance(node.value, ast.Call) else None
+        for target in node.targets:
+            if isinstance(target, ast.Name):
+                if inspect.isclass(cls):
+                    self.variables[target.id] = cls
+                else:
+                    self.variables.pop(target.id, None)
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        func = node.func
+        target = self.resolve(func)
+        label = ast.unparse(func)
+
+        name = func.id if isinstance(func, ast.Name) else getattr(func, "attr", None)
+        if name in TEX_CLASSES and (target is None or getattr(target, "__name__", None) == name):
+            self.check_tex_call(node, name)
+
+        if target is None and isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name):
+            owner = func.value.id
+            if owner in self.variables:
+                cls = self.variables[owner]
+                if not _has_method(cls, func.attr):
+                    self.report(node, "method", f"{cls.__name__} has no method '{func.attr}' (called on {owner})")
+                    return
+                target = getattr(cls, func.attr, None)
+                label = f"{cls.__name__}.{func.attr}"
+            elif owner == "self" and self.in_scene(node):
+                base = self._scene_base_class(self.scene)
+                if base is not None and func.attr not in self._class_methods(self.scene) \
+                        and func.attr not in self.self_attributes:
+                    if not _has_method(base, func.attr):
+                        self.report(node, "method", f"Scene has no method '{func.attr}' (called as self.{func.attr})")
+                        return
+                    target = getattr(base, func.attr, None)
+                    label = f"{base.__name__}.{func.attr}"
+        if target is None or not callable(target):
+            return
+        accepted = _accepted_keywords(target)
+        if accepted is None:
+            return
+        for keyword in node.keywords:
+            if keyword.arg is not None and keyword.arg not in accepted:
+                self.report(node, "kwarg", f"{label}() got an unexpected keyword argument '{keyword.arg}'")
+
+    def in_scene(self, node) -> bool:
+        scene = self.scene
+        return scene is not None and scene.lineno <= node.lineno <= getattr(scene, "end_lineno", scene.lineno)
+
+    def check_tex_call(self, node, name: str):
+        strings = [arg.value for arg in node.args if isinstance(arg, ast.Constant) and isinstance(arg.value, str)]
+        if not strings:
+            return
+        # MathTex compiles its arguments as one expression, so braces may open in one and close in another
+        texts = [" ".join(strings)] if len(strings) == len(node.args) else strings
+        for text in texts:
+            for problem in check_latex(text, name in MATH_MODE_CLASSES):
+                self.report(node, "latex", f"{name}: {problem}")
+
+    # Entry point
+
+    def collect(self, tree):
+        """First pass: module classes, every bound name and the attributes assigned on ``self``."""
+        for node in ast.walk(tree):
+            if isinstance(node, ast.ClassDef):
+                self.bound.add(node.name)
+                if node in tree.body:
+                    self.classes[node.name] = node
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                self.bound.add(node.name)
+                arguments = node.args
+                for arg in (*arguments.posonlyargs, *arguments.args, *arguments.kwonlyargs,
+                            arguments.vararg, arguments.kwarg):
+                    if arg is not None:
+                        self.bound.add(arg.arg)
+            elif isinstance(node, ast.Lambda):
+                for arg in ast.walk(node.args):
+                    if isinstance(arg, ast.arg):
+                        self.bound.add(arg.arg)
+            elif isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+                self.bound.add(node.id)
+            elif isinstance(node, ast.ExceptHandler) and node.name:
+                self.bound.add(node.name)
+            elif isinstance(node, ast.Import):
+                # Imports inside functions bind names too; only module-level ones are checked against manim
+                self.bound.update(alias.asname or alias.name.split(".")[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                for alias in node.names:
+                    if alias.name != "*":
+                        self.bound.add(alias.asname or alias.name)
+                    elif node.module == "manim":
+                        self.star = True
+                    else:
+                        self.other_star = True
+            elif isinstance(node, (ast.Global, ast.Nonlocal)):
+                self.bound.update(node.names)
+            elif isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Store) \
+                    and isinstance(node.value, ast.Name) and node.value.id == "self":
+                self.self_attributes.add(node.attr)
+            elif isinstance(node, ast.MatchAs) and node.name:
+                self.bound.add(node.name)
+
+    def check_names(self, tree):
+        if self.other_star or (self.star and self.api is None):
+            return
+        known = self.bound | set(dir(builtins)) | {"__file__", "__name__"}
+        if self.star:
+            known |= set(self.api)
+        reported = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) \
+                    and node.id not in known and node.id not in reported:
+                reported.add(node.id)
+                hint = " (not exported by manim)" if self.star else ""
+                self.report(node, "name", f"name '{node.id}' is not defined{hint}")
+
+
+def check_scene(code: str, scene_name: str = SCENE_NAME) -> list:
+    """
+    Statically check generated Manim code.
+
+    Returns:
+        list: Issues as dicts with "line", "kind" (syntax, scene, import, name,
+        method, kwarg or latex), "message" and "blocking" (False for advisory
+        kinds), in source order; empty if nothing was found.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return [{"line": e.lineno or 0, "kind": "syntax", "message": f"{e.msg}: {(e.text or '').strip()}",
+                 "blocking": True}]
+
+    checker = _SceneChecker(manim_api(), scene_name)
+    checker.collect(tree)
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            checker.visit(node)
+    checker.check_scene_class(tree)
+    checker.check_names(tree)
+    for node in tree.body:
+        if not isinstance(node, (ast.Import, ast.ImportFrom)):
+            checker.visit(node)
+    return sorted(checker.issues, key=lambda issue: issue["line"])
+
+
+def blocking_issues(issues: list) -> list:
+    """The issues that mean the scene cannot render, leaving out advisory ones."""
+    return [issue for issue in issues if issue.get("blocking", True)]
+
+
+def format_issues(issues: list) -> str:
+    """Issues as an error report for ``ErrorDiagnosisAgent``."""
+    lines = [f"Static analysis found {len(issues)} problem(s) in the code before rendering:"]
+    for issue in issues:
+        where = f"line {issue['line']}: " if issue["line"] else ""
+        lines.append(f"- {where}[{issue['kind']}] {issue['message']}")
+    return "\n".join(lines)
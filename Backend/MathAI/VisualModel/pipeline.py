@@ -11,8 +11,33 @@ from .agents import (
 )
 from .config import Config
 from .utils import Utils
+from .prompts import PROMPTS
+from Cache.stage_cache import stage_cache, prompt_version
+from Telemetry.metrics import stage_duration
+from Telemetry.tracing import tracer
+from contextlib import contextmanager
 import time
 
+# ``pipeline`` label of this pipeline's spans and stage metrics
+PIPELINE = "visual"
+
+# Ordered stages reported through the ``on_stage`` callback of ``run``.
+STAGES = [
+    "prompt_analysis",
+    "math_verification",
+    "visualization_spec",
+    "code_structure",
+    "code_generation",
+    "code_testing",
+    "code_optimization",
+    "validation_consensus",
+]
+
+def _model_name(agent):
+    """Model identifier of an agent, used in stage cache keys."""
+    return getattr(agent, "model_name", None) or "unknown"
+
+
 class AgenticPipeline:
     """Enhanced agentic pipeline for generating perfect, error-free Manim code for advanced mathematical visualizations."""
     
@@ -21,78 +46,162 @@ class AgenticPipeline:
         self.logger = Config.setup_logging()
         self.logger.info("Initializing Enhanced Agentic Pipeline")
         
-        gemini_flash_model, gemini_learn_model, openrouter_client, groq_client = Config.initialize_clients()
+        llm = Config.initialize_clients()
         
-        self.prompt_analysis = PromptAnalysisAgent(gemini_flash_model, self.logger)
-        self.math_verification = MathVerificationAgent(gemini_learn_model, self.logger)
-        self.visualization_spec = VisualizationSpecAgent(groq_client, Config.GROQ_MODEL, self.logger)
-        self.code_structure = CodeStructureAgent(groq_client, Config.GROQ_MODEL, self.logger)
-        self.code_generation = CodeGenerationAgent(groq_client,Config.GROQ_MODEL, self.logger)
-        self.code_testing = CodeTestingAgent(gemini_learn_model, self.logger)
-        self.code_optimization = CodeOptimizationAgent(gemini_flash_model, self.logger)
-        self.error_diagnosis = ErrorDiagnosisAgent(gemini_learn_model, self.logger)
+        self.prompt_analysis = PromptAnalysisAgent(llm, Config.GEMINI_FLASH_MODEL, self.logger)
+        self.math_verification = MathVerificationAgent(llm, Config.GEMINI_LEARN_MODEL, self.logger)
+        self.visualization_spec = VisualizationSpecAgent(llm, Config.GROQ_MODEL, self.logger)
+        self.code_structure = CodeStructureAgent(llm, Config.GROQ_MODEL, self.logger)
+        self.code_generation = CodeGenerationAgent(llm, Config.GROQ_MODEL, self.logger)
+        self.code_testing = CodeTestingAgent(llm, Config.GEMINI_LEARN_MODEL, self.logger)
+        self.code_optimization = CodeOptimizationAgent(llm, Config.GEMINI_FLASH_MODEL, self.logger)
+        self.error_diagnosis = ErrorDiagnosisAgent(llm, Config.GEMINI_LEARN_MODEL, self.logger)
         self.validation_consensus = ValidationConsensusAgent(
-            gemini_flash_model, gemini_learn_model, groq_client, Config.GROQ_MODEL, self.logger
+            llm, Config.GEMINI_FLASH_MODEL, Config.GEMINI_LEARN_MODEL, Config.GROQ_MODEL, self.logger
         )
         
         self.logger.info("Enhanced Agentic Pipeline initialized")
     
-    def run(self, user_prompt):
-        """Run the pipeline to generate Manim code for the given prompt."""
+    @contextmanager
+    def _stage(self, stage):
+        """Span and latency histogram entry for one stage; set the span's ``cache`` attribute to label hits."""
+        with tracer.span(f"stage {stage}", pipeline=PIPELINE, stage=stage) as span:
+            try:
+                yield span
+            finally:
+                cache = span.attributes.setdefault("cache", "none")
+                stage_duration.observe(span.duration, pipeline=PIPELINE, stage=stage, cache=cache)
+
+    def _cached(self, stage, agent, value):
+        """Run ``agent.process(value)`` through the shared stage cache."""
+        computed = []
+
+        def compute():
+            computed.append(True)
+            return agent.process(value)
+
+        with self._stage(stage) as span:
+            result = stage_cache.get_or_compute(
+                stage,
+                prompt_version(PROMPTS[stage]),
+                _model_name(agent),
+                value,
+                compute,
+                is_cacheable=lambda result: (
+                    isinstance(result, str) and result != value and not result.lower().startswith("error")
+                ),
+            )
+            span.set_attribute("cache", "miss" if computed else "hit")
+        return result
+    
+    def _report(self, on_stage, stage):
+        """Notify ``on_stage`` (if given) that ``stage`` is starting."""
+        if on_stage is None:
+            return
+        try:
+            on_stage(stage, STAGES.index(stage) / len(STAGES))
+        except Exception as e:
+            self.logger.warning(f"Stage callback failed for {stage}: {str(e)}")
+
+    def _publish(self, on_result, stage, output):
+        """Hand a finished stage's ``output`` to ``on_result`` (if given)."""
+        if on_result is None:
+            return
+        try:
+            on_result(stage, output)
+        except Exception as e:
+            self.logger.warning(f"Result callback failed for {stage}: {str(e)}")
+
+    def run(self, user_prompt, on_stage=None, on_result=None):
+        """
+        Run the pipeline to generate Manim code for the given prompt.
+
+        ``on_stage(stage, progress)`` is called as each stage starts, with
+        ``progress`` the fraction of stages already completed, and
+        ``on_result(stage, output)`` as soon as a stage has produced its output.
+        """
+        with tracer.span("pipeline.run", pipeline=PIPELINE) as span:
+            result = self._run(user_prompt, on_stage, on_result)
+            span.set_attributes(status=result["status"], stage=result["stage"])
+            return result
+
+    def _run(self, user_prompt, on_stage, on_result):
         self.logger.info(f"Starting enhanced agentic flow with prompt: {user_prompt}")
         
         # Step 1: Extract mathematical concept
         print("=================================================================================================")
-        concept = self.prompt_analysis.process(user_prompt)
+        self._report(on_stage, "prompt_analysis")
+        concept = self._cached("prompt_analysis", self.prompt_analysis, user_prompt)
         if concept.lower().startswith("error"):
             self.logger.error(f"Failed at prompt analysis: {concept}")
             return {"status": "error", "stage": "prompt_analysis", "message": concept}
+        self._publish(on_result, "prompt_analysis", concept)
         
         # Step 2: Verify mathematical concept
         print("=================================================================================================")
-        verified_concept = self.math_verification.process(concept)
+        self._report(on_stage, "math_verification")
+        verified_concept = self._cached("math_verification", self.math_verification, concept)
         if verified_concept.lower().startswith("error"):
             self.logger.error(f"Failed at math verification: {verified_concept}")
             return {"status": "error", "stage": "math_verification", "message": verified_concept}
+        self._publish(on_result, "math_verification", verified_concept)
         
         # Step 3: Generate visualization specification
         print("=================================================================================================")
-        specification = self.visualization_spec.process(verified_concept)
+        self._report(on_stage, "visualization_spec")
+        specification = self._cached("visualization_spec", self.visualization_spec, verified_concept)
         if specification.lower().startswith("error"):
             self.logger.error(f"Failed at visualization spec: {specification}")
             return {"status": "error", "stage": "visualization_spec", "message": specification}
+        self._publish(on_result, "visualization_spec", specification)
         
         # Step 4: Generate code structure
         print("=================================================================================================")
-        code_struct = self.code_structure.process(specification)
+        self._report(on_stage, "code_structure")
+        code_struct = self._cached("code_structure", self.code_structure, specification)
         if code_struct.lower().startswith("error"):
             self.logger.error(f"Failed at code structure: {code_struct}")
             return {"status": "error", "stage": "code_structure", "message": code_struct}
+        self._publish(on_result, "code_structure", code_struct)
         
         # Step 5: Generate initial code
         print("=================================================================================================")
-        code = self.code_generation.process(code_struct)
+        self._report(on_stage, "code_generation")
+        code = self._cached("code_generation", self.code_generation, code_struct)
         if code.lower().startswith("error"):
             self.logger.error(f"Failed at code generation: {code}")
             return {"status": "error", "stage": "code_generation", "message": code}
+        self._publish(on_result, "code_generation", code)
         
         # Step 6: Test code for potential issues
         print("=================================================================================================")
-        test_results = self.code_testing.process(code)
+        self._report(on_stage, "code_testing")
+        with self._stage("code_testing"):
+            test_results = self.code_testing.process(code)
         if not test_results.upper().startswith("CODE PASSES TESTING"):
             self.logger.warning(f"Code testing found issues: {test_results}")
             enhanced_struct = f"{code_struct}\n\nIssues to address:\n{test_results}"
-            code = self.code_generation.process(enhanced_struct)
+            code = self._cached("code_generation", self.code_generation, enhanced_struct)
+        self._publish(on_result, "code_testing", test_results)
         
         # Step 7: Optimize code
         print("=================================================================================================")
-        optimized_code = self.code_optimization.process(code)
+        self._report(on_stage, "code_optimization")
+        optimized_code = self._cached("code_optimization", self.code_optimization, code)
+        self._publish(on_result, "code_optimization", optimized_code)
         
         # Step 8: Validate and iteratively fix
         max_fix_attempts = 3
-        validation_result = self.validation_consensus.process(optimized_code)
+        self._report(on_stage, "validation_consensus")
+        with self._stage("validation_consensus"):
+            validation_result = self.validation_consensus.process(optimized_code)
         
         for attempt in range(max_fix_attempts):
+            self._publish(on_result, "validation_consensus", {
+                "attempt": attempt,
+                "result": validation_result["result"],
+                "score": validation_result["score"]
+            })
             if validation_result["result"] == "pass":
                 self.logger.info(f"Agentic flow completed successfully after {attempt} fix attempts.")
                 return {
@@ -103,16 +212,19 @@ class AgenticPipeline:
                 }
             else:
                 self.logger.warning(f"Validation failed (attempt {attempt + 1}/{max_fix_attempts}) with score {validation_result['score']}")
-                fixed_code = self.error_diagnosis.process(
-                    optimized_code,
-                    f"Code failed validation with feedback:\n{validation_result['feedback']}"
-                )
-                validation_result = self.validation_consensus.process(fixed_code)
+                with self._stage("error_diagnosis"):
+                    fixed_code = self.error_diagnosis.process(
+                        optimized_code,
+                        f"Code failed validation with feedback:\n{validation_result['feedback']}"
+                    )
+                with self._stage("validation_consensus"):
+                    validation_result = self.validation_consensus.process(fixed_code)
                 optimized_code = fixed_code
         
         # Step 9: Generate fallback if all attempts fail
         self.logger.warning("Code failed validation after all attempts, generating fallback")
-        fallback_code = self.validation_consensus.generate_fallback(verified_concept)
+        with self._stage("fallback_generation"):
+            fallback_code = self.validation_consensus.generate_fallback(verified_concept)
         return {
             "status": "fallback",
             "stage": "fallback_generation",
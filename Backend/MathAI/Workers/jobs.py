@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from Workers.pool import render_pool, PoolSaturatedError
+
+logger = logging.getLogger("job-manager")
+
+JOBS_DB_PATH = os.environ.get("JOBS_DB_PATH", "jobs.db")
+JOBS_MAX_QUEUED = int(os.environ.get("JOBS_MAX_QUEUED", 100))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueueFullError(RuntimeError):
+    """Raised when too many jobs are already waiting to run."""
+
+
+class JobStore:
+    """
+    SQLite-backed job table.
+
+    Every call opens its own short-lived connection, so the store can be used
+    from the router, the dispatcher thread and the render workers at once.
+    """
+
+    def __init__(self, path: str = JOBS_DB_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    progress REAL NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, kind: str, params: dict) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, params, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(params), QUEUED, now, now),
+            )
+        return job_id
+
+    def update(self, job_id: str, **fields):
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def next_queued(self):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+        return row["id"] if row else None
+
+    def count(self, status: str) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def requeue_running(self) -> int:
+        """Put jobs interrupted by a restart back in the queue."""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = ?, stage = NULL, progress = 0, updated_at = ? WHERE status = ?",
+                (QUEUED, time.time(), RUNNING),
+            )
+            return cur.rowcount
+
+
+class JobManager:
+    """
+    Runs persisted jobs on the render pool.
+
+    Submissions only write a row; a dispatcher thread moves queued rows onto
+    the render pool as capacity frees up. Because the queue lives in SQLite,
+    jobs that were queued or running when the process stopped are picked up
+    again by ``start()``.
+    """
+
+    def __init__(self, store: JobStore, pool=render_pool):
+        self.store = store
+        self.pool = pool
+        self._handlers = {}
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def register(self, kind: str, handler):
+        """Register ``handler(params, on_stage) -> dict`` for jobs of ``kind``."""
+        self._handlers[kind] = handler
+
+    def submit(self, kind: str, params: dict) -> str:
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self.store.count(QUEUED) >= JOBS_MAX_QUEUED:
+            raise JobQueueFullError("Job queue is full, try again later.")
+        job_id = self.store.create(kind, params)
+        logger.info(f"Queued {kind} job {job_id}")
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id: str):
+        return self.store.get(job_id)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        requeued = self.store.requeue_running()
+        if requeued:
+            logger.info(f"Requeued {requeued} job(s) interrupted by the last shutdown")
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._dispatch_loop, name="job-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _dispatch_loop(self):
+        while not self._stopped.is_set():
+            job_id = self.store.next_queued()
+            if job_id is None:
+                self._wakeup.wait(timeout=5)
+                self._wakeup.clear()
+                continue
+            self.store.update(job_id, status=RUNNING)
+            try:
+                self.pool.submit(self._run, job_id)
+            except PoolSaturatedError:
+                # Leave it queued and retry once a worker frees up.
+                self.store.update(job_id, status=QUEUED)
+                self._stopped.wait(timeout=1)
+
+    def _run(self, job_id: str):
+        job = self.store.get(job_id)
+        handler = self._handlers[job["kind"]]
+
+        def on_stage(stage, progress):
+            self.store.update(job_id, stage=stage, progress=round(progress, 3))
+
+        try:
+            result = handler(job["params"], on_stage)
+            self.store.update(job_id, status=DONE, stage="complete", progress=1.0, result=result)
+            logger.info(f"Job {job_id} finished")
+        except Exception as e:
+            logger.exception(f"Job {job_id} failed: {str(e)}")
+            self.store.update(job_id, status=FAILED, error=str(e))
+        finally:
+            self._wakeup.set()
+
+
+job_manager = JobManager(JobStore())
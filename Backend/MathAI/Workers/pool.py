@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from Telemetry.tracing import tracer
+
+logger = logging.getLogger("worker-pool")
+
+
+class PoolSaturatedError(RuntimeError):
+    """Raised when a pool has no free worker and its wait queue is full."""
+
+    def __init__(self, pool_name: str):
+        super().__init__(f"Worker pool '{pool_name}' is saturated, try again later.")
+        self.pool_name = pool_name
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a hard cap on queued work.
+
+    The blocking pipeline code (Gemini/Groq HTTP calls, Manim subprocesses) runs
+    on these threads so the FastAPI event loop stays free. A submission is
+    accepted only while fewer than ``max_workers + max_queue`` jobs are in
+    flight; beyond that ``PoolSaturatedError`` is raised immediately so the
+    router can answer 503 instead of piling up requests.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-worker")
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rejected = 0
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedule ``fn(*args, **kwargs)`` and return its ``concurrent.futures.Future``."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            logger.warning(f"[{self.name}] Rejecting job, pool saturated")
+            raise PoolSaturatedError(self.name)
+
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(tracer.wrap(fn), *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """Run ``fn`` on the pool and await its result from async code."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        """Return current occupancy counters for this pool."""
+        with self._lock:
+            return {
+                "name": self.name,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queued": max(0, self._in_flight - self.max_workers),
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        logger.warning(f"Invalid value for {name}, using default {default}")
+        return default
+
+
+# LLM-bound work: chat agents and the p5.js / visual pipelines.
+llm_pool = BoundedExecutor(
+    "llm",
+    max_workers=_env_int("LLM_POOL_WORKERS", 16),
+    max_queue=_env_int("LLM_POOL_QUEUE", 32),
+)
+
+# Render-bound work: the video pipeline plus its Manim subprocess.
+render_pool = BoundedExecutor(
+    "render",
+    max_workers=_env_int("RENDER_POOL_WORKERS", 2),
+    max_queue=_env_int("RENDER_POOL_QUEUE", 4),
+)
+
+
+def shutdown_pools(wait: bool = False):
+    """Stop both pools; called on application shutdown."""
+    llm_pool.shutdown(wait=wait)
+    render_pool.shutdown(wait=wait)
@@ -0,0 +1,433 @@
+"""
+Long-lived Manim render processes.
+
+Running ``manim`` as a subprocess costs a fresh interpreter plus the manim,
+numpy, cairo and pango imports (several seconds) before the first frame of
+every video. The workers here pay that once: each imports manim at start-up
+and then renders scene after scene in-process, until it is recycled.
+"""
+import importlib.util
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+from Cache.segment_cache import segment_cache
+from Cache.tex_cache import tex_cache, COMMON_FRAGMENTS
+from Telemetry.tracing import tracer
+
+logger = logging.getLogger("render-workers")
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, only the wall-clock timeout applies
+    resource = None
+
+
+class RenderError(RuntimeError):
+    """A scene failed to render; ``log`` holds the traceback or the reason the worker died."""
+
+    def __init__(self, message: str, log: str = ""):
+        super().__init__(message)
+        self.log = log
+
+
+class RenderTimeout(RenderError):
+    """A render ran past its time limit and its worker was killed."""
+
+
+class RenderUnavailable(RenderError):
+    """The workers cannot import manim; the pool disables itself and callers should use the CLI."""
+
+
+def _set_limits(memory_mb: int):
+    if resource is None:
+        return
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _cpu_budget(cpu_seconds: float):
+    """Let this process use ``cpu_seconds`` more CPU time; past that the kernel kills it (SIGXCPU)."""
+    if resource is None or not cpu_seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _track_tex(used: list) -> bool:
+    """Append the SVG file name of every formula Manim compiles or reuses to ``used``."""
+    try:
+        from manim.utils import tex_file_writing
+        original = tex_file_writing.tex_to_svg_file
+    except (ImportError, AttributeError):
+        return False
+
+    def tex_to_svg_file(*args, **kwargs):
+        svg_file = original(*args, **kwargs)
+        used.append(os.path.basename(str(svg_file)))
+        return svg_file
+
+    # MathTex calls the name it imported, so patch that reference too
+    for module in (tex_file_writing, sys.modules.get("manim.mobject.text.tex_mobject")):
+        if module is not None and getattr(module, "tex_to_svg_file", None) is original:
+            module.tex_to_svg_file = tex_to_svg_file
+    return True
+
+
+def _compile_tex(manim, job: dict) -> dict:
+    """Compile ``fragments`` into the job's tex_dir without rendering anything."""
+    started = time.perf_counter()
+    failed = 0
+    with manim.tempconfig({"tex_dir": job["tex_dir"]}):
+        for fragment in job["fragments"]:
+            try:
+                manim.MathTex(fragment)
+            except Exception:
+                failed += 1
+    return {"ok": True, "failed": failed, "seconds": time.perf_counter() - started}
+
+
+def _segments(scene, finished: bool):
+    """File names of the partial movies a scene used so far; the last one is dropped if it may be half-written."""
+    try:
+        paths = list(scene.renderer.file_writer.partial_movie_files)
+    except AttributeError:
+        return None
+    if not finished:
+        paths = paths[:-1]
+    return [os.path.basename(str(path)) for path in paths if path]
+
+
+def _render(manim, job: dict) -> dict:
+    """Execute the job's scene module in a fresh namespace and render ``scene_name``."""
+    started = time.perf_counter()
+    scene = None
+    try:
+        _cpu_budget(job["cpu_seconds"])
+        namespace = {"__name__": "__manim_scene__", "__file__": job["file_path"]}
+        exec(compile(job["code"], job["file_path"], "exec"), namespace)
+        scene_class = namespace.get(job["scene_name"])
+        if not (isinstance(scene_class, type) and issubclass(scene_class, manim.Scene)):
+            raise NameError(f"{job['scene_name']} is not a Scene defined by the generated code")
+        options = {
+            "quality": job["quality"],
+            "media_dir": job["media_dir"],
+            "input_file": job["file_path"],
+            "preview": False,
+            "write_to_movie": True,
+        }
+        for option in ("tex_dir", "partial_movie_dir"):
+            if job.get(option):
+                options[option] = job[option]
+        with manim.tempconfig(options):
+            scene = scene_class()
+            scene.render()
+            output = str(scene.renderer.file_writer.movie_file_path)
+        return {"ok": True, "output": output, "seconds": time.perf_counter() - started,
+                "segments": _segments(scene, finished=True)}
+    except BaseException as e:  # the scene's own code may raise anything, including SystemExit
+        return {"ok": False, "error": f"{type(e).__name__}: {e}", "log": traceback.format_exc(),
+                "seconds": time.perf_counter() - started,
+                "segments": _segments(scene, finished=False) if scene is not None else []}
+
+
+def _worker_main(conn, memory_mb: int, max_jobs: int):
+    """Entry point of a render process: import manim once, then serve jobs until recycled."""
+    started = time.perf_counter()
+    try:
+        import manim
+    except BaseException as e:
+        conn.send({"ready": False, "error": f"{type(e).__name__}: {e}"})
+        return
+    used = []
+    tracking = _track_tex(used)
+    # The address-space cap is for the jobs; applied before the import it could stop manim from loading
+    _set_limits(memory_mb)
+    conn.send({"ready": True, "import_seconds": time.perf_counter() - started})
+    for _ in range(max_jobs):
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        used.clear()
+        result = _compile_tex(manim, job) if job.get("fragments") else _render(manim, job)
+        result["tex_files"] = list(used) if tracking else None
+        conn.send(result)
+
+
+class _Worker:
+    def __init__(self, context, memory_mb: int, max_jobs: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, memory_mb, max_jobs), name="manim-render", daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        self.ready = False
+
+    def wait_ready(self, timeout: float):
+        if self.ready:
+            return
+        if not self.conn.poll(timeout):
+            raise RenderTimeout("Render worker did not finish importing manim in time")
+        message = self.conn.recv()
+        if not message.get("ready"):
+            raise RenderUnavailable(f"Render worker could not import manim: {message.get('error')}")
+        self.ready = True
+        logger.info(f"Render worker {self.process.pid} ready (manim imported in {message['import_seconds']:.1f}s)")
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class RenderWorkerPool:
+    """
+    Fixed-size pool of warm Manim render processes.
+
+    Each job's generated module is executed in a fresh namespace inside a
+    worker that already has manim imported, and the named scene is rendered
+    with ``manim.tempconfig`` so that the output lands where the ``manim``
+    CLI would put it (``<media_dir>/videos/<module>/<quality>/<Scene>.mp4``).
+    The namespace isolates jobs from each other's globals, not the host: the
+    code is as trusted as it is under the CLI.
+
+    Limits per job: ``timeout`` seconds of wall-clock time (the worker is
+    killed and replaced), ``cpu_seconds`` of CPU time and ``memory_mb`` of
+    address space (enforced by the kernel through rlimits on POSIX). Workers
+    exit after ``max_jobs`` renders, so state leaked by generated code
+    (patched manim globals, memory growth) is dropped, and a replacement
+    starts importing manim straight away.
+
+    ``enabled`` is False when ``size`` is 0 or manim is not importable, and
+    becomes False if a worker fails to import it (``RenderUnavailable``);
+    callers then keep using the ``manim`` CLI.
+    """
+
+    def __init__(self, size: int, max_jobs: int, timeout: float, cpu_seconds: float, memory_mb: int,
+                 start_timeout: float = 120.0):
+        self.size = size
+        self.max_jobs = max(1, max_jobs)
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.start_timeout = start_timeout
+        self.enabled = size > 0 and importlib.util.find_spec("manim") is not None
+        # spawn: the app process has threads, which do not survive fork
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._workers = set()
+        self._started = False
+        self._lock = threading.Lock()
+        self._counts = {"renders": 0, "failures": 0, "timeouts": 0, "crashes": 0, "recycled": 0}
+
+    def start(self):
+        """Spawn the workers (they import manim in the background); later calls do nothing."""
+        with self._lock:
+            if self._started or not self.enabled:
+                return
+            self._started = True
+            for _ in range(self.size):
+                self._spawn()
+        logger.info(f"Started {self.size} Manim render workers")
+        if tex_cache.prewarm:
+            threading.Thread(target=self.warm_tex, name="tex-prewarm", daemon=True).start()
+
+    def _spawn(self):
+        worker = _Worker(self._context, self.memory_mb, self.max_jobs)
+        self._workers.add(worker)
+        self._idle.put(worker)
+
+    def _replace(self, worker: _Worker, reason: str):
+        worker.stop()
+        with self._lock:
+            self._workers.discard(worker)
+            self._counts[reason] += 1
+            if self._started:
+                self._spawn()
+
+    def _run(self, job: dict, label: str) -> dict:
+        """Send ``job`` to an idle worker and return its result, replacing the worker if it times out or dies."""
+        self.start()
+        worker = self._idle.get()
+        if worker is None:
+            self._idle.put(None)
+            raise RenderUnavailable("Render workers are disabled")
+        while not worker.process.is_alive():
+            # Killed while idle (OOM killer, a signal): replace it rather than sending it the job
+            logger.warning(f"Render worker {worker.process.pid} died while idle (exit code {worker.process.exitcode})")
+            self._replace(worker, "crashes")
+            worker = self._idle.get()
+            if worker is None:
+                self._idle.put(None)
+                raise RenderUnavailable("Render workers are disabled")
+        pid = worker.process.pid
+        try:
+            worker.wait_ready(self.start_timeout)
+            worker.conn.send(job)
+            if not worker.conn.poll(self.timeout):
+                self._replace(worker, "timeouts")
+                worker = None
+                raise RenderTimeout(f"Render of {label} exceeded {self.timeout:.0f}s")
+            result = worker.conn.recv()
+        except (EOFError, OSError):
+            worker.process.join(timeout=1)
+            exit_code = worker.process.exitcode
+            self._replace(worker, "crashes")
+            worker = None
+            raise RenderError(
+                f"Render worker died while rendering {label} (exit code {exit_code}); "
+                f"it may have hit the CPU ({self.cpu_seconds:.0f}s) or memory ({self.memory_mb} MB) limit"
+            )
+        except RenderUnavailable as e:
+            # Every replacement would fail the same way
+            self._disable(str(e))
+            worker = None
+            raise
+        except RenderError:
+            if worker is not None:
+                self._replace(worker, "crashes")
+                worker = None
+            raise
+        finally:
+            if worker is not None:
+                self._release(worker)
+        result["pid"] = pid
+        return result
+
+    def render(self, code: str, file_path: str, scene_name: str, quality: str = "low_quality",
+               media_dir: str = "media") -> str:
+        """
+        Render ``scene_name`` from ``code`` on a warm worker and return the video
+        path relative to the working directory. ``file_path`` names the module
+        (and output folder) as the CLI would. LaTeX is compiled against the
+        shared ``tex_cache``, and animations whose partial movie is in
+        ``segment_cache`` (e.g. the unchanged start of a scene that was just
+        fixed) are not rendered again. Segments finished before a failure are
+        kept for the next attempt.
+
+        Raises:
+            RenderError: The scene raised, or its worker hit a limit and died.
+            RenderTimeout: The render took longer than ``timeout``.
+            RenderUnavailable: The workers cannot import manim (the pool is now disabled).
+        """
+        tex_dir, seeded = tex_cache.checkout()
+        segment_dir, segments_seeded = segment_cache.checkout()
+        job = {
+            "code": code,
+            "file_path": os.path.abspath(file_path),
+            "scene_name": scene_name,
+            "quality": quality,
+            "media_dir": os.path.abspath(media_dir),
+            "tex_dir": os.path.abspath(tex_dir),
+            "partial_movie_dir": os.path.abspath(segment_dir),
+            "cpu_seconds": self.cpu_seconds,
+        }
+        result = {}
+        try:
+            result = self._run(job, scene_name)
+        finally:
+            tex = tex_cache.checkin(tex_dir, seeded, result.get("tex_files"))
+            used = result.get("segments")
+            segments = segment_cache.checkin(segment_dir, segments_seeded, used, complete=set(used or ()))
+            span = tracer.current()
+            if span is not None:
+                span.set_attributes(**{f"tex.{key}": value for key, value in tex.items()})
+                span.set_attributes(**{f"segments.{key}": value for key, value in segments.items()})
+
+        with self._lock:
+            self._counts["renders" if result["ok"] else "failures"] += 1
+        if not result["ok"]:
+            raise RenderError(f"Manim error: {result['error']}", result["log"])
+        summary = "".join(
+            f", {counts['hits']}/{counts['hits'] + counts['misses']} {what} cached"
+            for what, counts in (("formulas", tex), ("animations", segments)) if "hits" in counts
+        )
+        logger.info(f"Rendered {scene_name} on worker {result['pid']} in {result['seconds']:.1f}s{summary}")
+        return os.path.relpath(result["output"], os.getcwd())
+
+    def warm_tex(self, fragments=COMMON_FRAGMENTS):
+        """Compile ``fragments`` on a worker so that the first renders using them find them in ``tex_cache``."""
+        tex_dir, seeded = tex_cache.checkout()
+        try:
+            result = self._run({"fragments": list(fragments), "tex_dir": os.path.abspath(tex_dir)},
+                               "Tex pre-warm")
+        except RenderError as e:
+            logger.warning(f"Could not pre-warm the Tex cache: {str(e)}")
+            tex_cache.checkin(tex_dir, seeded)
+            return
+        tex = tex_cache.checkin(tex_dir, seeded)
+        logger.info(
+            f"Pre-warmed Tex cache: {tex['compiled']} formulas compiled, {result['failed']} failed "
+            f"in {result['seconds']:.1f}s"
+        )
+
+    def _disable(self, reason: str):
+        """Stop all workers and mark the pool unusable; callers waiting for a worker are woken up."""
+        with self._lock:
+            if self.enabled:
+                logger.error(f"Disabling Manim render workers, renders fall back to the CLI: {reason}")
+            self.enabled = False
+            self._started = False
+            workers = list(self._workers)
+            self._workers.clear()
+        for other in workers:
+            other.stop()
+        self._idle.put(None)
+
+    def _release(self, worker: _Worker):
+        worker.jobs += 1
+        if worker.jobs >= self.max_jobs:
+            # The worker leaves its loop after its last job
+            self._replace(worker, "recycled")
+        else:
+            self._idle.put(worker)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "workers": len(self._workers),
+                "idle": self._idle.qsize(),
+                "max_jobs": self.max_jobs,
+                **self._counts,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            self._started = False
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+
+
+render_workers = RenderWorkerPool(
+    size=int(os.environ.get("RENDER_WORKERS", 2)),
+    max_jobs=int(os.environ.get("RENDER_WORKER_MAX_JOBS", 20)),
+    timeout=float(os.environ.get("RENDER_TIMEOUT", 300)),
+    cpu_seconds=float(os.environ.get("RENDER_CPU_SECONDS", 240)),
+    memory_mb=int(os.environ.get("RENDER_MEMORY_MB", 2048)),
+)
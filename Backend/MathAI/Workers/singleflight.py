@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, InvalidStateError
+
+logger = logging.getLogger("single-flight")
+
+
+def problem_key(problem: str, *context) -> tuple:
+    """Key under which identical requests are coalesced: the whitespace- and case-normalised problem plus ``context``."""
+    return (" ".join(problem.split()).casefold(), *context)
+
+
+class _Flight:
+    """One running computation and the callers attached to it."""
+
+    def __init__(self):
+        self.future = None
+        self.listeners = []
+        self.waiters = 0
+        self.lock = threading.Lock()
+
+    def broadcast(self, event: str, data):
+        with self.lock:
+            listeners = list(self.listeners)
+        for listener in listeners:
+            listener(event, data)
+
+
+class SingleFlight:
+    """
+    Runs at most one computation per key at a time.
+
+    The first caller for a key submits ``fn(emit)`` to the worker pool; every
+    caller that arrives with the same key while it is running attaches to it
+    instead of starting its own pipeline, and all of them receive its result
+    (or exception). Each caller gets a separate ``Future``: cancelling one
+    only detaches that caller, and the shared job is cancelled once nobody is
+    waiting for it. Events passed to ``emit`` are fanned out to the
+    ``listener`` of every attached caller, so a streaming request that joins
+    late sees the stages from that point on.
+
+    Followers do not occupy pool slots, so a burst of identical requests costs
+    one worker rather than saturating the pool.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._metrics = defaultdict(lambda: {"computations": 0, "coalesced": 0, "max_fanout": 0})
+
+    def submit(self, name: str, key, pool, fn, listener=None) -> Future:
+        """Attach to the ``name``/``key`` computation, starting ``fn`` on ``pool`` if none is running."""
+        mine = Future()
+        with self._lock:
+            flight = self._flights.get((name, key))
+            leader = flight is None or flight.future.cancelled()
+            if leader:
+                flight = _Flight()
+            with flight.lock:
+                flight.waiters += 1
+                if listener is not None:
+                    flight.listeners.append(listener)
+            if leader:
+                # Subscribe before submitting so the leader sees the job's first event
+                flight.future = pool.submit(fn, flight.broadcast)
+                self._flights[(name, key)] = flight
+                self._metrics[name]["computations"] += 1
+            else:
+                self._metrics[name]["coalesced"] += 1
+            self._metrics[name]["max_fanout"] = max(self._metrics[name]["max_fanout"], flight.waiters)
+
+        if leader:
+            flight.future.add_done_callback(lambda _: self._finish(name, key, flight))
+        else:
+            logger.info(f"Coalesced {name} request into a running computation ({flight.waiters} waiting)")
+        mine.add_done_callback(lambda f: f.cancelled() and self._detach(flight, listener))
+        flight.future.add_done_callback(lambda shared: self._deliver(shared, mine))
+        return mine
+
+    async def run(self, name: str, key, pool, fn):
+        """``submit`` for coroutines: await the shared result."""
+        return await asyncio.wrap_future(self.submit(name, key, pool, fn))
+
+    def _finish(self, name: str, key, flight: _Flight):
+        with self._lock:
+            if self._flights.get((name, key)) is flight:
+                del self._flights[(name, key)]
+
+    @staticmethod
+    def _deliver(shared: Future, mine: Future):
+        if shared.cancelled():
+            mine.cancel()
+            return
+        try:
+            if shared.exception() is not None:
+                mine.set_exception(shared.exception())
+            else:
+                mine.set_result(shared.result())
+        except InvalidStateError:
+            pass  # this caller already detached
+
+    @staticmethod
+    def _detach(flight: _Flight, listener):
+        with flight.lock:
+            flight.waiters -= 1
+            if listener is not None and listener in flight.listeners:
+                flight.listeners.remove(listener)
+            abandoned = flight.waiters == 0
+        if abandoned and not flight.future.done():
+            logger.info("All callers left, cancelling shared computation")
+            flight.future.cancel()
+
+    def stats(self) -> dict:
+        """Per-endpoint counts of computations started and requests coalesced into them."""
+        with self._lock:
+            in_flight = defaultdict(int)
+            for name, _ in self._flights:
+                in_flight[name] += 1
+            report = {}
+            for name, m in self._metrics.items():
+                requests = m["computations"] + m["coalesced"]
+                report[name] = {
+                    **m,
+                    "in_flight": in_flight[name],
+                    "dedup_ratio": round(m["coalesced"] / requests, 3) if requests else 0.0,
+                }
+            return report
+
+
+pipeline_flights = SingleFlight()
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import logging
+import threading
+from contextlib import aclosing
+
+logger = logging.getLogger("event-stream")
+
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def stage_callbacks(emit):
+    """``on_stage``/``on_result`` pipeline callbacks that forward progress through ``emit``."""
+    def on_stage(stage, progress):
+        emit("stage", {"stage": stage, "progress": round(progress, 3)})
+
+    def on_result(stage, output):
+        emit("stage_result", {"stage": stage, "output": output})
+
+    return on_stage, on_result
+
+
+class ThreadEventStream:
+    """
+    Bridge between blocking pipeline code on a worker pool and an SSE response.
+
+    ``start`` calls ``submit(emit)`` right away; it schedules the job (e.g.
+    ``pool.submit(fn, emit)``) and returns its ``Future``, so a saturated pool
+    raises ``PoolSaturatedError`` before any bytes are sent and the router can
+    still answer 503. The worker calls ``emit(event, data)`` as results become
+    available; ``events()`` yields them as SSE messages, followed by a final
+    ``result`` (or ``error``) event carrying the return value of ``fn``.
+
+    When the client disconnects, a job that has not started yet is cancelled;
+    one that is already running finishes (its result still populates the
+    stage and render caches) but ``emit`` stops queueing events for it.
+    """
+
+    def __init__(self, submit):
+        self.submit = submit
+        self.cancelled = threading.Event()
+        self._queue = None
+        self._loop = None
+        self._future = None
+
+    def emit(self, event: str, data):
+        if self.cancelled.is_set():
+            return
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (event, data))
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._future = self.submit(self.emit)
+        self._future.add_done_callback(lambda _: self._emit_done())
+        return self
+
+    def _emit_done(self):
+        if self.cancelled.is_set():
+            return
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, None)
+
+    async def events(self):
+        try:
+            while True:
+                item = await self._queue.get()
+                if item is None:
+                    break
+                yield sse_event(*item)
+            try:
+                yield sse_event("result", self._future.result())
+            except Exception as e:
+                logger.error(f"Streamed job failed: {str(e)}")
+                yield sse_event("error", {"detail": str(e)})
+        finally:
+            if not self._future.done():
+                logger.info("Client disconnected, cancelling streamed job")
+                self.cancelled.set()
+                self._future.cancel()
+
+
+async def token_events(chunks, result_key: str):
+    """
+    Turn an async iterator of text chunks into SSE messages.
+
+    Each chunk becomes a ``token`` event; the joined text is sent last as
+    ``result`` under ``result_key`` (or ``error`` if the stream failed). If
+    the client disconnects, ``chunks`` is closed right away so its request is
+    cancelled.
+    """
+    parts = []
+    async with aclosing(chunks) as stream:
+        try:
+            async for text in stream:
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+        except Exception as e:
+            logger.error(f"Token stream failed: {str(e)}")
+            yield sse_event("error", {"detail": str(e)})
+            return
+    yield sse_event("result", {result_key: "".join(parts)})
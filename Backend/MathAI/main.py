@@ -1,7 +1,15 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from Router.router import router
 from fastapi.staticfiles import StaticFiles
+from Workers.pool import shutdown_pools
+from Workers.jobs import job_manager
+from Workers.render_workers import render_workers
+from Config.registry import registry
+from Config.LLMs.gateway import llm_gateway
+from Telemetry.metrics import metrics
+from Telemetry.tracing import tracer
 
 
 app = FastAPI(
@@ -20,4 +28,36 @@ app.add_middleware(
     allow_headers=["*"], 
 )
 
-app.include_router(router)
\ No newline at end of file
+app.include_router(router)
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Open the root span of each API request; work it hands to the worker pools is traced under it."""
+    if not request.url.path.startswith("/math/"):
+        return await call_next(request)
+    with tracer.span(f"{request.method} {request.url.path}", route=request.url.path) as span:
+        response = await call_next(request)
+        span.set_attribute("status_code", response.status_code)
+        return response
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Prometheus scrape endpoint (text exposition format 0.0.4)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.on_event("startup")
+def on_startup():
+    registry.warm()
+    job_manager.start()
+    render_workers.start()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    job_manager.stop()
+    shutdown_pools()
+    render_workers.shutdown()
+    llm_gateway.close()